@@ -18,8 +18,10 @@ setup(
         'bin/evaluate_shacl',
     ],
     install_requires=[
-        'pyshacl',
+        # shaclgenerator.compiled_shapes relies on pyshacl's Validator internals
+        'pyshacl>=0.40,<0.41',
         'rdflib',
+        'requests',
         # 'shaclgen==0.2.5.2',  # outdated
         'shaclgen @ git+https://github.com/patrickwestphal/shaclgen@0.2.5.3-patrickwestphal#egg=shaclgen',
         'shexer==2.2.1',
@@ -7,3 +7,12 @@ class SHACLGenerator(ABC):
     @abstractmethod
     def generate_shacl(self) -> Graph:
         pass
+
+    def write_shacl(self, output_file_path: str):
+        """
+        Writes the generated SHACL shapes to output_file_path in Turtle
+        format. Back ends which can serialize their shapes directly should
+        override this to avoid building an intermediate rdflib graph.
+        """
+        self.generate_shacl().serialize(
+            destination=output_file_path, format='ttl')
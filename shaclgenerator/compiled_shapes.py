@@ -0,0 +1,189 @@
+"""
+Compiled SHACL shapes, i.e. pyshacl's shapes graph with all shapes harvested:
+their targets, paths and constraint components are resolved once instead of
+on every validation run. Compiled shapes are reused by all validation runs on
+the same shapes graph (e.g. every shard, batch or page) and can be cached on
+disk keyed by the shapes file's content, so later runs skip parsing and
+harvesting large shapes files.
+
+pyshacl offers no way to hand compiled shapes to a validator, so validate()
+swaps them in for the shapes graph the validator builds itself. This relies on
+pyshacl's Validator keeping its ShapesGraph in the shacl_graph attribute, hence
+the pyshacl version range pinned in setup.py.
+"""
+import gc
+import io
+import logging
+import pickle
+import platform
+from importlib.metadata import version
+from typing import Dict, Optional, Tuple
+
+from pyshacl import Validator
+from pyshacl.entrypoints import make_default_logger
+from pyshacl.graph_abstraction import DataGraph
+from pyshacl.monkey import rdflib_bool_patch, rdflib_bool_unpatch
+from pyshacl.rdfutil import load_from_source
+from pyshacl.shapes_graph import ShapesGraph
+from rdflib import BNode, Graph, URIRef
+
+from util.content_cache import ContentCache, file_digest, make_key
+
+logger = logging.getLogger('shaclgenerator.compiled_shapes')
+
+# bumped whenever the way shapes files are parsed or compiled changes
+_CACHE_VERSION = 2
+
+# compiled shapes by id of their rdflib graph, which is kept referenced so
+# the id isn't reused, until forget_shapes() is called for it. (The compiled
+# shapes refer to their graph, so a weak reference wouldn't free either.)
+_compiled_shapes: Dict[int, Tuple[Graph, ShapesGraph]] = {}
+
+
+def _uri_ref(value: str) -> URIRef:
+    return str.__new__(URIRef, value)
+
+
+def _bnode(value: str) -> BNode:
+    return str.__new__(BNode, value)
+
+
+class _ShapesPickler(pickle.Pickler):
+    # URIRefs and BNodes are restored as plain str subclass instances,
+    # skipping rdflib's validation of every single term when loading
+    def reducer_override(self, obj):
+        if type(obj) is URIRef:
+            return _uri_ref, (str(obj),)
+        if type(obj) is BNode:
+            return _bnode, (str(obj),)
+
+        return NotImplemented
+
+
+def dump_shapes(shapes: ShapesGraph) -> bytes:
+    buffer = io.BytesIO()
+    _ShapesPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(shapes)
+
+    return buffer.getvalue()
+
+
+def load_shapes(data: bytes) -> ShapesGraph:
+    # the garbage collector would traverse the millions of objects of large
+    # graphs over and over while they are restored
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def compile_shapes(shapes_graph: Graph) -> ShapesGraph:
+    """
+    The compiled shapes of shapes_graph, which must not be modified
+    afterwards
+    """
+    entry = _compiled_shapes.get(id(shapes_graph))
+
+    if entry is None:
+        shapes = ShapesGraph(
+            shapes_graph, logger=make_default_logger('pyshacl-validate'))
+        # triggers the harvest of all shapes
+        logger.info(f'compiled {len(shapes.shapes)} shapes')
+        entry = _compiled_shapes[id(shapes_graph)] = (shapes_graph, shapes)
+
+    return entry[1]
+
+
+def forget_shapes(shapes_graph: Graph):
+    """
+    Drops the compiled shapes of shapes_graph, e.g. once it is replaced by
+    the shapes of a changed file, so both can be garbage collected
+    """
+    _compiled_shapes.pop(id(shapes_graph), None)
+
+
+def load_compiled_shapes_graph(data: bytes) -> Graph:
+    """
+    The shapes graph of the compiled shapes dumped by dump_shapes(), whose
+    compiled shapes are used by validate()
+    """
+    shapes = load_shapes(data)
+    _compiled_shapes[id(shapes.graph)] = (shapes.graph, shapes)
+
+    return shapes.graph
+
+
+def _cache_key(shapes_file_path: str) -> str:
+    return make_key(
+        'compiled_shapes',
+        _CACHE_VERSION,
+        file_digest(shapes_file_path),
+        version('pyshacl'),
+        version('rdflib'),
+        platform.python_version(),
+    )
+
+
+def load_shapes_graph(
+        shapes_file_path: str,
+        cache: Optional[ContentCache] = None
+) -> Graph:
+    """
+    Parses and compiles the shapes of shapes_file_path, or loads the compiled
+    shapes from cache. The returned graph's compiled shapes are used by
+    validate().
+    """
+    key = _cache_key(shapes_file_path) if cache is not None else None
+    data = cache.read(key) if cache is not None else None
+
+    if data is not None:
+        shapes_graph = load_compiled_shapes_graph(data)
+        logger.info(f'loaded compiled shapes of {shapes_file_path}')
+
+        return shapes_graph
+
+    # parsed like pyshacl.validate() parses shapes files, e.g. literals are
+    # neither normalized nor any xsd:boolean other than "true" read as true
+    rdflib_bool_patch()
+    try:
+        shapes_graph = load_from_source(shapes_file_path)
+    finally:
+        rdflib_bool_unpatch()
+    shapes = compile_shapes(shapes_graph)
+
+    if cache is not None:
+        cache.write(key, dump_shapes(shapes))
+
+    return shapes_graph
+
+
+def validate(
+        data_graph: Graph,
+        shacl_graph: Graph,
+        **options
+) -> Tuple[bool, Graph, str]:
+    """
+    Like pyshacl.validate() for rdflib graphs, with the options of
+    pyshacl.Validator (e.g. use_shapes, focus_nodes, abort_on_first), but
+    reusing the compiled shapes of shacl_graph. SHACL-JS (use_js) isn't
+    supported, as enabling it would modify the shared compiled shapes.
+    """
+    if options.get('use_js'):
+        raise ValueError('SHACL-JS is not supported with compiled shapes')
+
+    # pyshacl.validate()'s logger, which only logs from level INFO on
+    options.setdefault('logger', make_default_logger('pyshacl-validate'))
+    validator = Validator(
+        DataGraph.from_rdflib(data_graph),
+        shacl_graph=shacl_graph,
+        options=options,
+    )
+    if not isinstance(getattr(validator, 'shacl_graph', None), ShapesGraph):
+        raise RuntimeError(
+            f'unsupported pyshacl version {version("pyshacl")}: Validator '
+            f'has no ShapesGraph to replace by the compiled shapes')
+    validator.shacl_graph = compile_shapes(shacl_graph)
+
+    return validator.run()
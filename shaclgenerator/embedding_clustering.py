@@ -0,0 +1,409 @@
+"""
+DBSCAN clustering of entity embeddings on a sparse graph of the neighbors
+within eps, which is searched either exactly or approximately.
+
+The exact search compares each embedding with all others, which doesn't
+scale to millions of entities. The approximate search builds a forest of
+random projection trees: each tree splits the embeddings recursively at the
+median of their projection onto a random direction until at most leaf_size
+of them are left, and only the embeddings which share a leaf in any of the
+trees are compared. Neighbors split apart in all trees are missed, so the
+neighbors found are a subset of the exact ones; neighbor_recall() tells how
+large.
+
+Embeddings are stored as float32. The approximate search computes
+distances in chunks of at most max_memory_mib, the exact one in tiles of a
+few MiB.
+
+The clustering only needs NumPy and SciPy: the exact search compares the
+embeddings by brute force like sklearn does for embeddings of more than 15
+dimensions, and dbscan_labels() assigns the same labels as sklearn's DBSCAN
+on the neighbor graph, so re-clustering doesn't pay for importing sklearn.
+"""
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+logger = logging.getLogger('shaclgenerator.embedding_clustering')
+
+_MIB = 2 ** 20
+# number of queries and points compared at once by the exact search
+_QUERY_TILE_SIZE = 1024
+_POINT_TILE_SIZE = 2048
+
+
+def _unique(keys: np.ndarray) -> np.ndarray:
+    """
+    Sorted unique values of keys, which are sorted in place
+    """
+    keys.sort()
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def radius_neighbors(
+        queries: np.ndarray,
+        points: np.ndarray,
+        eps: float
+) -> csr_matrix:
+    """
+    Sparse matrix of the distances between each query and the points within
+    eps of it, found by comparing it with all points
+    """
+    # each point y gets the extra coordinate -|y|^2 / 2 and each query x the
+    # extra coordinate 1, so that a single product x.y - |y|^2 / 2 is
+    # compared with (|x|^2 - eps^2) / 2 per pair; computed in float64 like
+    # sklearn does
+    extended_points = np.empty((len(points), points.shape[1] + 1))
+    extended_points[:, :-1] = points
+    extended_points[:, -1] = -0.5 * np.einsum(
+        'ij,ij->i', extended_points[:, :-1], extended_points[:, :-1])
+
+    indptr = [np.zeros(1, dtype=np.int64)]
+    indices = []
+    data = []
+    for start in range(0, len(queries), _QUERY_TILE_SIZE):
+        chunk = np.ones(
+            (len(queries[start:start + _QUERY_TILE_SIZE]),
+             extended_points.shape[1]))
+        chunk[:, :-1] = queries[start:start + _QUERY_TILE_SIZE]
+        squared_norms = np.einsum('ij,ij->i', chunk[:, :-1], chunk[:, :-1])
+        thresholds = 0.5 * (squared_norms - eps ** 2)
+
+        rows = []
+        columns = []
+        distances = []
+        # tiles of a few MiB stay in the cache
+        for tile_start in range(0, len(points), _POINT_TILE_SIZE):
+            products = chunk @ extended_points[
+                tile_start:tile_start + _POINT_TILE_SIZE].T
+            pairs = np.flatnonzero(products >= thresholds[:, None])
+            tile_rows, tile_columns = np.divmod(pairs, products.shape[1])
+            rows.append(tile_rows)
+            columns.append(tile_columns + tile_start)
+            distances.append(np.sqrt(np.maximum(
+                squared_norms[tile_rows] - 2 * products.ravel()[pairs], 0)))
+
+        rows = np.concatenate(rows)
+        order = np.argsort(rows, kind='stable')
+        indptr.append(indptr[-1][-1] + np.cumsum(
+            np.bincount(rows, minlength=len(chunk))))
+        indices.append(np.concatenate(columns)[order].astype(np.int32))
+        data.append(np.concatenate(distances)[order])
+
+    return csr_matrix(
+        (np.concatenate(data),
+         np.concatenate(indices),
+         np.concatenate(indptr)),
+        shape=(len(queries), len(points)))
+
+
+def as_points(embeddings: np.ndarray) -> np.ndarray:
+    """
+    The embeddings as float32 points to cluster. Complex embeddings (e.g.
+    of ComplEx or RotatE) are rejected rather than losing their imaginary
+    parts.
+    """
+    if np.iscomplexobj(embeddings):
+        raise ValueError('complex embeddings are not supported')
+
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def cluster_labels(
+        is_core: np.ndarray,
+        components: np.ndarray,
+        border_points: np.ndarray,
+        core_neighbors: np.ndarray
+) -> np.ndarray:
+    """
+    DBSCAN cluster labels of the points, given the boolean mask of the core
+    points, the connected component of each point among the links between
+    core points, and the links of border points to the core points within
+    eps (border_points[i] to core_neighbors[i]). Clusters are numbered in
+    the order of their first core point, and a border point belongs to the
+    first cluster of its core neighbors, as in sklearn's DBSCAN.
+    """
+    num_points = len(is_core)
+
+    # clusters numbered by their first core point
+    core_points = np.flatnonzero(is_core)
+    first_points = np.full(num_points, num_points)
+    np.minimum.at(first_points, components[core_points], core_points)
+    cluster_ids = np.argsort(np.argsort(first_points))
+
+    labels = np.full(num_points, -1)
+    labels[core_points] = cluster_ids[components[core_points]]
+
+    border_labels = np.full(num_points, num_points)
+    np.minimum.at(border_labels, border_points, labels[core_neighbors])
+    is_border = border_labels < num_points
+    labels[is_border] = border_labels[is_border]
+
+    return labels
+
+
+def dbscan_labels(graph: csr_matrix, min_samples: int = 5) -> np.ndarray:
+    """
+    DBSCAN cluster labels of the points of the graph of their neighbors
+    within eps, the same as sklearn's DBSCAN(metric='precomputed') assigns:
+    clusters are numbered in the order of their first core point, and a
+    border point belongs to the first cluster of its core neighbors.
+    Points are counted as their own neighbors, whether the graph stores its
+    diagonal or not.
+    """
+    num_points = graph.shape[0]
+    rows = np.repeat(np.arange(num_points), np.diff(graph.indptr))
+    not_self = graph.indices != rows
+    rows = rows[not_self]
+    columns = graph.indices[not_self]
+
+    is_core = np.bincount(rows, minlength=num_points) + 1 >= min_samples
+    core_links = is_core[rows] & is_core[columns]
+    core_graph = csr_matrix(
+        (np.ones(core_links.sum(), dtype=np.int8),
+         (rows[core_links], columns[core_links])),
+        shape=(num_points, num_points))
+    _, components = connected_components(core_graph, directed=False)
+
+    border_links = ~is_core[rows] & is_core[columns]
+
+    return cluster_labels(
+        is_core, components, rows[border_links], columns[border_links])
+
+
+class NeighborSearch(Enum):
+    EXACT = 'exact'
+    RANDOM_PROJECTION = 'random_projection'
+
+
+class EmbeddingClusterer(ABC):
+    def __init__(
+            self,
+            eps: float = 0.5,
+            min_samples: int = 5,
+            max_memory_mib: int = 1024
+    ):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.max_memory_mib = max_memory_mib
+
+    @abstractmethod
+    def neighbor_graph(self, points: np.ndarray) -> csr_matrix:
+        """
+        Sparse matrix of the distances between the points within eps of each
+        other
+        """
+        pass
+
+    def fit_predict(self, points: np.ndarray) -> np.ndarray:
+        """
+        DBSCAN cluster labels of the points
+        """
+        points = as_points(points)
+        graph = self.neighbor_graph(points)
+        logger.debug(
+            f'{graph.nnz} neighbor pairs within eps={self.eps} between '
+            f'{len(points)} embeddings')
+
+        return dbscan_labels(graph, self.min_samples)
+
+
+class ExactClusterer(EmbeddingClusterer):
+    def neighbor_graph(self, points: np.ndarray) -> csr_matrix:
+        return radius_neighbors(points, points, self.eps)
+
+
+class RandomProjectionClusterer(EmbeddingClusterer):
+    def __init__(
+            self,
+            eps: float = 0.5,
+            min_samples: int = 5,
+            max_memory_mib: int = 1024,
+            num_trees: int = 16,
+            leaf_size: int = 256,
+            seed: int = 0
+    ):
+        super().__init__(eps, min_samples, max_memory_mib)
+        self.num_trees = num_trees
+        self.leaf_size = leaf_size
+        self.seed = seed
+
+    def _leaves(self, points: np.ndarray, rng: np.random.Generator):
+        """
+        The leaves of one random projection tree over the points, as a
+        matrix of point indices with one row per leaf, padded with -1
+        """
+        num_points, dim = points.shape
+        depth = max(0, int(np.ceil(np.log2(num_points / self.leaf_size))))
+        nodes = np.zeros(num_points, dtype=np.int64)
+        # rows of points projected at once
+        chunk_size = max(1, self.max_memory_mib * _MIB // (8 * dim))
+
+        for level in range(depth):
+            directions = rng.standard_normal(
+                (2 ** level, dim)).astype(np.float32)
+            projections = np.empty(num_points, dtype=np.float32)
+            for start in range(0, num_points, chunk_size):
+                end = start + chunk_size
+                projections[start:end] = np.einsum(
+                    'ij,ij->i', points[start:end], directions[nodes[start:end]])
+
+            # the lower half of each node's points by projection go left
+            order = np.lexsort((projections, nodes))
+            sizes = np.bincount(nodes, minlength=2 ** level)
+            starts = np.cumsum(sizes) - sizes
+            ranks = np.empty(num_points, dtype=np.int64)
+            ranks[order] = np.arange(num_points) - starts[nodes[order]]
+            nodes = 2 * nodes + (ranks >= sizes[nodes] // 2)
+
+        order = np.argsort(nodes, kind='stable')
+        sizes = np.bincount(nodes, minlength=2 ** depth)
+        starts = np.cumsum(sizes) - sizes
+        leaves = np.full((2 ** depth, sizes.max()), -1, dtype=np.int64)
+        leaves[nodes[order], np.arange(num_points) - starts[nodes[order]]] = \
+            order
+
+        return leaves
+
+    def _leaf_neighbors(
+            self,
+            points: np.ndarray,
+            leaves: np.ndarray
+    ) -> np.ndarray:
+        """
+        Sorted pair keys (i * number of points + j) of the points i and j
+        within eps of each other in the same leaf, including i == j as
+        DBSCAN counts each point as its own neighbor
+        """
+        num_points, dim = points.shape
+        leaf_size = leaves.shape[1]
+        # leaves compared at once: their points and distance matrices
+        chunk_size = max(
+            1,
+            self.max_memory_mib * _MIB
+            // (4 * leaf_size * (dim + 3 * leaf_size)))
+
+        keys = []
+        for start in range(0, len(leaves), chunk_size):
+            block = leaves[start:start + chunk_size]
+            valid = block >= 0
+            x = points[np.where(valid, block, 0)]
+
+            squared_norms = np.einsum('ijk,ijk->ij', x, x)
+            squared_distances = squared_norms[:, :, None] \
+                + squared_norms[:, None, :] \
+                - 2 * np.matmul(x, x.transpose(0, 2, 1))
+            close = (squared_distances <= self.eps ** 2) \
+                & valid[:, :, None] & valid[:, None, :]
+
+            leaf_ids, i, j = np.nonzero(close)
+            keys.append(block[leaf_ids, i] * num_points + block[leaf_ids, j])
+
+        return _unique(np.concatenate(keys))
+
+    def _distances(self, points: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """
+        Distances between the points of the pair keys
+        """
+        num_points, dim = points.shape
+        # pairs compared at once
+        chunk_size = max(1, self.max_memory_mib * _MIB // (12 * dim))
+        distances = np.empty(len(keys), dtype=np.float32)
+
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            distances[start:start + chunk_size] = np.linalg.norm(
+                points[chunk // num_points] - points[chunk % num_points],
+                axis=1)
+
+        return distances
+
+    def neighbor_graph(self, points: np.ndarray) -> csr_matrix:
+        num_points = len(points)
+        rng = np.random.default_rng(self.seed)
+        keys = np.empty(0, dtype=np.int64)
+
+        for _ in range(self.num_trees):
+            # pairs found in several trees are kept once
+            keys = _unique(np.concatenate((
+                keys, self._leaf_neighbors(points, self._leaves(points, rng)))))
+
+        # the keys are sorted by row, then by column
+        indptr = np.searchsorted(keys, np.arange(num_points + 1) * num_points)
+
+        return csr_matrix(
+            (
+                self._distances(points, keys),
+                (keys % num_points).astype(np.int32),
+                indptr
+            ),
+            shape=(num_points, num_points))
+
+
+def make_clusterer(
+        neighbor_search: NeighborSearch,
+        eps: float = 0.5,
+        **kwargs
+) -> EmbeddingClusterer:
+    if neighbor_search == NeighborSearch.EXACT:
+        return ExactClusterer(eps, **kwargs)
+    elif neighbor_search == NeighborSearch.RANDOM_PROJECTION:
+        return RandomProjectionClusterer(eps, **kwargs)
+    else:
+        raise ValueError(f'unknown neighbor search {neighbor_search}')
+
+
+@dataclass
+class RecallReport:
+    num_queries: int
+    num_exact_neighbors: int
+    num_found_neighbors: int
+
+    @property
+    def recall(self) -> float:
+        if self.num_exact_neighbors == 0:
+            return 1.0
+        return self.num_found_neighbors / self.num_exact_neighbors
+
+    def __str__(self):
+        return f'found {self.num_found_neighbors} of ' \
+               f'{self.num_exact_neighbors} neighbors within eps of ' \
+               f'{self.num_queries} sampled points (recall {self.recall:.4f})'
+
+
+def neighbor_recall(
+        points: np.ndarray,
+        graph: csr_matrix,
+        eps: float,
+        num_queries: int = 1000,
+        seed: int = 0
+) -> RecallReport:
+    """
+    Share of the exact neighbors within eps (other than the point itself) of
+    num_queries sampled points which are in the neighbor graph
+    """
+    points = as_points(points)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(
+        len(points), min(num_queries, len(points)), replace=False)
+
+    exact_graph = radius_neighbors(points[queries], points, eps)
+
+    num_exact_neighbors = 0
+    num_found_neighbors = 0
+    for i, query in enumerate(queries):
+        neighbors = exact_graph.indices[
+            exact_graph.indptr[i]:exact_graph.indptr[i + 1]]
+        neighbors = neighbors[neighbors != query]
+        num_exact_neighbors += len(neighbors)
+        num_found_neighbors += np.isin(
+            neighbors, graph.indices[graph.indptr[query]:graph.indptr[query + 1]]
+        ).sum()
+
+    return RecallReport(
+        len(queries), num_exact_neighbors, int(num_found_neighbors))
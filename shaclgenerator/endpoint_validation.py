@@ -0,0 +1,379 @@
+"""
+SHACL validation of the data behind a SPARQL endpoint. Instead of letting
+pyshacl query the endpoint triple pattern by triple pattern, the focus nodes
+of each shape are fetched page by page with CONSTRUCT queries (including the
+triples their constraints need) over pooled keep-alive connections, and each
+page is validated locally. The pages are ranges of the focus nodes' string
+values, whose bounds are selected before a page is fetched.
+"""
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Iterator, List, Optional, Set, Tuple
+
+import requests
+from rdflib import BNode, Graph, Literal, RDF, RDFS, SH, URIRef
+from rdflib.term import Node
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from shaclgenerator.compiled_shapes import validate
+from shaclgenerator.sharded_validation import get_targeting_shapes
+from shaclgenerator.streaming_validation import get_non_local_constraints
+from shaclgenerator.validation_report import ReportSummary, \
+    merge_reports, restrict_report
+
+logger = logging.getLogger('shaclgenerator.endpoint_validation')
+
+_RDF_CONTENT_TYPES = {
+    'application/n-triples': 'nt',
+    'text/plain': 'nt',
+    'text/turtle': 'turtle',
+    'application/rdf+xml': 'xml',
+    'application/ld+json': 'json-ld',
+}
+
+# marks the focus nodes of a page in the results of its CONSTRUCT query
+_FOCUS_NODE = URIRef('urn:x-shaclgenerator:focusNode')
+
+
+class SPARQLClient:
+    def __init__(
+            self,
+            endpoint_url: str,
+            auth: Optional[Tuple[str, str]] = None,
+            pool_size: int = 4,
+            retries: int = 3,
+            timeout: float = 300.0
+    ):
+        """
+        Failed requests (connection errors, 429 and 5xx responses) are
+        retried up to retries times with an exponential backoff.
+        """
+        self.endpoint_url = endpoint_url
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._session.auth = auth
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                # SPARQL queries don't modify anything, so POSTs are safe to
+                # retry as well
+                allowed_methods=None,
+            ),
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _post(self, query: str, accept: str) -> requests.Response:
+        response = self._session.post(
+            self.endpoint_url,
+            data={'query': query},
+            headers={'Accept': accept},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+        return response
+
+    def select(self, query: str) -> List[dict]:
+        """
+        The result bindings of a SELECT query in the SPARQL 1.1 JSON results
+        format
+        """
+        response = self._post(query, 'application/sparql-results+json')
+
+        return response.json()['results']['bindings']
+
+    def construct(self, query: str) -> Graph:
+        response = self._post(
+            query,
+            'application/n-triples, text/turtle;q=0.9, application/rdf+xml;q=0.8')
+        content_type = response.headers.get('Content-Type', '').split(';')[0]
+
+        return Graph().parse(
+            data=response.content,
+            format=_RDF_CONTENT_TYPES.get(content_type.strip(), 'turtle'))
+
+    def close(self):
+        self._session.close()
+
+
+def get_focus_node_pattern(shapes_graph: Graph, shape: Node) -> str:
+    """
+    SPARQL group graph pattern binding the focus nodes of shape to ?focus
+    """
+    patterns = []
+
+    target_nodes = list(shapes_graph.objects(shape, SH.targetNode))
+    if target_nodes:
+        patterns.append(
+            f'VALUES ?focus {{ {" ".join(n.n3() for n in target_nodes)} }}')
+
+    target_classes = list(shapes_graph.objects(shape, SH.targetClass))
+    if (shape, RDF.type, RDFS.Class) in shapes_graph:
+        target_classes.append(shape)
+    for cls in target_classes:
+        patterns.append(f'?focus a/{RDFS.subClassOf.n3()}* {cls.n3()}')
+
+    for p in shapes_graph.objects(shape, SH.targetSubjectsOf):
+        patterns.append(f'?focus {p.n3()} []')
+
+    for p in shapes_graph.objects(shape, SH.targetObjectsOf):
+        patterns.append(f'[] {p.n3()} ?focus')
+
+    return ' UNION '.join(f'{{ {pattern} }}' for pattern in patterns)
+
+
+def _binding_term(binding: dict) -> Node:
+    """
+    rdflib term of a value in the SPARQL 1.1 JSON results format
+    """
+    if binding['type'] == 'uri':
+        return URIRef(binding['value'])
+    if binding['type'] == 'bnode':
+        return BNode(binding['value'])
+
+    return Literal(
+        binding['value'],
+        lang=binding.get('xml:lang'),
+        datatype=binding.get('datatype'))
+
+
+def _key_page_query(
+        focus_node_pattern: str,
+        limit: int,
+        lower_key: Optional[str]
+) -> str:
+    # blank nodes can't be compared to or referred to from another query
+    key_filter = f' && STR(?focus) >= {Literal(lower_key).n3()}' \
+        if lower_key is not None else ''
+
+    return f'''
+SELECT DISTINCT ?focus
+WHERE {{
+  {{ {focus_node_pattern} }}
+  FILTER(!isBlank(?focus){key_filter})
+}}
+ORDER BY STR(?focus)
+LIMIT {limit}'''
+
+
+def _blank_page_pattern(
+        focus_node_pattern: str,
+        page_size: int,
+        offset: int
+) -> str:
+    return f'''{{
+    SELECT DISTINCT ?focus
+    WHERE {{
+      {{ {focus_node_pattern} }}
+      FILTER(isBlank(?focus))
+    }}
+    ORDER BY ?focus
+    LIMIT {page_size}
+    OFFSET {offset}
+  }}'''
+
+
+def _description_query(
+        page_pattern: str,
+        target_predicates: List[Node],
+        with_object_types: bool
+) -> str:
+    # The focus nodes are marked, so those without any triples (e.g.
+    # sh:targetNode nodes or literals) are known, and one triple per
+    # sh:targetObjectsOf focus node makes it a target in the page, too.
+    # Everything is fetched in one query, as blank nodes can't be matched
+    # across queries.
+    target_patterns = ''.join(
+        f'''
+  UNION {{
+    SELECT ?focus ?target_p (SAMPLE(?s) AS ?subject)
+    WHERE {{
+      {page_pattern}
+      ?s {p.n3()} ?focus .
+      BIND({p.n3()} AS ?target_p)
+    }}
+    GROUP BY ?focus ?target_p
+  }}'''
+        for p in target_predicates)
+    # the classes of the values for sh:class constraints
+    object_types_pattern = f'''
+  UNION {{
+    {page_pattern}
+    ?focus ?value_p ?value .
+    ?value a ?type .
+  }}''' if with_object_types else ''
+
+    return f'''
+CONSTRUCT {{
+  ?focus ?p ?o .
+  ?subject ?target_p ?focus .
+  ?value a ?type .
+  {_FOCUS_NODE.n3()} {_FOCUS_NODE.n3()} ?focus .
+}}
+WHERE {{
+  {{ {page_pattern} }}
+  UNION {{
+    {page_pattern}
+    ?focus ?p ?o .
+  }}{target_patterns}{object_types_pattern}
+}}'''
+
+
+def _blank_count_query(focus_node_pattern: str) -> str:
+    return f'''
+SELECT (COUNT(DISTINCT ?focus) AS ?count)
+WHERE {{
+  {{ {focus_node_pattern} }}
+  FILTER(isBlank(?focus))
+}}'''
+
+
+def iter_page_patterns(
+        client: SPARQLClient,
+        focus_node_pattern: str,
+        page_size: int
+) -> Iterator[str]:
+    """
+    Yields SPARQL patterns binding ?focus to at most page_size focus nodes
+    at a time. IRIs and literals are paged by ranges of their string values
+    (FILTER(STR(?focus) >= last)), so the endpoint doesn't have to sort and
+    skip all previous pages for every page like with OFFSET. Blank nodes
+    can't be referred to in later queries and are paged by offsets.
+    """
+    lower_key = None
+    while True:
+        # one more node than fits into the page tells where the next starts
+        focus_nodes = [
+            _binding_term(binding['focus'])
+            for binding in client.select(_key_page_query(
+                focus_node_pattern, page_size + 1, lower_key))
+        ]
+        is_last_page = len(focus_nodes) <= page_size
+
+        if not is_last_page:
+            # The next page starts at the key of the first node which
+            # doesn't fit, so nodes sharing it (e.g. literals of several
+            # datatypes) are left to the next page, too.
+            lower_key = str(focus_nodes[page_size])
+            focus_nodes = [
+                n for n in focus_nodes[:page_size] if str(n) != lower_key]
+            if not focus_nodes:
+                raise ValueError(
+                    f'more than {page_size} focus nodes have the string '
+                    f'value {lower_key}, the page size has to be larger')
+
+        if focus_nodes:
+            yield f'VALUES ?focus {{ {" ".join(n.n3() for n in focus_nodes)} }}'
+
+        if is_last_page:
+            break
+
+    count = int(client.select(
+        _blank_count_query(focus_node_pattern))[0]['count']['value'])
+    for offset in range(0, count, page_size):
+        yield _blank_page_pattern(focus_node_pattern, page_size, offset)
+
+
+def _subclass_query() -> str:
+    return f'''
+CONSTRUCT {{ ?class {RDFS.subClassOf.n3()} ?superclass }}
+WHERE {{ ?class {RDFS.subClassOf.n3()} ?superclass }}'''
+
+
+def validate_endpoint(
+        client: SPARQLClient,
+        shapes_graph: Graph,
+        page_size: int = 1000,
+        concurrency: int = 4,
+        summary: Optional[ReportSummary] = None
+) -> Tuple[bool, Graph]:
+    """
+    Validates the data of the client's endpoint against shapes_graph. Up to
+    concurrency pages are fetched concurrently while the pages already
+    fetched are validated. If summary is given, the results are also counted
+    in it, including the classes of the focus nodes. Returns whether the
+    data conforms and the validation report graph, like pyshacl.validate().
+    """
+    shapes = get_targeting_shapes(shapes_graph)
+    if any(isinstance(shape, BNode) for shape in shapes):
+        raise ValueError(
+            'Endpoint validation requires all shapes with targets to be IRIs')
+
+    # the triples making sh:targetObjectsOf focus nodes targets are fetched
+    non_local_constraints = \
+        get_non_local_constraints(shapes_graph) - {SH.targetObjectsOf}
+    if non_local_constraints:
+        logger.warning(
+            'the shapes use parameters which need other nodes\' '
+            'descriptions, their results may be wrong in endpoint mode: '
+            f'{", ".join(shapes_graph.qname(p) for p in non_local_constraints)}')
+
+    with_object_types = (None, SH['class'], None) in shapes_graph
+    # needed for subclass targets and sh:class constraints
+    subclass_graph = client.construct(_subclass_query())
+
+    def iter_pages() -> Iterator[Tuple[Node, str]]:
+        for shape in shapes:
+            pattern = get_focus_node_pattern(shapes_graph, shape)
+            target_predicates = list(
+                shapes_graph.objects(shape, SH.targetObjectsOf))
+
+            num_pages = 0
+            for page_pattern in iter_page_patterns(client, pattern, page_size):
+                num_pages += 1
+                yield shape, _description_query(
+                    page_pattern, target_predicates, with_object_types)
+            logger.info(f'{shape} has {num_pages} pages of focus nodes')
+
+    def fetch_page(description_query: str) -> Tuple[Set[Node], Graph]:
+        page_graph = client.construct(description_query)
+        focus_nodes = set(page_graph.objects(_FOCUS_NODE, _FOCUS_NODE))
+        page_graph.remove((_FOCUS_NODE, None, None))
+
+        return focus_nodes, page_graph
+
+    partial_reports = []
+
+    def validate_page(shape: Node, focus_nodes: Set[Node], page_graph: Graph):
+        page_graph += subclass_graph
+
+        conforms, report_graph, _ = validate(
+            data_graph=page_graph,
+            shacl_graph=shapes_graph,
+            use_shapes=[str(shape)],
+        )
+
+        if conforms:
+            partial_reports.append((True, []))
+            return
+
+        # e.g. linked nodes of the target classes would be validated, too
+        partial_reports.append(restrict_report(report_graph, focus_nodes))
+        if summary is not None:
+            summary.add_report(report_graph, page_graph, focus_nodes)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # at most two pages per thread are held in memory at a time
+        pending: Deque[Tuple[Node, Future]] = deque()
+
+        for shape, description_query in iter_pages():
+            pending.append(
+                (shape, executor.submit(fetch_page, description_query)))
+
+            if len(pending) >= 2 * concurrency:
+                shape, future = pending.popleft()
+                validate_page(shape, *future.result())
+
+        while pending:
+            shape, future = pending.popleft()
+            validate_page(shape, *future.result())
+
+    return merge_reports(partial_reports)
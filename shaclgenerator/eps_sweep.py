@@ -0,0 +1,287 @@
+"""
+DBSCAN clusterings of the same points for many eps values at once. The
+neighbors of all points within the largest eps are searched only once, by
+the neighbor search of an EmbeddingClusterer, and the DBSCAN labels of every
+smaller eps are derived from them:
+
+- a point is a core point if its min_samples-th nearest neighbor (counting
+  the point itself) is within eps, i.e. its core distance is <= eps
+- two core points are in the same cluster if they are connected via core
+  points each within eps of the next
+- a non-core point within eps of a core point is a border point of the
+  (first) cluster of these core points, all other points are noise
+
+The labels are the same as those of the clusterer's fit_predict() at each
+eps, i.e. those of sklearn's DBSCAN(eps, min_samples) for the exact search.
+
+Example:
+
+  $ python -m shaclgenerator.eps_sweep data/Training74/mergedGraph257.nt \\
+        TuckER --eps_min 0.5 --eps_max 2.5 --num_eps 100
+"""
+import csv
+import logging
+from argparse import ArgumentParser
+from dataclasses import astuple, dataclass, fields
+from typing import Iterable, Iterator, List, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from shaclgenerator.embedding_clustering import NeighborSearch, \
+    cluster_labels
+from shaclgenerator.outlier_filtering import NOISE_LABEL
+
+logger = logging.getLogger('shaclgenerator.eps_sweep')
+
+
+@dataclass
+class SweepResult:
+    eps: float
+    num_clusters: int
+    num_outliers: int
+    tp: int
+    fp: int
+    tn: int
+    fn: int
+    acc: float
+    f1_score: float
+
+
+class NeighborGraph:
+    """
+    The neighbors of points within max_eps, from which the DBSCAN labels of
+    any eps <= max_eps are derived
+    """
+    def __init__(
+            self,
+            graph: csr_matrix,
+            max_eps: float,
+            min_samples: int = 5
+    ):
+        """
+        graph is the sparse matrix of the distances between the points within
+        max_eps of each other, i.e. the EmbeddingClusterer.neighbor_graph()
+        of a clusterer with eps=max_eps. Points are counted as their own
+        neighbors, whether the graph stores its diagonal or not.
+        """
+        self.max_eps = max_eps
+        self.num_points = graph.shape[0]
+
+        heads = np.repeat(np.arange(self.num_points), np.diff(graph.indptr))
+        not_self = graph.indices != heads
+        heads = heads[not_self]
+        tails = graph.indices[not_self].astype(np.int64)
+        distances = graph.data[not_self].astype(np.float64)
+
+        # the core distance is the distance of the (min_samples - 1)-th
+        # nearest other point, which is cheaper to select than to sort the
+        # rows by distance
+        num_neighbors = np.bincount(heads, minlength=self.num_points)
+        row_ends = np.cumsum(num_neighbors)
+        row_starts = row_ends - num_neighbors
+        k = min_samples - 2
+        self.core_distances = np.fromiter(
+            (
+                0.0 if k < 0
+                else np.partition(distances[start:end], k)[k]
+                if end - start > k else np.inf
+                for start, end in zip(row_starts.tolist(), row_ends.tolist())
+            ),
+            dtype=np.float64,
+            count=self.num_points)
+
+        # the smallest eps at which the tail is a core point within eps of
+        # the head
+        reach_eps = np.maximum(distances, self.core_distances[tails])
+
+        # Two core points are in the same cluster at eps if they are
+        # connected by links between core points within eps of each other.
+        link_eps = np.maximum(reach_eps, self.core_distances[heads])
+        links = np.isfinite(link_eps)
+        self.link_heads = heads[links]
+        self.link_tails = tails[links]
+        self.link_eps = link_eps[links]
+
+        # The head is a border point of the tail's cluster from the reach eps
+        # up to its own core distance, i.e. only links within eps of a
+        # non-core head matter.
+        border_links = reach_eps < self.core_distances[heads]
+        self.border_heads = heads[border_links]
+        self.border_tails = tails[border_links]
+        self.border_eps = reach_eps[border_links]
+
+    def labels(self, eps: float) -> np.ndarray:
+        """
+        The DBSCAN labels of the points for eps <= max_eps
+        """
+        return next(self.iter_labels([eps]))
+
+    def iter_labels(self, eps_values: Sequence[float]) -> Iterator[np.ndarray]:
+        """
+        The DBSCAN labels of the points for each of eps_values, which must be
+        ascending and not exceed max_eps. The clusters of each eps are those
+        of the previous one merged by the links within eps, so every link is
+        looked at only once.
+        """
+        eps_values = np.asarray(eps_values, dtype=np.float64)
+        assert np.all(eps_values[1:] >= eps_values[:-1]), \
+            'eps values must be ascending'
+        assert not len(eps_values) or eps_values[-1] <= self.max_eps, \
+            f'eps must not exceed {self.max_eps}'
+
+        # the links grouped by the index of the first eps value they are
+        # within
+        link_steps = np.searchsorted(eps_values, self.link_eps)\
+            .astype(np.min_scalar_type(len(eps_values)))
+        # a radix sort for small integer types
+        links = np.argsort(link_steps, kind='stable')
+        step_ends = np.cumsum(
+            np.bincount(link_steps, minlength=len(eps_values) + 1))
+
+        # the component of each point, i.e. a union-find structure whose
+        # unions of a step are done at once by connected_components()
+        components = np.arange(self.num_points)
+        step_start = 0
+        for step, eps in enumerate(eps_values):
+            step_links = links[step_start:step_ends[step]]
+            step_start = step_ends[step]
+
+            heads = components[self.link_heads[step_links]]
+            tails = components[self.link_tails[step_links]]
+            merging = heads != tails
+            if merging.any():
+                _, merged_components = connected_components(
+                    csr_matrix(
+                        (np.ones(np.count_nonzero(merging), dtype=np.int8),
+                         (heads[merging], tails[merging])),
+                        shape=(self.num_points, self.num_points)),
+                    directed=False)
+                components = merged_components[components]
+
+            yield self._labels(eps, components)
+
+    def _labels(self, eps: float, components: np.ndarray) -> np.ndarray:
+        is_core = self.core_distances <= eps
+        border_links = (self.border_eps <= eps) \
+            & ~is_core[self.border_heads]
+
+        return cluster_labels(
+            is_core,
+            components,
+            self.border_heads[border_links],
+            self.border_tails[border_links])
+
+
+def eps_grid(eps_min: float, eps_max: float, num_eps: int) -> np.ndarray:
+    return np.round(np.linspace(eps_min, eps_max, num_eps), 6)
+
+
+def num_clusters(labels: np.ndarray) -> int:
+    return len(np.unique(labels[labels != NOISE_LABEL]))
+
+
+def write_table(results: Sequence[SweepResult], file_path: str):
+    with open(file_path, 'w', newline='') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow([field.name for field in fields(SweepResult)])
+        writer.writerows(astuple(result) for result in results)
+
+
+def format_table(results: Iterable[SweepResult]) -> str:
+    header = [field.name for field in fields(SweepResult)]
+    rows = [
+        [
+            f'{value:.4f}' if isinstance(value, float) else str(value)
+            for value in astuple(result)
+        ]
+        for result in results
+    ]
+    widths = [
+        max([len(name)] + [len(row[i]) for row in rows])
+        for i, name in enumerate(header)
+    ]
+
+    return '\n'.join(
+        '  '.join(value.rjust(width) for value, width in zip(row, widths))
+        for row in [header] + rows)
+
+
+def plot_sweep(results: Sequence[SweepResult], file_path: str):
+    """
+    Plots the confusion matrix counts (left axis) and the accuracy and F1
+    score (right axis) of the results over eps into an image file
+    """
+    # the object-oriented API doesn't need pyplot's GUI backends
+    from matplotlib.figure import Figure
+
+    eps_values = [result.eps for result in results]
+
+    fig = Figure(figsize=(19.2, 9.6))
+    ax = fig.subplots()
+    count_plots = [
+        ax.plot(
+            eps_values,
+            [getattr(result, name) for result in results],
+            ':',
+            label=name.upper())[0]
+        for name in ('tp', 'fp', 'tn', 'fn')
+    ]
+    ax.add_artist(ax.legend(handles=count_plots, loc='upper right'))
+
+    ax2 = ax.twinx()
+    acc_plot, = ax2.plot(
+        eps_values, [result.acc for result in results], label='Accuracy')
+    f1_score_plot, = ax2.plot(
+        eps_values, [result.f1_score for result in results], label='F1-Score')
+    ax2.legend(handles=[acc_plot, f1_score_plot], loc='lower right')
+
+    fig.savefig(file_path)
+
+
+if __name__ == '__main__':
+    from shaclgenerator.pykeen_adapter import EmbeddingMethod, PyKEENAdapter
+
+    logging.basicConfig(level=logging.INFO)
+
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument('input_file', type=str)
+    argument_parser.add_argument(
+        'embedding_method',
+        choices=[method.value for method in EmbeddingMethod])
+    argument_parser.add_argument('--eps_min', type=float, default=0.5)
+    argument_parser.add_argument('--eps_max', type=float, default=2.5)
+    argument_parser.add_argument(
+        '--num_eps',
+        type=int,
+        default=100,
+        help="Number of evenly spaced eps values from --eps_min to --eps_max.")
+    argument_parser.add_argument(
+        '--neighbor_search',
+        choices=[search.value for search in NeighborSearch],
+        default=NeighborSearch.EXACT.value,
+        help="Search for the neighbors within --eps_max, exact or approximate.")
+    argument_parser.add_argument(
+        '--output_file',
+        type=str,
+        help="CSV file to write the table of results to.")
+    argument_parser.add_argument(
+        '--plot_file',
+        type=str,
+        help="Image file to plot the results to, e.g. a PNG file.")
+
+    args = argument_parser.parse_args()
+
+    adapter = PyKEENAdapter(
+        args.input_file,
+        EmbeddingMethod(args.embedding_method),
+        neighbor_search=NeighborSearch(args.neighbor_search))
+    results: List[SweepResult] = adapter.outlier_detector.sweep_eps(
+        eps_grid(args.eps_min, args.eps_max, args.num_eps))
+
+    print(format_table(results))
+    if args.output_file:
+        write_table(results, args.output_file)
+    if args.plot_file:
+        plot_sweep(results, args.plot_file)
@@ -0,0 +1,150 @@
+"""
+Outlier detection from entity embeddings exported by
+OutlierDetector.export_embeddings(). Once a model is trained, clustering its
+entities with another eps only needs its entity embeddings and their labels,
+which are memory-mapped from the export, so this module runs with NumPy,
+SciPy and rdflib only, without importing torch, PyKEEN or scikit-learn and
+loading the model.
+
+Example:
+
+  $ python -m shaclgenerator.exported_clustering export \\
+        data/Training74/mergedGraph257.nt TuckER out/tucker_embeddings
+  $ python -m shaclgenerator.exported_clustering cluster \\
+        out/tucker_embeddings --eps 1.81 \\
+        --input_file data/Training74/mergedGraph257.nt \\
+        --output_file out/mergedGraph257_wo_outliers.nt
+"""
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+from rdflib import Graph
+
+from shaclgenerator.embedding_clustering import NeighborSearch, \
+    make_clusterer
+from shaclgenerator.outlier_filtering import MappedGraph, iri_mask, \
+    outlier_mask
+from util.embedding_export import read_embeddings, read_entity_labels, \
+    read_meta
+
+logger = logging.getLogger('shaclgenerator.exported_clustering')
+
+
+def exported_outlier_mask(
+        dir_path: str,
+        eps: float,
+        neighbor_search: NeighborSearch = NeighborSearch.EXACT
+) -> np.ndarray:
+    """
+    Boolean mask over the entity ids of the outliers among the embeddings
+    exported to dir_path, i.e. the IRIs which DBSCAN doesn't assign to any
+    cluster. Without the graph, the IRIs are only told by their labels,
+    which literals with the same string value share.
+    """
+    embeddings = read_embeddings(dir_path)
+    if embeddings is None:
+        raise ValueError(f'{dir_path} holds no entity embeddings')
+
+    labels = make_clusterer(neighbor_search, eps).fit_predict(embeddings)
+
+    return outlier_mask(labels, iri_mask(read_entity_labels(dir_path)))
+
+
+def remove_exported_outliers(
+        rdf_graph: Graph,
+        dir_path: str,
+        eps: float,
+        neighbor_search: NeighborSearch = NeighborSearch.EXACT
+) -> Graph:
+    """
+    rdf_graph without the triples of the outliers among the embeddings
+    exported to dir_path, which have to be trained on the same graph. Graphs
+    with blank nodes are only recognized as the same if they keep their
+    blank node labels, i.e. are loaded from N-Triples by
+    util.ingestion.load_graph().
+    """
+    mapped_graph = MappedGraph.from_graph(rdf_graph)
+    if read_meta(dir_path).get('content_digest') != mapped_graph.digest():
+        raise ValueError(
+            f'the embeddings in {dir_path} were trained on another graph '
+            f'(or on another parse of a non-N-Triples file with blank nodes)')
+
+    entity_mask = exported_outlier_mask(dir_path, eps, neighbor_search) \
+        & mapped_graph.iri_mask()
+
+    # the input graph is only copied if there is anything to remove
+    if not entity_mask.any():
+        return rdf_graph
+
+    return mapped_graph.subgraph(
+        ~mapped_graph.outlier_triples_mask(entity_mask))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    argument_parser = ArgumentParser()
+    sub_parsers = argument_parser.add_subparsers(dest='command', required=True)
+
+    export_parser = sub_parsers.add_parser(
+        'export',
+        help='Trains a model (or takes it from the cache) and exports its '
+             'entity embeddings.')
+    export_parser.add_argument('input_file', type=str)
+    export_parser.add_argument('embedding_method', type=str)
+    export_parser.add_argument('output_dir', type=str)
+    export_parser.add_argument(
+        '--dtype',
+        choices=['float32', 'float16'],
+        default='float32',
+        help="Type to store the embeddings as. float16 halves their size at "
+             "the cost of precision.")
+
+    cluster_parser = sub_parsers.add_parser(
+        'cluster',
+        help='Clusters exported entity embeddings and optionally removes the '
+             'outliers from the graph they were trained on.')
+    cluster_parser.add_argument('export_dir', type=str)
+    cluster_parser.add_argument('--eps', type=float, default=0.5)
+    cluster_parser.add_argument(
+        '--neighbor_search',
+        choices=[search.value for search in NeighborSearch],
+        default=NeighborSearch.EXACT.value)
+    cluster_parser.add_argument(
+        '--input_file',
+        type=str,
+        help="Graph the embeddings were trained on, to remove the outliers "
+             "from.")
+    cluster_parser.add_argument(
+        '--output_file',
+        type=str,
+        help="N-Triples file to write the --input_file without the outliers "
+             "to.")
+
+    args = argument_parser.parse_args()
+
+    if args.command == 'export':
+        from shaclgenerator.pykeen_adapter import EmbeddingMethod, \
+            PyKEENAdapter
+
+        adapter = PyKEENAdapter(
+            args.input_file, EmbeddingMethod(args.embedding_method))
+        adapter.outlier_detector.export_embeddings(
+            args.output_dir, np.dtype(args.dtype))
+
+    elif args.input_file is None:
+        mask = exported_outlier_mask(
+            args.export_dir, args.eps, NeighborSearch(args.neighbor_search))
+        logger.info(f'{mask.sum()} outliers')
+
+    else:
+        from util.ingestion import load_graph
+
+        g = load_graph(args.input_file)
+        g_wo_outliers = remove_exported_outliers(
+            g, args.export_dir, args.eps, NeighborSearch(args.neighbor_search))
+        logger.info(f'removed {len(g) - len(g_wo_outliers)} triples')
+
+        if args.output_file:
+            g_wo_outliers.serialize(args.output_file, format='nt')
@@ -0,0 +1,180 @@
+"""
+Fail-fast SHACL validation which stops as soon as a given number of
+validation results is found, e.g. to only tell whether data conforms at all.
+
+Non-conforming data usually fails on many of its focus nodes, so instead of
+validating one shape after the other on all of its focus nodes, every shape
+is first validated on a small batch of its focus nodes, then on twice as
+many, and so on. Within each round, the shapes with the most results per
+focus node so far come first, followed by the shapes which are cheapest to
+validate per focus node.
+"""
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, Literal, RDF, SH, URIRef
+from rdflib.term import Node
+
+from shaclgenerator.compiled_shapes import validate
+from shaclgenerator.sharded_validation import get_target_nodes, \
+    get_targeting_shapes
+from shaclgenerator.validation_report import Triple, iter_results, \
+    merge_reports
+
+logger = logging.getLogger('shaclgenerator.fail_fast_validation')
+
+# costs of validating a shape parameter on one focus node, relative to the
+# default of 1 of constraints looking at a single path's values
+_PARAMETER_COSTS = {
+    SH.sparql: 100,
+    SH.zeroOrMorePath: 20,
+    SH.oneOrMorePath: 20,
+    SH.closed: 3,
+    SH['class']: 3,
+    SH.qualifiedValueShape: 3,
+}
+
+# parameters whose objects aren't part of the shape
+_NON_SHAPE_PARAMETERS = (
+    RDF.type,
+    SH.targetNode,
+    SH.targetClass,
+    SH.targetSubjectsOf,
+    SH.targetObjectsOf,
+)
+
+
+def shape_cost(shapes_graph: Graph, shape: Node) -> int:
+    """
+    Estimated cost of validating shape on one focus node, i.e. the weighted
+    number of its parameters, including those of nested shapes and paths
+    """
+    cost = 0
+    nodes = [shape]
+    seen = {shape}
+
+    while nodes:
+        node = nodes.pop()
+        for p, o in shapes_graph.predicate_objects(node):
+            cost += _PARAMETER_COSTS.get(p, 1)
+            if p in _NON_SHAPE_PARAMETERS or isinstance(o, Literal) \
+                    or o in seen or (o, None, None) not in shapes_graph:
+                continue
+            seen.add(o)
+            nodes.append(o)
+
+    return cost
+
+
+def _report_triples(
+        report_graph: Graph,
+        max_results: int
+) -> Tuple[int, List[Triple]]:
+    """
+    The first max_results results of report_graph, as input for
+    merge_reports(), and their number
+    """
+    report = BNode()
+    triples = [(report, RDF.type, SH.ValidationReport)]
+    num_results = 0
+
+    for result, result_triples in iter_results(report_graph):
+        if num_results == max_results:
+            break
+        triples.append((report, SH.result, result))
+        triples.extend(result_triples)
+        num_results += 1
+
+    return num_results, triples
+
+
+def validate_fail_fast(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        max_violations: int = 1,
+        first_batch_size: int = 100
+) -> Tuple[bool, Graph]:
+    """
+    Validates data_graph against shapes_graph until max_violations results
+    are found. Returns whether the data conforms and a validation report
+    graph with at most max_violations results, like pyshacl.validate().
+    """
+    shapes = get_targeting_shapes(shapes_graph)
+    partial_reports = []
+    num_results = 0
+
+    def run(
+            use_shapes: Optional[List[Node]],
+            focus_nodes: Optional[List[Node]]
+    ) -> int:
+        nonlocal num_results
+
+        conforms, report_graph, _ = validate(
+            data_graph=data_graph,
+            shacl_graph=shapes_graph,
+            use_shapes=None if use_shapes is None
+            else [str(shape) for shape in use_shapes],
+            focus_nodes=focus_nodes,
+            abort_on_first=max_violations - num_results == 1,
+        )
+        if conforms:
+            return 0
+
+        run_results, triples = _report_triples(
+            report_graph, max_violations - num_results)
+        partial_reports.append((False, triples))
+        num_results += run_results
+
+        return run_results
+
+    if any(isinstance(shape, BNode) for shape in shapes):
+        # pyshacl can only be restricted to shapes given by their IRI
+        logger.warning('some shapes are blank nodes, validating all at once')
+        run(None, None)
+        return merge_reports(partial_reports)
+
+    costs = {shape: shape_cost(shapes_graph, shape) for shape in shapes}
+    # shapes by their focus nodes, which pyshacl only accepts as IRIs, so
+    # the shapes with other focus nodes are validated as a whole in the end
+    target_nodes: Dict[Node, List[Node]] = {}
+    whole_shapes: List[Node] = []
+    for shape in shapes:
+        nodes = get_target_nodes(data_graph, shapes_graph, shape)
+        if all(isinstance(node, URIRef) for node in nodes):
+            target_nodes[shape] = sorted(nodes)
+        else:
+            whole_shapes.append(shape)
+
+    validated: Dict[Node, int] = {shape: 0 for shape in target_nodes}
+    failed: Dict[Node, int] = {shape: 0 for shape in target_nodes}
+    batch_size = first_batch_size
+    pending: Set[Node] = {
+        shape for shape, nodes in target_nodes.items() if nodes}
+
+    while pending and num_results < max_violations:
+        for shape in sorted(
+                pending,
+                key=lambda s: (-failed[s] / max(validated[s], 1), costs[s], s)):
+            nodes = target_nodes[shape][
+                validated[shape]:validated[shape] + batch_size]
+            failed[shape] += run([shape], nodes)
+            validated[shape] += len(nodes)
+
+            if validated[shape] == len(target_nodes[shape]):
+                pending.remove(shape)
+            if num_results == max_violations:
+                break
+
+        batch_size *= 2
+
+    for shape in sorted(whole_shapes, key=lambda s: (costs[s], s)):
+        if num_results == max_violations:
+            break
+        run([shape], None)
+
+    logger.info(
+        f'found {num_results} results after validating '
+        f'{sum(validated.values())} of '
+        f'{sum(len(nodes) for nodes in target_nodes.values())} focus nodes')
+
+    return merge_reports(partial_reports)
@@ -0,0 +1,212 @@
+"""
+Incremental sheXer shape regeneration. A node shape only depends on the
+instances of its target class, their outgoing triples and the classes of the
+nodes they point to (see shaclgenerator.partitioning). So after a delta of
+added and removed triples only the shapes of the classes whose instances were
+touched by the delta have to be induced again, all other shapes of the
+previous result stay valid.
+"""
+import json
+import logging
+import os
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, SH, URIRef
+
+from shaclgenerator.partitioning import count_instances, induce_class_shapes
+from util.compare_shexer_output import get_differences, get_shexer_constraints
+from util.ingestion import load_graph
+
+logger = logging.getLogger('shaclgenerator.incremental')
+
+
+def class_stats_file_path(shacl_file_path: str) -> str:
+    """
+    out/shexer_result.ttl -> out/shexer_result.stats.json
+    """
+    return os.path.splitext(shacl_file_path)[0] + '.stats.json'
+
+
+def write_class_stats(file_path: str, class_sizes: Dict[URIRef, int]):
+    with open(file_path, 'w') as stats_file:
+        json.dump(
+            {str(cls): size for cls, size in sorted(class_sizes.items())},
+            stats_file,
+            indent=2)
+
+
+def read_class_stats(file_path: str) -> Dict[URIRef, int]:
+    with open(file_path) as stats_file:
+        return {
+            URIRef(cls): size for cls, size in json.load(stats_file).items()
+        }
+
+
+def load_delta(delta_file_path: Optional[str]) -> Graph:
+    if delta_file_path is None:
+        return Graph()
+    else:
+        return load_graph(delta_file_path)
+
+
+def _classes_of(
+        g: Graph,
+        nodes: Iterable[URIRef],
+        type_property: URIRef
+) -> Set[URIRef]:
+    return {cls for node in nodes for cls in g.objects(node, type_property)}
+
+
+def class_size_changes(
+        g: Graph,
+        added: Graph,
+        removed: Graph,
+        type_property: URIRef
+) -> Counter:
+    """
+    The changes of the per-class instance counts of g by the delta, which
+    is yet to be applied by apply_delta()
+    """
+    changes = Counter()
+    type_triples = set(added.triples((None, type_property, None))) \
+        | set(removed.triples((None, type_property, None)))
+
+    for triple in type_triples:
+        was_present = triple in g
+        is_present = triple in added or (was_present and triple not in removed)
+        changes[triple[2]] += is_present - was_present
+
+    return changes
+
+
+def apply_delta(
+        g: Graph,
+        added: Graph,
+        removed: Graph,
+        type_property: URIRef
+) -> Set[URIRef]:
+    """
+    Removes and adds the delta's triples from/to g and returns the classes
+    whose node shapes may have changed, i.e. the classes of every subject of
+    a delta triple before and after the update, plus the classes of the
+    nodes pointing to a node whose class memberships changed.
+    """
+    touched_nodes = {s for s, _, _ in added} | {s for s, _, _ in removed}
+
+    retyped_nodes = {s for s, _, _ in added.triples((None, type_property, None))} \
+        | {s for s, _, _ in removed.triples((None, type_property, None))}
+    for node in retyped_nodes:
+        touched_nodes.update(g.subjects(None, node))
+        touched_nodes.update(added.subjects(None, node))
+
+    touched_classes = _classes_of(g, touched_nodes, type_property)
+
+    for triple in removed:
+        g.remove(triple)
+    for triple in added:
+        g.add(triple)
+
+    touched_classes |= _classes_of(g, touched_nodes, type_property)
+
+    logger.info(
+        f'delta of {len(added)} added and {len(removed)} removed triples '
+        f'touches {len(touched_nodes)} nodes of {len(touched_classes)} classes')
+
+    return touched_classes
+
+
+def _shape_closure(shacl_graph: Graph, node_shape: URIRef) -> Set:
+    """
+    The node shape and all blank nodes reachable from it, i.e. its property
+    shapes and their sh:in lists
+    """
+    closure = set()
+    nodes = [node_shape]
+
+    while nodes:
+        node = nodes.pop()
+        if node in closure:
+            continue
+        closure.add(node)
+        nodes.extend(
+            o for o in shacl_graph.objects(node, None) if isinstance(o, BNode))
+
+    return closure
+
+
+def replace_node_shapes(
+        shacl_graph: Graph,
+        classes: Iterable[URIRef],
+        regenerated: Graph
+):
+    """
+    Replaces the node shapes targeting the given classes (including their
+    property shapes) in shacl_graph by the shapes in regenerated
+    """
+    for cls in classes:
+        for node_shape in list(shacl_graph.subjects(SH.targetClass, cls)):
+            for node in _shape_closure(shacl_graph, node_shape):
+                shacl_graph.remove((node, None, None))
+
+    for prefix, namespace in regenerated.namespaces():
+        shacl_graph.bind(prefix, namespace, override=False)
+
+    shacl_graph += regenerated
+
+
+def regenerate_shapes(
+        g: Graph,
+        previous_shacl_file_path: str,
+        added: Graph,
+        removed: Graph,
+        type_property: str,
+        acceptance_threshold: float,
+        num_partitions: int = 1
+) -> Tuple[Graph, Dict[URIRef, int]]:
+    """
+    Updates g by the delta and the previous sheXer result accordingly. g has
+    to be the data the previous result was generated from. The per-class
+    instance counts stored next to the previous result are updated by the
+    delta instead of counting g's instances again. Returns the updated
+    shapes and the updated per-class instance counts.
+    """
+    type_property_ref = URIRef(type_property)
+    stats_file_path = class_stats_file_path(previous_shacl_file_path)
+
+    if os.path.exists(stats_file_path):
+        class_sizes = Counter(read_class_stats(stats_file_path))
+    else:
+        logger.info(
+            f'{stats_file_path} not found, counting the input\'s instances')
+        class_sizes = Counter(count_instances(g, type_property_ref))
+
+    class_sizes.update(
+        class_size_changes(g, added, removed, type_property_ref))
+    # classes without any instances left are dropped
+    class_sizes = +class_sizes
+
+    touched_classes = apply_delta(g, added, removed, type_property_ref)
+
+    shacl_graph = Graph().parse(previous_shacl_file_path, format='ttl')
+    previous_constraints = get_shexer_constraints(shacl_graph)
+
+    # touched classes without any instances left just lose their shapes
+    regenerated = induce_class_shapes(
+        g,
+        {cls: class_sizes[cls] for cls in touched_classes if cls in class_sizes},
+        type_property,
+        acceptance_threshold,
+        num_partitions
+    )
+    replace_node_shapes(shacl_graph, touched_classes, regenerated)
+
+    constraints = get_shexer_constraints(shacl_graph)
+    for target, prop_path, constraint in get_differences(
+            previous_constraints, constraints):
+        logger.info(f'removed: {target} {prop_path} {constraint}')
+    for target, prop_path, constraint in get_differences(
+            constraints, previous_constraints):
+        logger.info(f'added: {target} {prop_path} {constraint}')
+
+    return shacl_graph, class_sizes
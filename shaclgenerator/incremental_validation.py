@@ -0,0 +1,366 @@
+"""
+Incremental SHACL re-validation of data which changed by a delta of added and
+removed triples. Only the focus nodes whose validation results may have
+changed are validated again, and their results in the previous validation
+report are replaced by the new ones.
+
+The results of a focus node depend on the triples of the nodes reachable
+from it along the shapes' paths, including those of nested shapes (sh:node,
+sh:and, ...), up to the longest such chain of paths. The focus nodes affected
+by a delta are therefore the nodes which reach a changed node within this
+many steps, over the triples of the predicates used in the paths.
+
+Unbounded paths (e.g. sh:zeroOrMorePath), recursive shapes, changes of
+rdfs:subClassOf triples and SPARQL-based constraints can affect any focus
+node, so they lead to a full validation. So do blank nodes in the delta or
+as focus nodes of the previous report, as they can't be told apart from the
+data's blank nodes once parsed separately.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, Literal, RDF, RDFS, SH, URIRef
+from rdflib.collection import Collection
+from rdflib.term import Node
+
+from shaclgenerator.compiled_shapes import validate
+from shaclgenerator.sharded_validation import get_target_nodes_among, \
+    get_targeting_shapes
+from shaclgenerator.validation_report import iter_results
+
+logger = logging.getLogger('shaclgenerator.incremental_validation')
+
+# shape parameters whose shapes validate the focus node or, for property
+# shapes, its values
+_SHAPE_PARAMETERS = (
+    SH.property,
+    SH.node,
+    SH.qualifiedValueShape,
+    SH['not'],
+)
+_SHAPE_LIST_PARAMETERS = (
+    SH['and'],
+    SH['or'],
+    SH.xone,
+)
+
+# shape parameters which look at other triples of the focus node than those
+# of the shape's path
+_FOCUS_TRIPLES_PARAMETERS = (
+    SH.closed,
+    SH.equals,
+    SH.disjoint,
+    SH.lessThan,
+    SH.lessThanOrEquals,
+)
+
+# shape parameters whose results may depend on any triple
+_GLOBAL_PARAMETERS = (
+    SH.sparql,
+    SH.target,
+)
+
+
+def _path_length(
+        shapes_graph: Graph,
+        path: Node,
+        path_predicates: Set[Node]
+) -> Optional[int]:
+    """
+    The maximum number of triples path follows, or None if it is unbounded.
+    The predicates of the path are added to path_predicates.
+    """
+    if isinstance(path, URIRef):
+        path_predicates.add(path)
+        return 1
+
+    for unbounded_path in (SH.zeroOrMorePath, SH.oneOrMorePath):
+        if (path, unbounded_path, None) in shapes_graph:
+            return None
+
+    inner_path = shapes_graph.value(path, SH.inversePath) \
+        or shapes_graph.value(path, SH.zeroOrOnePath)
+    if inner_path is not None:
+        return _path_length(shapes_graph, inner_path, path_predicates)
+
+    alternative_paths = shapes_graph.value(path, SH.alternativePath)
+    lengths = [
+        _path_length(shapes_graph, sub_path, path_predicates)
+        for sub_path in Collection(shapes_graph, alternative_paths or path)
+    ]
+    if None in lengths:
+        return None
+
+    return max(lengths, default=0) if alternative_paths else sum(lengths)
+
+
+def _dependency_depth(
+        shapes_graph: Graph,
+        shape: Node,
+        depths: Dict[Node, Optional[int]],
+        path_predicates: Set[Node]
+) -> Optional[int]:
+    """
+    The maximum number of triples between a focus node of shape and the
+    nodes whose triples its results depend on, or None if it is unbounded
+    """
+    if shape in depths:
+        return depths[shape]
+    # shapes referring to themselves are unbounded
+    depths[shape] = None
+
+    path = shapes_graph.value(shape, SH.path)
+    depth = 0 if path is None \
+        else _path_length(shapes_graph, path, path_predicates)
+    if depth is None:
+        return None
+    if any((shape, p, None) in shapes_graph for p in _FOCUS_TRIPLES_PARAMETERS):
+        depth = max(depth, 1)
+
+    nested_shapes = [
+        nested_shape
+        for p in _SHAPE_PARAMETERS
+        for nested_shape in shapes_graph.objects(shape, p)
+    ] + [
+        nested_shape
+        for p in _SHAPE_LIST_PARAMETERS
+        for shape_list in shapes_graph.objects(shape, p)
+        for nested_shape in Collection(shapes_graph, shape_list)
+    ]
+
+    nested_depths = [
+        _dependency_depth(shapes_graph, nested_shape, depths, path_predicates)
+        for nested_shape in nested_shapes
+    ]
+    if None in nested_depths:
+        return None
+
+    depths[shape] = depth + max(nested_depths, default=0)
+
+    return depths[shape]
+
+
+def _neighbors(
+        g: Graph,
+        nodes: Iterable[Node],
+        steps: int,
+        path_predicates: Set[Node],
+        with_inverse_paths: bool
+) -> Set[Node]:
+    """
+    nodes and the nodes which reach one of them within the given number of
+    path_predicates triples, or which are reached by them with inverse paths
+    """
+    reached = set(nodes)
+    # literals are values which don't change, so the nodes referring to them
+    # only depend on the triple referring to them
+    frontier = [node for node in reached if not isinstance(node, Literal)]
+
+    for _ in range(steps):
+        next_frontier = []
+        for node in frontier:
+            neighbors = [s for s, p in g.subject_predicates(node)
+                         if p in path_predicates]
+            if with_inverse_paths:
+                neighbors.extend(o for p, o in g.predicate_objects(node)
+                                 if p in path_predicates)
+
+            for neighbor in neighbors:
+                if neighbor not in reached:
+                    reached.add(neighbor)
+                    if not isinstance(neighbor, Literal):
+                        next_frontier.append(neighbor)
+        frontier = next_frontier
+
+    return reached
+
+
+def _affected_nodes(
+        g: Graph,
+        added: Graph,
+        removed: Graph,
+        depth: int,
+        path_predicates: Set[Node],
+        with_inverse_paths: bool
+) -> Set[Node]:
+    """
+    The nodes whose validation results may depend on the delta in g, which
+    is either the graph before or after the delta
+    """
+    # literals are nodes, too, e.g. focus nodes of sh:targetObjectsOf
+    delta_nodes = {
+        node
+        for delta in (added, removed)
+        for s, _, o in delta
+        for node in (s, o)
+    }
+    # Of the nodes at the end of the paths only the classes are looked at
+    # (by sh:class), so the changes of all other triples affect nodes one
+    # step less far away.
+    retyped_nodes = set(added.subjects(RDF.type, None)) \
+        | set(removed.subjects(RDF.type, None))
+
+    return _neighbors(
+        g, delta_nodes, max(depth - 1, 0), path_predicates, with_inverse_paths
+    ) | _neighbors(
+        g, retyped_nodes, depth, path_predicates, with_inverse_paths
+    )
+
+
+def _full_validation_reason(
+        shapes_graph: Graph,
+        previous_report_graph: Graph,
+        added: Graph,
+        removed: Graph,
+        targeting_shapes: Set[Node],
+        depth: Optional[int]
+) -> Optional[str]:
+    if any((None, p, None) in shapes_graph for p in _GLOBAL_PARAMETERS):
+        return 'the shapes use SPARQL-based targets or constraints'
+
+    if depth is None:
+        return 'the shapes have unbounded paths or refer to themselves'
+
+    # the class hierarchy applies to all class targets and sh:class values
+    if (None, RDFS.subClassOf, None) in added \
+            or (None, RDFS.subClassOf, None) in removed:
+        return 'the delta changes the class hierarchy'
+
+    # pyshacl can only be restricted to shapes given by their IRI
+    if any(isinstance(shape, BNode) for shape in targeting_shapes):
+        return 'some shapes with targets are blank nodes'
+
+    if any(isinstance(node, BNode)
+           for delta in (added, removed)
+           for triple in delta
+           for node in triple):
+        return 'the delta contains blank nodes'
+
+    if any(isinstance(node, BNode)
+           for node in previous_report_graph.objects(None, SH.focusNode)):
+        return 'the previous report has blank node focus nodes'
+
+    return None
+
+
+def _remove_results(report_graph: Graph, focus_nodes: Iterable[Node]):
+    report = report_graph.value(None, RDF.type, SH.ValidationReport)
+    results = [
+        result
+        for focus_node in focus_nodes
+        for result in report_graph.subjects(SH.focusNode, focus_node)
+        if (report, SH.result, result) in report_graph
+    ]
+
+    for result in results:
+        report_graph.remove((report, SH.result, result))
+
+        # the result's triples, including nested results and result paths,
+        # as far as their blank nodes aren't shared with other results
+        nodes = [result]
+        while nodes:
+            node = nodes.pop()
+            for triple in list(report_graph.triples((node, None, None))):
+                report_graph.remove(triple)
+                o = triple[2]
+                if isinstance(o, BNode) and (None, None, o) not in report_graph:
+                    nodes.append(o)
+
+
+def _add_results(
+        report_graph: Graph,
+        partial_report_graph: Graph,
+        focus_nodes: Set[Node]
+):
+    report = report_graph.value(None, RDF.type, SH.ValidationReport)
+
+    for result, triples in iter_results(partial_report_graph, focus_nodes):
+        report_graph.add((report, SH.result, result))
+        for triple in triples:
+            report_graph.add(triple)
+
+
+def _apply_delta(g: Graph, added: Graph, removed: Graph):
+    for triple in removed:
+        g.remove(triple)
+    for triple in added:
+        g.add(triple)
+
+
+def revalidate(
+        g: Graph,
+        shapes_graph: Graph,
+        previous_report_graph: Graph,
+        added: Graph,
+        removed: Graph
+) -> Tuple[bool, Graph]:
+    """
+    Updates g by the delta and the validation report previous_report_graph
+    accordingly, both in place. g has to be the data the previous report was
+    produced from. Returns whether the updated data conforms and the updated
+    validation report, like pyshacl.validate().
+    """
+    targeting_shapes = get_targeting_shapes(shapes_graph)
+    depths = {}
+    path_predicates = set()
+    shape_depths = [
+        _dependency_depth(shapes_graph, shape, depths, path_predicates)
+        for shape in targeting_shapes
+    ]
+    depth = None if None in shape_depths else max(shape_depths, default=0)
+
+    reason = _full_validation_reason(
+        shapes_graph,
+        previous_report_graph,
+        added,
+        removed,
+        targeting_shapes,
+        depth
+    )
+    if reason is not None:
+        logger.info(f'validating all focus nodes again, as {reason}')
+        _apply_delta(g, added, removed)
+        conforms, report_graph, _ = validate(data_graph=g, shacl_graph=shapes_graph)
+
+        return conforms, report_graph
+
+    with_inverse_paths = (None, SH.inversePath, None) in shapes_graph
+    affected_nodes = _affected_nodes(
+        g, added, removed, depth, path_predicates, with_inverse_paths)
+    _apply_delta(g, added, removed)
+    affected_nodes |= _affected_nodes(
+        g, added, removed, depth, path_predicates, with_inverse_paths)
+    logger.info(
+        f'delta of {len(added)} added and {len(removed)} removed triples '
+        f'affects {len(affected_nodes)} nodes')
+
+    _remove_results(previous_report_graph, affected_nodes)
+
+    superclass_cache = {}
+    for shape in targeting_shapes:
+        focus_nodes = get_target_nodes_among(
+            g, shapes_graph, shape, affected_nodes, superclass_cache)
+        # an empty focus node list would mean all focus nodes to pyshacl
+        if not focus_nodes:
+            continue
+
+        # pyshacl only accepts IRIs as explicitly given focus nodes, so the
+        # shape is validated on all its focus nodes if some are blank nodes
+        # or literals
+        explicit_focus_nodes: Optional[List[Node]] = focus_nodes \
+            if all(isinstance(node, URIRef) for node in focus_nodes) else None
+
+        conforms, report_graph, _ = validate(
+            data_graph=g,
+            shacl_graph=shapes_graph,
+            use_shapes=[str(shape)],
+            focus_nodes=explicit_focus_nodes,
+        )
+        if not conforms:
+            _add_results(previous_report_graph, report_graph, set(focus_nodes))
+
+    report = previous_report_graph.value(None, RDF.type, SH.ValidationReport)
+    conforms = (report, SH.result, None) not in previous_report_graph
+    previous_report_graph.set((report, SH.conforms, Literal(conforms)))
+
+    return conforms, previous_report_graph
@@ -0,0 +1,179 @@
+"""
+Removal of outlier entities from a knowledge graph, done on the id-mapped
+triples of the embedded graph (i.e. PyKEEN's mapped_triples) instead of on
+the rdflib graph: outliers are marked in a boolean mask over all entity ids,
+which selects the triples to keep in one vectorized step. An rdflib graph
+without the outliers' triples is only built when asked for.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from rdflib import Graph, URIRef
+from rdflib.term import Node
+
+# cluster label of the points DBSCAN doesn't assign to any cluster
+NOISE_LABEL = -1
+
+
+@dataclass
+class MappedGraph:
+    """
+    The triples of an rdflib graph together with their ids, mapped like
+    PyKEEN's TriplesFactory maps labeled triples: entities (subjects and
+    objects) and relations are labeled by their string value and numbered in
+    the order of their labels. mapped_triples[i] holds the head, relation and
+    tail ids of triples[i].
+
+    An IRI and a literal with the same string value share one entity id, so
+    head_is_iri[i] and tail_is_iri[i] tell whether the head and tail of
+    triples[i] are IRIs.
+
+    Blank nodes are labeled by their rdflib id, which only stays the same
+    across runs for files which keep their labels when loaded, i.e.
+    N-Triples files loaded by util.ingestion.load_graph().
+    """
+    triples: List[Tuple[Node, Node, Node]]
+    entity_labels: List[str]
+    relation_labels: List[str]
+    mapped_triples: np.ndarray
+    head_is_iri: np.ndarray
+    tail_is_iri: np.ndarray
+
+    @classmethod
+    def from_graph(cls, g: Graph) -> 'MappedGraph':
+        triples = list(g)
+        entity_labels = sorted({
+            str(node) for s, _, o in triples for node in (s, o)})
+        relation_labels = sorted({str(p) for _, p, _ in triples})
+
+        entity_to_id = {label: idx for idx, label in enumerate(entity_labels)}
+        relation_to_id = {
+            label: idx for idx, label in enumerate(relation_labels)}
+        mapped_triples = np.fromiter(
+            (
+                idx
+                for s, p, o in triples
+                for idx in (
+                    entity_to_id[str(s)],
+                    relation_to_id[str(p)],
+                    entity_to_id[str(o)])
+            ),
+            dtype=np.int64,
+            count=3 * len(triples)
+        ).reshape(-1, 3)
+        head_is_iri = np.fromiter(
+            (isinstance(s, URIRef) for s, _, _ in triples),
+            dtype=bool,
+            count=len(triples))
+        tail_is_iri = np.fromiter(
+            (isinstance(o, URIRef) for _, _, o in triples),
+            dtype=bool,
+            count=len(triples))
+
+        return cls(
+            triples,
+            entity_labels,
+            relation_labels,
+            mapped_triples,
+            head_is_iri,
+            tail_is_iri)
+
+    @property
+    def entity_to_id(self):
+        return {label: idx for idx, label in enumerate(self.entity_labels)}
+
+    @property
+    def relation_to_id(self):
+        return {label: idx for idx, label in enumerate(self.relation_labels)}
+
+    def digest(self) -> str:
+        """
+        SHA-256 hex digest of the labeled triples, independent of their order
+        """
+        digest = hashlib.sha256()
+        for labels in (self.entity_labels, self.relation_labels):
+            for label in labels:
+                digest.update(json.dumps(label).encode('utf-8'))
+            digest.update(b'\n')
+
+        order = np.lexsort(self.mapped_triples.T[::-1])
+        digest.update(
+            np.ascontiguousarray(self.mapped_triples[order]).tobytes())
+
+        return digest.hexdigest()
+
+    def iri_mask(self) -> np.ndarray:
+        """
+        Boolean mask over the entity ids of the (HTTP) IRIs among the
+        entities, leaving out labels which only occur as literals
+        """
+        occurs_as_iri = np.zeros(len(self.entity_labels), dtype=bool)
+        occurs_as_iri[self.mapped_triples[self.head_is_iri, 0]] = True
+        occurs_as_iri[self.mapped_triples[self.tail_is_iri, 2]] = True
+
+        return iri_mask(self.entity_labels) & occurs_as_iri
+
+    def outlier_triples_mask(self, entity_mask: np.ndarray) -> np.ndarray:
+        """
+        Boolean mask over the rows of mapped_triples whose head or tail is
+        an IRI of the masked entities
+        """
+        return outlier_triples_mask(
+            self.mapped_triples,
+            entity_mask,
+            self.head_is_iri,
+            self.tail_is_iri)
+
+    def subgraph(self, triples_mask: np.ndarray) -> Graph:
+        """
+        rdflib graph of the triples selected by a boolean mask over the rows
+        of mapped_triples
+        """
+        g = Graph()
+        g.addN(
+            (*self.triples[idx], g) for idx in np.flatnonzero(triples_mask))
+
+        return g
+
+
+def iri_mask(entity_labels: Sequence[str]) -> np.ndarray:
+    """
+    Boolean mask over the entity ids of the labels which are (HTTP) IRIs,
+    i.e. the entities which can be outliers. entity_labels[i] is the label
+    of entity id i. Labels don't tell IRIs from literals with the same
+    string value, which MappedGraph.iri_mask() leaves out.
+    """
+    return np.fromiter(
+        (label.startswith('http://') for label in entity_labels),
+        dtype=bool,
+        count=len(entity_labels))
+
+
+def outlier_mask(
+        cluster_labels: np.ndarray,
+        candidate_mask: np.ndarray
+) -> np.ndarray:
+    """
+    Boolean mask over the entity ids of the candidates which don't belong to
+    any cluster
+    """
+    return (cluster_labels == NOISE_LABEL) & candidate_mask
+
+
+def outlier_triples_mask(
+        mapped_triples: np.ndarray,
+        entity_mask: np.ndarray,
+        head_is_iri: np.ndarray,
+        tail_is_iri: np.ndarray
+) -> np.ndarray:
+    """
+    Boolean mask over the rows of mapped_triples (head, relation, tail ids)
+    whose head or tail is one of the masked entities and an IRI, as told by
+    the boolean masks head_is_iri and tail_is_iri over the rows. (A literal
+    shares the entity id of an IRI with the same string value.)
+    """
+    return (entity_mask[mapped_triples[:, 0]] & head_is_iri) \
+        | (entity_mask[mapped_triples[:, 2]] & tail_is_iri)
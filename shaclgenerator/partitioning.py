@@ -0,0 +1,298 @@
+"""
+Class-partitioned shape induction. A sheXer node shape only depends on the
+instances of its target class, their outgoing triples and the classes of
+the objects they point to. So the input graph can be split into per-class
+shards which are shexed independently in a pool of worker processes and
+merged afterwards.
+
+If the input is an N-Triples file, each worker streams the file and only
+keeps its own shard in memory. Otherwise, e.g. for a graph which was parsed
+for other back ends anyway, the workers are forked from the process
+holding the whole graph and extract their shards from it.
+"""
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Collection, Dict, Iterator, List, Optional, Tuple, \
+    Union
+
+from rdflib import Graph, Literal, URIRef
+from shexer.consts import SHACL_TURTLE
+from shexer.shaper import Shaper
+
+from shaclgenerator.shexer_adapter import ShexerAdapter
+from util.ingestion import LITERAL_TERM, NTTerm, guess_rdf_format, \
+    iter_nt_lines, load_graph, nt_term_node, tokenize_nt_line
+
+logger = logging.getLogger('shaclgenerator.partitioning')
+
+# input of the worker processes, i.e. the graph or the N-Triples file to
+# extract the shards from; set before the process pool is created, so forked
+# workers inherit it instead of getting it pickled
+_input: Union[str, Graph, None] = None
+# class -> instances to consider, in case only a sample of each class' instances
+# should be shexed (see shaclgenerator.sampling)
+_class_instances: Optional[Dict[URIRef, Collection]] = None
+
+
+def count_instances(g: Graph, type_property: URIRef) -> Dict[URIRef, int]:
+    return Counter(cls for cls in g.objects(None, type_property))
+
+
+def is_streamable(input_file_path: str) -> bool:
+    """
+    Whether the input is an N-Triples file, which can be read line by line
+    """
+    return os.path.isfile(input_file_path) \
+        and (guess_rdf_format(input_file_path) or 'nt') == 'nt'
+
+
+def _iter_nt_terms(input_file_path: str) -> Iterator[Tuple[NTTerm, ...]]:
+    for line in iter_nt_lines(input_file_path):
+        nt_terms = tokenize_nt_line(line)
+        if nt_terms is not None:
+            yield nt_terms
+
+
+def count_file_instances(
+        input_file_path: str,
+        type_property: URIRef
+) -> Dict[URIRef, int]:
+    """
+    count_instances() of an N-Triples file, which is streamed instead of
+    parsed into a graph
+    """
+    class_sizes = Counter()
+    # URIRefs aren't equal to plain strings
+    type_property_iri = str(type_property)
+
+    for _, p, o in _iter_nt_terms(input_file_path):
+        if p[1] == type_property_iri:
+            class_sizes[nt_term_node(o)] += 1
+
+    return class_sizes
+
+
+def extract_file_class_shard(
+        input_file_path: str,
+        classes: List[URIRef],
+        type_property: URIRef
+) -> Graph:
+    """
+    extract_class_shard() of an N-Triples file. The file is streamed three
+    times (for the instances of the classes, their triples and the class
+    memberships of the nodes they point to), so only the shard is kept in
+    memory.
+    """
+    shard = Graph()
+    shard_classes = set(classes)
+    type_property_iri = str(type_property)
+
+    # nodes are compared by their N-Triples terms, which are only turned
+    # into rdflib terms for the triples of the shard
+    instances = set()
+    for s, p, o in _iter_nt_terms(input_file_path):
+        if p[1] == type_property_iri and nt_term_node(o) in shard_classes:
+            instances.add(s)
+
+    objects = set()
+    for nt_terms in _iter_nt_terms(input_file_path):
+        if nt_terms[0] in instances:
+            shard.add(tuple(nt_term_node(nt_term) for nt_term in nt_terms))
+            if nt_terms[2][0] != LITERAL_TERM:
+                objects.add(nt_terms[2])
+
+    objects -= instances
+    for nt_terms in _iter_nt_terms(input_file_path):
+        if nt_terms[1][1] == type_property_iri and nt_terms[0] in objects:
+            shard.add(tuple(nt_term_node(nt_term) for nt_term in nt_terms))
+
+    return shard
+
+
+def extract_class_shard(
+        g: Graph,
+        classes: List[URIRef],
+        type_property: URIRef,
+        class_instances: Optional[Dict[URIRef, Collection]] = None
+) -> Graph:
+    """
+    Collects everything sheXer needs to induce the node shapes of the given
+    classes, i.e. all triples of their instances plus the class memberships
+    of the nodes these instances point to.
+
+    If class_instances is given, only the instances listed there are
+    considered. Nodes pointed to then don't keep memberships of the shard's
+    classes they weren't selected for, as they would otherwise count as
+    (empty) instances of these classes.
+    """
+    shard = Graph()
+    shard_classes = set(classes)
+
+    def is_selected(node, cls) -> bool:
+        return cls not in shard_classes \
+            or class_instances is None \
+            or node in class_instances[cls]
+
+    for cls in classes:
+        if class_instances is None:
+            instances = g.subjects(type_property, cls)
+        else:
+            instances = class_instances[cls]
+
+        for instance in instances:
+            for s, p, o in g.triples((instance, None, None)):
+                if p == type_property and not is_selected(s, o):
+                    continue
+                shard.add((s, p, o))
+
+                if not isinstance(o, Literal):
+                    for type_triple in g.triples((o, type_property, None)):
+                        if is_selected(o, type_triple[2]):
+                            shard.add(type_triple)
+
+    return shard
+
+
+def partition_classes(
+        class_sizes: Dict[URIRef, int],
+        num_partitions: int
+) -> List[List[URIRef]]:
+    """
+    Distributes the classes over num_partitions partitions such that the
+    partitions hold roughly the same number of instances (largest classes
+    first, each one into the currently smallest partition).
+    """
+    partitions = [[] for _ in range(min(num_partitions, len(class_sizes)))]
+    partition_sizes = [0] * len(partitions)
+
+    for cls, size in sorted(class_sizes.items(), key=lambda c: -c[1]):
+        smallest = partition_sizes.index(min(partition_sizes))
+        partitions[smallest].append(cls)
+        partition_sizes[smallest] += size
+
+    return partitions
+
+
+def _induce_shapes(
+        classes: List[URIRef],
+        type_property: str,
+        acceptance_threshold: float
+) -> str:
+    if isinstance(_input, Graph):
+        shard = extract_class_shard(
+            _input, classes, URIRef(type_property), _class_instances)
+    else:
+        shard = extract_file_class_shard(
+            _input, classes, URIRef(type_property))
+
+    shaper = Shaper(
+        target_classes=[str(cls) for cls in classes],
+        rdflib_graph=shard,
+        instantiation_property=type_property,
+    )
+
+    return shaper.shex_graph(
+        output_format=SHACL_TURTLE,
+        string_output=True,
+        acceptance_threshold=acceptance_threshold,
+    )
+
+
+def induce_class_shapes(
+        g: Union[str, Graph],
+        class_sizes: Dict[URIRef, int],
+        type_property: str,
+        acceptance_threshold: float,
+        num_partitions: int,
+        class_instances: Optional[Dict[URIRef, Collection]] = None
+) -> Graph:
+    """
+    Induces the node shapes of the classes in class_sizes in num_partitions
+    parallel worker processes and merges them into one graph. g is either a
+    graph or the path of an N-Triples file, which is only supported without
+    class_instances.
+    """
+    global _input, _class_instances
+
+    _input = g
+    _class_instances = class_instances
+
+    partitions = partition_classes(class_sizes, num_partitions)
+    logger.info(
+        f'shexing {len(class_sizes)} classes in {len(partitions)} partitions')
+
+    shacl_graph = Graph()
+
+    with ProcessPoolExecutor(
+            max_workers=len(partitions) or 1,
+            mp_context=multiprocessing.get_context('fork')
+    ) as executor:
+        futures = [
+            executor.submit(
+                _induce_shapes,
+                classes,
+                type_property,
+                acceptance_threshold)
+            for classes in partitions
+        ]
+
+        # the node shapes of different classes don't overlap, so the
+        # partial results can simply be merged
+        for future in futures:
+            shacl_graph.parse(data=future.result(), format='ttl')
+
+    return shacl_graph
+
+
+class PartitionedShexerAdapter(ShexerAdapter):
+    def __init__(
+            self,
+            input_file_path_or_graph: Union[str, Graph],
+            num_partitions: int,
+            class_instances: Optional[Dict[URIRef, Collection]] = None
+    ):
+        """
+        class_instances optionally restricts the instances shexed per class,
+        e.g. to a sample of them. Once shexed, class_sizes holds the number
+        of instances shexed per class.
+        """
+        super().__init__(input_file_path_or_graph)
+        self.num_partitions = num_partitions
+        self.class_instances = class_instances
+        self.class_sizes: Optional[Dict[URIRef, int]] = None
+
+    def generate_shacl(self) -> Graph:
+        if isinstance(self.input, Graph):
+            g = self.input
+        elif self.class_instances is None and is_streamable(self.input):
+            # each worker only reads its shard from the file
+            g = self.input
+        else:
+            g = load_graph(self.input)
+
+        if self.class_instances is None and not isinstance(g, Graph):
+            class_sizes = count_file_instances(g, URIRef(self.type_property))
+        elif self.class_instances is None:
+            class_sizes = count_instances(g, URIRef(self.type_property))
+        else:
+            class_sizes = {
+                cls: len(instances)
+                for cls, instances in self.class_instances.items()
+            }
+        self.class_sizes = class_sizes
+
+        return induce_class_shapes(
+            g,
+            class_sizes,
+            self.type_property,
+            self.acceptance_threshold,
+            self.num_partitions,
+            self.class_instances
+        )
+
+    def write_shacl(self, output_file_path: str):
+        self.generate_shacl().serialize(
+            destination=output_file_path, format='ttl')
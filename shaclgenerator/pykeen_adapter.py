@@ -1,24 +1,28 @@
-import os
-import tempfile
+import copy
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence
 
 import numpy as np
+import torch
 from pykeen.datasets import Dataset
+from pykeen.models import Model
 from pykeen.triples import TriplesFactory
-from rdflib import Graph, URIRef
+from rdflib import Graph
 from pykeen.pipeline import pipeline
 from shaclgen.shaclgen import data_graph
-from sklearn.cluster import DBSCAN
-import matplotlib.pyplot as plt
 from shexer.shaper import Shaper
 from shexer.consts import NT, SHACL_TURTLE
 
 import util.cache as cache
-from util.lubmevaluator import LUMBEvaluator
-from util.cache import CacheMiss
+from util.lubmevaluator import LUMBEvaluator, entity_masks
+from util.cache import CacheMiss, EmbeddingCache, embedding_key
+from util.embedding_export import write_embeddings
 from shaclgenerator import SHACLGenerator
-from util import nt_to_tsv
+from shaclgenerator.embedding_clustering import NeighborSearch, \
+    as_points, make_clusterer
+from shaclgenerator.eps_sweep import NeighborGraph, SweepResult, num_clusters
+from shaclgenerator.outlier_filtering import MappedGraph, outlier_mask
+from util.ingestion import load_graph
 
 
 class EmbeddingMethod(Enum):
@@ -1232,121 +1236,239 @@ class EmbeddingMethod(Enum):
     UM = 'UM'
 
 
+def get_entity_embeddings(model: Model) -> Optional[np.ndarray]:
+    """
+    The primary entity embeddings of a trained model by entity id, or None if
+    the model has no entity representations
+    """
+    if not hasattr(model, 'entity_representations'):
+        return None
+
+    # -> https://pykeen.readthedocs.io/en/latest/tutorial/first_steps.html#using-learned-embeddings :
+    #
+    # ``Knowledge graph embedding models can potentially have multiple
+    #   entity representations and multiple relation representations, so
+    #   they are respectively stored as sequences in the
+    #   entity_representations and relation_representations attributes
+    #   of each model. While the exact contents of these sequences are
+    #   model-dependent, the first element of each is usually the
+    #   "primary" representation for either the entities or relations.
+    #
+    #   Typically, the values in these sequences are instances of the
+    #   `pykeen.nn.representation.Embedding`. This implements a similar,
+    #   but more powerful, interface to the built-in
+    #   `torch.nn.Embedding` class. However, the values in these
+    #   sequences can more generally be instances of any subclasses of
+    #   `pykeen.nn.representation.Representation`. This allows for more
+    #   powerful encoders those in GNNs such as `pykeen.models.RGCN` to
+    #   be implemented and used.''
+    main_embedding_index = 0
+    entity_embedding_tensor = \
+        model.entity_representations[main_embedding_index]()
+
+    return entity_embedding_tensor.detach().numpy()
+
+
 class OutlierDetector:
     def __init__(
             self,
-            input_file_path: str,
-            dataset_name: str,
             rdf_graph: Graph,
             embedding_method: str,
-            eps: float = 0.5
+            eps: float = 0.5,
+            neighbor_search: NeighborSearch = NeighborSearch.EXACT,
+            pipeline_kwargs: Optional[Dict[str, Any]] = None,
+            embedding_cache: Optional[EmbeddingCache] = cache.default_cache
     ):
-
-        self.input_file_path = input_file_path
+        """
+        Trains embedding_method on rdf_graph with PyKEEN's pipeline, with
+        the (JSON serializable) pipeline_kwargs, unless the embedding_cache
+        holds the entity embeddings of such a model already. Pass None as
+        embedding_cache to always train.
+        """
         self.rdf_graph = rdf_graph
-        self.triples_factory = TriplesFactory.from_path(input_file_path)
-        self.dataset = Dataset.from_path(input_file_path)
+        # the id mapping shared by the triples factory, the dataset split
+        # from it and the outlier removal
+        self.mapped_graph = MappedGraph.from_graph(rdf_graph)
+        self.triples_factory = TriplesFactory(
+            mapped_triples=torch.as_tensor(self.mapped_graph.mapped_triples),
+            entity_to_id=self.mapped_graph.entity_to_id,
+            relation_to_id=self.mapped_graph.relation_to_id,
+        )
+        self.dataset = Dataset.from_tf(self.triples_factory)
 
-        # reverse the entity-to-index mapping to get an index-to-entity mapping
-        self.id_to_entity = {v: k for k, v in self.dataset.entity_to_id.items()}
+        # index-to-entity mapping
+        self.id_to_entity = self.mapped_graph.entity_labels
+        # entities which can be outliers
+        self.candidate_mask = self.mapped_graph.iri_mask()
 
         self.eps = eps
+        self.clusterer = make_clusterer(neighbor_search, eps)
+
+        # the model trained in this run, if any, and else the cached
+        # embeddings of an equal model
+        self.model: Optional[Model] = None
+        self.cached_embeddings: Optional[np.ndarray] = None
+        self.embedding_method = embedding_method
+        self.content_digest = self.mapped_graph.digest()
+        cache_key = embedding_key(
+            self.content_digest, embedding_method, pipeline_kwargs)
 
         try:
-            self.model = cache.load(dataset_name, embedding_method)
+            if embedding_cache is None:
+                raise CacheMiss()
+            self.cached_embeddings = embedding_cache.load(cache_key)
 
         except CacheMiss:
             embedding_results = pipeline(
                 dataset=self.dataset,
-                model=embedding_method
+                model=embedding_method,
+                **(pipeline_kwargs or {})
             )
-
-            cache.store(dataset_name, embedding_method, embedding_results)
             self.model = embedding_results.model
 
+            if embedding_cache is not None:
+                embedding_cache.store(
+                    cache_key,
+                    get_entity_embeddings(self.model),
+                    self.mapped_graph.entity_labels,
+                    meta={
+                        'model': embedding_method,
+                        'pipeline_kwargs': pipeline_kwargs or {},
+                        'content_digest': self.content_digest,
+                    })
+
+    def get_embeddings(self) -> Optional[np.ndarray]:
+        """
+        The primary entity embeddings of the model by entity id, or None if
+        the model has no entity representations
+        """
+        if self.model is None:
+            return self.cached_embeddings
+
+        return get_entity_embeddings(self.model)
+
+    def export_embeddings(
+            self,
+            dir_path: str,
+            dtype: np.dtype = np.float32
+    ):
+        """
+        Writes the entity embeddings, converted to dtype, and their entity
+        labels to dir_path, from where exported_clustering clusters them
+        without torch and PyKEEN
+        """
+        write_embeddings(
+            dir_path,
+            self.get_embeddings(),
+            self.mapped_graph.entity_labels,
+            meta={
+                'model': self.embedding_method,
+                'content_digest': self.content_digest,
+            },
+            dtype=dtype)
+
+    def get_outlier_mask(self) -> Optional[np.ndarray]:
+        """
+        Boolean mask over the entity ids of the outliers, i.e. the IRIs which
+        DBSCAN doesn't assign to any cluster, or None if the model has no
+        entity representations
+        """
+        numpy_embeddings = self.get_embeddings()
+        if numpy_embeddings is None:
+            return None
+
+        return outlier_mask(
+            self.clusterer.fit_predict(numpy_embeddings), self.candidate_mask)
+
+    def sweep_eps(
+            self,
+            eps_values: Sequence[float],
+            min_samples: int = 5,
+            numpy_embeddings: Optional[np.ndarray] = None
+    ) -> List[SweepResult]:
+        """
+        Clusters the embeddings with DBSCAN for each of eps_values and scores
+        the outliers found with the LUMBEvaluator, in ascending order of eps.
+        The neighbors of the embeddings are searched once for the largest eps
+        value, with the neighbor search of self.clusterer, instead of in
+        every DBSCAN fit. The embeddings are taken from get_embeddings()
+        unless given.
+        """
+        if numpy_embeddings is None:
+            numpy_embeddings = self.get_embeddings()
+        if numpy_embeddings is None:
+            return []
+
+        eps_values = sorted(eps_values)
+        clusterer = copy.copy(self.clusterer)
+        clusterer.eps = eps_values[-1]
+        neighbor_graph = NeighborGraph(
+            clusterer.neighbor_graph(as_points(numpy_embeddings)),
+            eps_values[-1],
+            min_samples)
+        masks = entity_masks(self.dataset)
+
+        results = []
+        for eps, labels in zip(
+                eps_values, neighbor_graph.iter_labels(eps_values)):
+            evaluator = LUMBEvaluator()
+            evaluator.evaluate_labels(self.dataset, labels, masks)
+
+            results.append(SweepResult(
+                eps=float(eps),
+                num_clusters=num_clusters(labels),
+                num_outliers=int(np.count_nonzero(
+                    outlier_mask(labels, self.candidate_mask))),
+                tp=evaluator.tp,
+                fp=evaluator.fp,
+                tn=evaluator.tn,
+                fn=evaluator.fn,
+                acc=evaluator.get_acc(),
+                f1_score=evaluator.get_f1_score(),
+            ))
+
+        return results
+
+    def get_remaining_triples(self) -> np.ndarray:
+        """
+        The id-mapped triples of self.triples_factory without the triples of
+        the outliers
+        """
+        mapped_triples = self.mapped_graph.mapped_triples
+        entity_mask = self.get_outlier_mask()
+
+        if entity_mask is None:
+            return mapped_triples
+
+        return mapped_triples[
+            ~self.mapped_graph.outlier_triples_mask(entity_mask)]
+
     def remove_outliers(self) -> Graph:
-        outlier_entities = []
-        if hasattr(self.model, 'entity_representations'):
-            # -> https://pykeen.readthedocs.io/en/latest/tutorial/first_steps.html#using-learned-embeddings :
-            #
-            # ``Knowledge graph embedding models can potentially have multiple
-            #   entity representations and multiple relation representations, so
-            #   they are respectively stored as sequences in the
-            #   entity_representations and relation_representations attributes
-            #   of each model. While the exact contents of these sequences are
-            #   model-dependent, the first element of each is usually the
-            #   "primary" representation for either the entities or relations.
-            #
-            #   Typically, the values in these sequences are instances of the
-            #   `pykeen.nn.representation.Embedding`. This implements a similar,
-            #   but more powerful, interface to the built-in
-            #   `torch.nn.Embedding` class. However, the values in these
-            #   sequences can more generally be instances of any subclasses of
-            #   `pykeen.nn.representation.Representation`. This allows for more
-            #   powerful encoders those in GNNs such as `pykeen.models.RGCN` to
-            #   be implemented and used.''
-            main_embedding_index = 0
-            entity_embedding_tensor = \
-                self.model.entity_representations[main_embedding_index]()
-
-            numpy_embeddings = entity_embedding_tensor.detach().numpy()
-
-            dbscan = DBSCAN(eps=self.eps)
-            dbscan.fit(numpy_embeddings)
-            # evaluator = LUMBEvaluator()
-            # evaluator.evaluate_clusters(self.dataset, dbscan)
-            # print(f'current eps: {eps} -> {num_clusters} clusters found; f1-score: {evaluator.get_f1_score()}')
-
-            # get all indexes for those nodes not belonging to any cluster
-            indexes = np.where(dbscan.labels_ == -1)
-
-            # build URIs for the nodes found in the '-1' cluster, i.e., the
-            # outlier nodes
-            outliers: List[URIRef] = \
-                [
-                    URIRef(self.id_to_entity[idx])
-                    for idx in indexes[0]
-                    if self.id_to_entity[idx].startswith('http://')
-                ]
-
-            cleaned_g = Graph()
-
-            for s, p, o in self.rdf_graph:
-                if s in outliers or o in outliers:
-                    continue
-                cleaned_g.add((s, p, o))
-
-            return cleaned_g
-
-        else:
+        entity_mask = self.get_outlier_mask()
+
+        # the input graph is only copied if there is anything to remove
+        if entity_mask is None or not entity_mask.any():
             return self.rdf_graph
 
+        return self.mapped_graph.subgraph(
+            ~self.mapped_graph.outlier_triples_mask(entity_mask))
+
 
 class PyKEENAdapter(SHACLGenerator):
     def __init__(
             self,
             input_file_path: str,
             embedding_method: EmbeddingMethod,
-            eps: float = 0.5
+            eps: float = 0.5,
+            neighbor_search: NeighborSearch = NeighborSearch.EXACT
     ):
-        g = Graph()
-        g.parse(input_file_path)
-
-        tmp_file_path = tempfile.mktemp()
-        nt_to_tsv(input_file_path, tmp_file_path)
-
-        dataset_name = input_file_path.split(os.path.sep)[-1]
-
         self.outlier_detector = OutlierDetector(
-            input_file_path=tmp_file_path,
-            dataset_name=dataset_name,
-            rdf_graph=g,
+            rdf_graph=load_graph(input_file_path),
             embedding_method=embedding_method.value,
-            eps=eps
+            eps=eps,
+            neighbor_search=neighbor_search
         )
 
-        os.remove(tmp_file_path)
-
     def generate_shacl(self, kg2shacl_method="shexer") -> Graph:
         """
         Generates SHACL from a KG with outliers. 
@@ -1387,18 +1509,3 @@ if __name__ == '__main__':
     shacl_generator = PyKEENAdapter(input_file_path, EmbeddingMethod.TuckER, eps=1.81)
     res: Graph = shacl_generator.generate_shacl()
     res.serialize('out/pykeen_TuckER_1_81_shexer_result.nt', format='ntriples')
-
-# fig, ax = plt.subplots()
-# tp_plot, = ax.plot(epss, tps, ':', label='TP')
-# fp_plot, = ax.plot(epss, fps, ':', label='FP')
-# tn_plot, = ax.plot(epss, tns, ':', label='TN')
-# fn_plot, = ax.plot(epss, fns, ':', label='FN')
-# legend1 = ax.legend(handles=[tp_plot, fp_plot, tn_plot, fn_plot], loc='upper right')
-# ax.add_artist(legend1)
-#
-# ax2 = ax.twinx()
-# acc_plot, = ax2.plot(epss, accuracies, label='Accuracy')
-# f1_score_plot, = ax2.plot(epss, f1_scores, label='F1-Score')
-# ax2.legend(handles=[acc_plot, f1_score_plot], loc='lower right')
-#
-# plt.show()
\ No newline at end of file
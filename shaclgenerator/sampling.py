@@ -0,0 +1,121 @@
+"""
+Per-class instance sampling in front of the SHACL generation back ends. For
+very large graphs the constraints inferred from a few thousand instances of
+a class are usually the same as the ones inferred from all of them, at a
+fraction of the runtime.
+"""
+import logging
+import random
+from typing import Dict, Optional, Set
+
+from rdflib import Graph, Literal, Namespace, URIRef, SH
+
+from shaclgenerator.partitioning import extract_class_shard
+
+logger = logging.getLogger('shaclgenerator.sampling')
+
+# annotations telling which data a generated constraint was derived from
+SAMPLING = Namespace('https://schema.coypu.org/shacl-generator/sampling#')
+
+
+class InstanceSample:
+    def __init__(
+            self,
+            class_instances: Dict[URIRef, Set],
+            class_sizes: Dict[URIRef, int]
+    ):
+        # class -> sampled instances
+        self.class_instances = class_instances
+        # class -> number of all instances of the class
+        self.class_sizes = class_sizes
+
+
+def sample_instances(
+        g: Graph,
+        type_property: URIRef,
+        budget: int,
+        seed: Optional[int] = None
+) -> InstanceSample:
+    """
+    Reservoir-samples (algorithm R) up to budget instances per class in a
+    single pass over the class membership triples of g.
+    """
+    rnd = random.Random(seed)
+    reservoirs: Dict[URIRef, list] = {}
+    class_sizes: Dict[URIRef, int] = {}
+
+    for instance, cls in g.subject_objects(type_property):
+        seen = class_sizes.get(cls, 0)
+        class_sizes[cls] = seen + 1
+
+        if seen < budget:
+            reservoirs.setdefault(cls, []).append(instance)
+        else:
+            idx = rnd.randint(0, seen)
+            if idx < budget:
+                reservoirs[cls][idx] = instance
+
+    logger.info(
+        f'sampled {sum(map(len, reservoirs.values()))} of '
+        f'{sum(class_sizes.values())} instances of {len(class_sizes)} classes')
+
+    return InstanceSample(
+        {cls: set(instances) for cls, instances in reservoirs.items()},
+        class_sizes
+    )
+
+
+def build_sample_graph(
+        g: Graph,
+        sample: InstanceSample,
+        type_property: URIRef
+) -> Graph:
+    """
+    The sampled instances with all their triples plus the class memberships
+    of the nodes they point to
+    """
+    return extract_class_shard(
+        g, list(sample.class_instances), type_property, sample.class_instances)
+
+
+def annotate_support(
+        shacl_graph: Graph,
+        g: Graph,
+        sample: InstanceSample
+):
+    """
+    Adds the number of sampled (SAMPLING.sampleSize) and overall
+    (SAMPLING.instanceCount) instances to every node shape, and to every
+    property shape the number of sampled instances having a value for its
+    path (SAMPLING.support).
+    """
+    shacl_graph.bind('sampling', SAMPLING)
+    property_shape_classes: Dict = {}
+
+    for node_shape, cls in list(shacl_graph.subject_objects(SH.targetClass)):
+        if cls not in sample.class_sizes:
+            continue
+        sampled = sample.class_instances.get(cls, set())
+
+        shacl_graph.add(
+            (node_shape, SAMPLING.sampleSize, Literal(len(sampled))))
+        shacl_graph.add(
+            (node_shape, SAMPLING.instanceCount,
+             Literal(sample.class_sizes[cls])))
+
+        for property_shape in shacl_graph.objects(node_shape, SH.property):
+            property_shape_classes.setdefault(property_shape, set()).add(cls)
+
+    # property shapes may be shared by the node shapes of several classes
+    for property_shape, classes in property_shape_classes.items():
+        path = shacl_graph.value(property_shape, SH.path)
+        if not isinstance(path, URIRef):
+            continue
+
+        instances = set().union(
+            *(sample.class_instances.get(cls, set()) for cls in classes))
+        support = sum(
+            1 for instance in instances
+            if g.value(instance, path) is not None)
+
+        shacl_graph.add((property_shape, SAMPLING.support, Literal(support)))
@@ -1,19 +1,19 @@
-import io
-from contextlib import redirect_stdout
-from io import StringIO
+from typing import Union
 
 from rdflib import Graph
 from shaclgen.shaclgen import data_graph
 
 from shaclgenerator import SHACLGenerator
+from util.ingestion import load_graph
 
 
 class ShaclgenAdapter(SHACLGenerator):
-    def __init__(self, input_file_path: str):
-        # with open(input_file_path, 'rb') as input_file:
-        #     input = input_file.read()
-        g = Graph()
-        g.parse(input_file_path)
+    def __init__(self, input_file_path_or_graph: Union[str, Graph]):
+        if isinstance(input_file_path_or_graph, Graph):
+            g = input_file_path_or_graph
+        else:
+            g = load_graph(input_file_path_or_graph)
+
         self._shaclgen = data_graph(g)
 
     def generate_shacl(self) -> Graph:
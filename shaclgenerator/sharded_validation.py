@@ -0,0 +1,256 @@
+"""
+Sharded parallel SHACL validation. The shapes' focus nodes are distributed
+over several shards which are validated with pyshacl in a pool of worker
+processes, and the per-shard validation reports are merged into one.
+
+Focus nodes are either partitioned by target class, i.e. each shard gets a
+set of (node) shapes and pyshacl determines their focus nodes itself, or by a
+hash of the focus nodes, which also splits up the focus nodes of large
+classes. The data and shapes graphs are inherited by the forked workers, so
+each shard sees every triple its constraints might need.
+"""
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, RDF, RDFS, SH, URIRef
+from rdflib.term import Node
+
+from shaclgenerator.compiled_shapes import compile_shapes, validate
+from shaclgenerator.partitioning import partition_classes
+from shaclgenerator.validation_report import merge_reports
+
+logger = logging.getLogger('shaclgenerator.sharded_validation')
+
+# one pyshacl run: the shapes to validate and the focus nodes to validate
+# them on (None meaning all of the shapes' targets)
+ValidationTask = Tuple[List[URIRef], Optional[List[Node]]]
+
+# data and shapes graphs and shards of the worker processes; set before the
+# process pool is created, so forked workers inherit them instead of getting
+# them pickled
+_data_graph: Optional[Graph] = None
+_shapes_graph: Optional[Graph] = None
+_shards: List[List[ValidationTask]] = []
+
+
+class ShardingStrategy(Enum):
+    CLASS = 'class'
+    HASH = 'hash'
+
+
+def get_targeting_shapes(shapes_graph: Graph) -> Set[Node]:
+    """
+    Shapes which declare targets, i.e. whose focus nodes are determined by
+    the data. All other shapes are only validated via shapes referencing them.
+    """
+    shapes = set()
+
+    for target_property in (
+            SH.targetNode,
+            SH.targetClass,
+            SH.targetSubjectsOf,
+            SH.targetObjectsOf):
+        shapes.update(shapes_graph.subjects(target_property, None))
+
+    # implicit class targets
+    for shape_type in (SH.NodeShape, SH.PropertyShape):
+        for shape in shapes_graph.subjects(RDF.type, shape_type):
+            if (shape, RDF.type, RDFS.Class) in shapes_graph:
+                shapes.add(shape)
+
+    return shapes
+
+
+def get_target_nodes(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        shape: Node
+) -> Set[Node]:
+    """
+    The focus nodes of shape in data_graph as defined by the SHACL target
+    declarations
+    """
+    nodes = set(shapes_graph.objects(shape, SH.targetNode))
+
+    target_classes = set(shapes_graph.objects(shape, SH.targetClass))
+    if (shape, RDF.type, RDFS.Class) in shapes_graph:
+        target_classes.add(shape)
+
+    for target_class in target_classes:
+        for cls in data_graph.transitive_subjects(RDFS.subClassOf, target_class):
+            nodes.update(data_graph.subjects(RDF.type, cls))
+
+    for p in shapes_graph.objects(shape, SH.targetSubjectsOf):
+        nodes.update(data_graph.subjects(p, None))
+
+    for p in shapes_graph.objects(shape, SH.targetObjectsOf):
+        nodes.update(data_graph.objects(None, p))
+
+    return nodes
+
+
+def _superclasses(g: Graph, cls: Node, cache: Dict[Node, Set[Node]]) -> Set[Node]:
+    if cls not in cache:
+        cache[cls] = set(g.transitive_objects(cls, RDFS.subClassOf))
+
+    return cache[cls]
+
+
+def get_target_nodes_among(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        shape: Node,
+        candidates: Set[Node],
+        superclass_cache: Dict[Node, Set[Node]]
+) -> List[Node]:
+    """
+    The candidates which are focus nodes of shape in data_graph, like
+    get_target_nodes() but without looking at any other nodes. Superclasses
+    looked up in data_graph are kept in superclass_cache.
+    """
+    target_nodes = set(shapes_graph.objects(shape, SH.targetNode))
+    target_classes = set(shapes_graph.objects(shape, SH.targetClass))
+    if (shape, RDF.type, RDFS.Class) in shapes_graph:
+        target_classes.add(shape)
+    subjects_of = list(shapes_graph.objects(shape, SH.targetSubjectsOf))
+    objects_of = list(shapes_graph.objects(shape, SH.targetObjectsOf))
+
+    nodes = []
+    for node in candidates:
+        if node in target_nodes \
+                or any(not target_classes.isdisjoint(
+                    _superclasses(data_graph, cls, superclass_cache))
+                    for cls in data_graph.objects(node, RDF.type)) \
+                or any((node, p, None) in data_graph for p in subjects_of) \
+                or any((None, p, node) in data_graph for p in objects_of):
+            nodes.append(node)
+
+    return sorted(nodes)
+
+
+def shard_by_class(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        shapes: Iterable[URIRef],
+        num_shards: int
+) -> List[List[ValidationTask]]:
+    """
+    Distributes the shapes over num_shards shards such that the shards have
+    roughly the same number of focus nodes
+    """
+    shape_sizes = {
+        shape: len(get_target_nodes(data_graph, shapes_graph, shape))
+        for shape in shapes
+    }
+
+    return [
+        [(shard_shapes, None)]
+        for shard_shapes in partition_classes(shape_sizes, num_shards)
+    ]
+
+
+def shard_by_hash(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        shapes: Iterable[URIRef],
+        num_shards: int
+) -> List[List[ValidationTask]]:
+    """
+    Distributes the focus nodes of every shape over num_shards shards by a
+    hash of the focus node
+    """
+    shards = [[] for _ in range(num_shards)]
+
+    for shape in shapes:
+        target_nodes = get_target_nodes(data_graph, shapes_graph, shape)
+
+        # pyshacl only accepts IRIs as explicitly given focus nodes, so
+        # shapes targeting blank nodes are validated as a whole
+        if any(not isinstance(node, URIRef) for node in target_nodes):
+            shard = zlib.crc32(shape.encode('utf-8')) % num_shards
+            shards[shard].append(([shape], None))
+            continue
+
+        shard_nodes = [[] for _ in range(num_shards)]
+        for node in target_nodes:
+            shard_nodes[zlib.crc32(node.encode('utf-8')) % num_shards].append(node)
+
+        for shard, nodes in enumerate(shard_nodes):
+            # an empty focus node list would mean all focus nodes to pyshacl
+            if nodes:
+                shards[shard].append(([shape], nodes))
+
+    return [shard for shard in shards if shard]
+
+
+def _validate_shard(shard_index: int) -> Tuple[bool, List[Tuple[Node, Node, Node]]]:
+    conforms = True
+    triples = []
+
+    for shapes, focus_nodes in _shards[shard_index]:
+        task_conforms, results_graph, _ = validate(
+            data_graph=_data_graph,
+            shacl_graph=_shapes_graph,
+            use_shapes=[str(shape) for shape in shapes],
+            focus_nodes=focus_nodes,
+        )
+        conforms = conforms and task_conforms
+        triples.extend(results_graph)
+
+    # Triples (instead of graphs) pickle fast, and blank nodes keep their
+    # IDs, so results still point to the same blank node property shapes
+    return conforms, triples
+
+
+def validate_sharded(
+        data_graph: Graph,
+        shapes_graph: Graph,
+        num_workers: int,
+        strategy: ShardingStrategy = ShardingStrategy.CLASS
+) -> Tuple[bool, Graph]:
+    """
+    Validates data_graph against shapes_graph in num_workers worker
+    processes. Returns whether the data conforms and the validation report
+    graph, like pyshacl.validate().
+    """
+    global _data_graph, _shapes_graph, _shards
+
+    shapes = get_targeting_shapes(shapes_graph)
+    blank_node_shapes = [shape for shape in shapes if isinstance(shape, BNode)]
+    if blank_node_shapes:
+        # pyshacl can only be restricted to shapes given by their IRI
+        logger.warning(
+            f'{len(blank_node_shapes)} shapes are blank nodes, validating '
+            f'in a single process')
+        conforms, report_graph, _ = validate(
+            data_graph=data_graph, shacl_graph=shapes_graph)
+        return conforms, report_graph
+
+    if strategy == ShardingStrategy.CLASS:
+        shards = shard_by_class(data_graph, shapes_graph, shapes, num_workers)
+    elif strategy == ShardingStrategy.HASH:
+        shards = shard_by_hash(data_graph, shapes_graph, shapes, num_workers)
+    else:
+        raise ValueError(f'unknown sharding strategy {strategy}')
+
+    logger.info(
+        f'validating {len(shapes)} shapes in {len(shards)} shards '
+        f'({strategy.value} sharding)')
+
+    _data_graph = data_graph
+    _shapes_graph = shapes_graph
+    _shards = shards
+    # compiled once here instead of in every worker
+    compile_shapes(shapes_graph)
+
+    with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(shards)) or 1,
+            mp_context=multiprocessing.get_context('fork')
+    ) as executor:
+        partial_reports = list(executor.map(_validate_shard, range(len(shards))))
+
+    return merge_reports(partial_reports)
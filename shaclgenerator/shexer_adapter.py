@@ -1,36 +1,93 @@
-from io import StringIO
+from typing import Optional, Union
 
 from rdflib import Graph, RDF
-from shexer.consts import NT, SHACL_TURTLE
+from shexer.consts import GZ, JSON_LD, NT, RDF_XML, SHACL_TURTLE, TURTLE
 from shexer.shaper import Shaper
 
 from shaclgenerator import SHACLGenerator
+from util.indexed_store import is_indexed_store
+from util.ingestion import guess_rdf_format, is_compressed, \
+    is_sparql_endpoint, load_graph
+
+# rdflib format names -> sheXer input formats
+_SHEXER_INPUT_FORMATS = {
+    'nt': NT,
+    'turtle': TURTLE,
+    'xml': RDF_XML,
+    'json-ld': JSON_LD,
+}
 
 
 class ShexerAdapter(SHACLGenerator):
-    def __init__(self, input_file_path_or_sparql_endpoint: str):
-        if input_file_path_or_sparql_endpoint.startswith('http'):
-            self.shaper = Shaper(
+    def __init__(self, input_file_path_or_sparql_endpoint: Union[str, Graph]):
+        """
+        The input can either be a file path, a SPARQL endpoint URL or an
+        already loaded rdflib graph, which is then shared with the other back
+        ends instead of being parsed again.
+        """
+        self.input = input_file_path_or_sparql_endpoint
+        self.acceptance_threshold = 0.0
+        self.type_property = str(RDF.type)
+        self._shaper: Optional[Shaper] = None
+
+    def _build_shaper(self) -> Shaper:
+        if isinstance(self.input, Graph):
+            return Shaper(
+                all_classes_mode=True,
+                rdflib_graph=self.input,
+                instantiation_property=self.type_property,
+            )
+        elif is_sparql_endpoint(self.input):
+            return Shaper(
+                all_classes_mode=True,
+                url_endpoint=self.input,
+                instantiation_property=self.type_property,
+            )
+        elif is_indexed_store(self.input) \
+                or (is_compressed(self.input) and not self.input.endswith('.gz')):
+            # sheXer only reads files and only decompresses gzip files
+            # itself, so stores and other compressed inputs are handed over
+            # as rdflib graph
+            return Shaper(
                 all_classes_mode=True,
-                url_endpoint=input_file_path_or_sparql_endpoint,
+                rdflib_graph=load_graph(self.input),
+                instantiation_property=self.type_property,
             )
         else:
-            self.shaper = Shaper(
+            return Shaper(
                 all_classes_mode=True,
-                graph_file_input=input_file_path_or_sparql_endpoint,
-                input_format=NT,
+                graph_file_input=self.input,
+                input_format=_SHEXER_INPUT_FORMATS.get(
+                    guess_rdf_format(self.input), NT),
+                compression_mode=GZ if is_compressed(self.input) else None,
+                instantiation_property=self.type_property,
             )
-        self.acceptance_threshold = 0.0
-        self.type_property = str(RDF.type)
-            
+
+    def _get_shaper(self) -> Shaper:
+        # sheXer keeps the induced shapes, so writing them to a file and
+        # building a graph afterwards doesn't induce them twice
+        if self._shaper is None:
+            self._shaper = self._build_shaper()
+
+        return self._shaper
+
     def generate_shacl(self) -> Graph:
-        g = Graph()
-        g.parse(
-            StringIO(self.shaper.shex_graph(
-                output_format=SHACL_TURTLE,
-                string_output=True,
-                acceptance_threshold=self.acceptance_threshold,
-            )),
-            format='ttl')
-
-        return g
+        """
+        Builds an rdflib graph of the induced shapes. If the shapes only need
+        to end up in a file, write_shacl() is much cheaper.
+        """
+        shacl_ttl_str = self._get_shaper().shex_graph(
+            output_format=SHACL_TURTLE,
+            string_output=True,
+            acceptance_threshold=self.acceptance_threshold,
+        )
+
+        return Graph().parse(data=shacl_ttl_str, format='ttl')
+
+    def write_shacl(self, output_file_path: str):
+        # sheXer serializes its shapes to the output file right away
+        self._get_shaper().shex_graph(
+            output_format=SHACL_TURTLE,
+            output_file=output_file_path,
+            acceptance_threshold=self.acceptance_threshold,
+        )
@@ -0,0 +1,245 @@
+"""
+Streaming SHACL validation of N-Triples files which don't fit into memory.
+The input has to be grouped by subject (e.g. by `sort -k1,1 dump.nt`), so the
+descriptions of consecutive subjects can be read and validated batch by batch
+and memory is bounded by the size of a batch instead of the whole dataset.
+
+Constraints which only look at a focus node's own triples (datatypes,
+cardinalities, node kinds, sh:in, ...) are validated exactly. sh:class
+constraints and subclass targets additionally need the class memberships of
+other nodes, which an optional first pass collects into a type index. Nested
+shapes (sh:node, ...), inverse paths and path sequences need other nodes'
+full descriptions and can't be validated in streaming mode.
+"""
+import logging
+import os
+from typing import IO, Iterator, List, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, Literal, RDF, RDFS, SH
+from rdflib.term import Node
+
+from shaclgenerator.compiled_shapes import validate
+from shaclgenerator.validation_report import ReportSummary, Triple, \
+    iter_results
+from util.indexed_store import import_store, open_graph
+from util.ingestion import iter_nt_lines
+
+logger = logging.getLogger('shaclgenerator.streaming_validation')
+
+# shape parameters which need more than the focus nodes' own descriptions
+# (plus a type index)
+_NON_LOCAL_PARAMETERS = (
+    SH.node,
+    SH.qualifiedValueShape,
+    SH['not'],
+    SH['and'],
+    SH['or'],
+    SH.xone,
+    SH.sparql,
+    SH.targetObjectsOf,
+)
+
+
+def _subject_token(line: str) -> str:
+    # N-Triples IRIs and blank node labels don't contain whitespace
+    return line.split(None, 1)[0]
+
+
+def iter_subject_batches(
+        input_file_path: str,
+        batch_size: int
+) -> Iterator[List[str]]:
+    """
+    Yields the N-Triples lines of batch_size consecutive subjects at a time.
+    Raises a ValueError if a subject of the current batch shows up again
+    after another subject, i.e. if the input is not grouped by subject.
+    """
+    batch = []
+    batch_subjects = set()
+    current_subject = None
+
+    for line in iter_nt_lines(input_file_path):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+
+        subject = _subject_token(line)
+
+        if subject != current_subject:
+            if subject in batch_subjects:
+                raise ValueError(
+                    f'{input_file_path} is not grouped by subject, '
+                    f'{subject} occurs in several places')
+
+            if len(batch_subjects) == batch_size:
+                yield batch
+                batch = []
+                batch_subjects = set()
+
+            batch_subjects.add(subject)
+            current_subject = subject
+
+        batch.append(line)
+
+    if batch:
+        yield batch
+
+
+def build_type_index(
+        input_file_path: str,
+        shapes_graph: Graph,
+        index_dir_path: str
+) -> Graph:
+    """
+    Collects the rdfs:subClassOf triples of the input file, and its rdf:type
+    triples in case shapes_graph has sh:class constraints, into an indexed
+    store in index_dir_path. The store is memory-mapped, so the type index
+    doesn't take memory for every typed node during validation; only its
+    import holds the terms of the collected triples once.
+    """
+    predicates = [f'<{RDFS.subClassOf}>']
+    if (None, SH['class'], None) in shapes_graph:
+        predicates.append(f'<{RDF.type}>')
+
+    type_triples_file_path = os.path.join(index_dir_path, 'type_triples.nt')
+    store_dir_path = os.path.join(index_dir_path, 'type_index')
+
+    with open(type_triples_file_path, 'w', encoding='utf-8') as out_file:
+        for line in iter_nt_lines(input_file_path):
+            if any(predicate in line for predicate in predicates):
+                out_file.write(line)
+
+    try:
+        import_store(type_triples_file_path, store_dir_path)
+    finally:
+        os.remove(type_triples_file_path)
+
+    type_index = open_graph(store_dir_path)
+    logger.info(f'type index holds {len(type_index)} triples')
+
+    return type_index
+
+
+def get_non_local_constraints(shapes_graph: Graph) -> Set[Node]:
+    """
+    Shape parameters used in shapes_graph which can't be validated exactly
+    in streaming mode
+    """
+    parameters = {
+        p for p in _NON_LOCAL_PARAMETERS
+        if (None, p, None) in shapes_graph
+    }
+
+    # anything but a plain predicate path, e.g. an inverse path or a sequence
+    if any(isinstance(path, BNode)
+           for path in shapes_graph.objects(None, SH.path)):
+        parameters.add(SH.path)
+
+    return parameters
+
+
+def _add_type_triples(
+        batch_graph: Graph,
+        type_index: Graph,
+        subclass_triples: List[Triple],
+        class_constrained_paths: Set[Node]
+):
+    # Only the values of sh:class constrained properties get their classes,
+    # since every typed node becomes a focus node which is validated in vain
+    nodes = {
+        o
+        for path in class_constrained_paths
+        for o in batch_graph.objects(None, path)
+        if not isinstance(o, Literal)
+    }
+
+    for node in nodes:
+        for cls in type_index.objects(node, RDF.type):
+            batch_graph.add((node, RDF.type, cls))
+
+    for triple in subclass_triples:
+        batch_graph.add(triple)
+
+
+def validate_streaming(
+        input_file_path: str,
+        shapes_graph: Graph,
+        report_file: Optional[IO[str]] = None,
+        batch_size: int = 1000,
+        type_index: Optional[Graph] = None,
+        summary: Optional[ReportSummary] = None
+) -> Tuple[bool, int]:
+    """
+    Validates the subject-grouped N-Triples file input_file_path against
+    shapes_graph. If report_file is given, the validation report is written
+    to it incrementally in N-Triples format, and if summary is given, the
+    results are counted in it. Only subjects of the input are validated as
+    focus nodes. Returns whether the data conforms and the number of
+    validation results.
+    """
+    non_local_constraints = get_non_local_constraints(shapes_graph)
+    if non_local_constraints:
+        logger.warning(
+            'the shapes use parameters which need other nodes\' '
+            'descriptions, their results may be wrong in streaming mode: '
+            f'{", ".join(shapes_graph.qname(p) for p in non_local_constraints)}')
+
+    class_constrained_paths = {
+        shapes_graph.value(shape, SH.path)
+        for shape in shapes_graph.subjects(SH['class'], None)
+    }
+
+    # added to every batch, and few compared to the rdf:type triples
+    subclass_triples = [] if type_index is None \
+        else list(type_index.triples((None, RDFS.subClassOf, None)))
+
+    report = BNode()
+    num_results = 0
+    num_subjects = 0
+
+    for lines in iter_subject_batches(input_file_path, batch_size):
+        batch_graph = Graph().parse(data=''.join(lines), format='nt')
+        subjects = set(batch_graph.subjects())
+        num_subjects += len(subjects)
+
+        if type_index is not None:
+            _add_type_triples(
+                batch_graph,
+                type_index,
+                subclass_triples,
+                class_constrained_paths
+            )
+
+        conforms, batch_report_graph, _ = validate(
+            data_graph=batch_graph,
+            shacl_graph=shapes_graph,
+        )
+        if conforms:
+            continue
+
+        if summary is not None:
+            summary.add_report(batch_report_graph, batch_graph, subjects)
+
+        results = Graph()
+        # e.g. sh:targetNode focus nodes are validated in every batch
+        for result, triples in iter_results(batch_report_graph, subjects):
+            num_results += 1
+            if report_file is not None:
+                results.add((report, SH.result, result))
+                for triple in triples:
+                    results.add(triple)
+
+        if report_file is not None:
+            report_file.write(results.serialize(format='nt'))
+
+    conforms = num_results == 0
+    if report_file is not None:
+        report_file.write(Graph().add(
+            (report, RDF.type, SH.ValidationReport)
+        ).add(
+            (report, SH.conforms, Literal(conforms))
+        ).serialize(format='nt'))
+
+    logger.info(
+        f'validated {num_subjects} subjects, found {num_results} results')
+
+    return conforms, num_results
@@ -0,0 +1,237 @@
+"""
+Helpers for SHACL validation reports which are produced in several parts,
+e.g. per shard, batch or page of the data, and for summarizing them.
+"""
+import csv
+import json
+from collections import Counter
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, \
+    Tuple
+
+from rdflib import BNode, Graph, Literal, RDF, SH
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+# summary dimensions by the result property they count
+_SUMMARY_DIMENSIONS = {
+    SH.resultSeverity: 'severity',
+    SH.sourceShape: 'shape',
+    SH.resultPath: 'path',
+    SH.sourceConstraintComponent: 'constraint_component',
+}
+_FOCUS_NODE_CLASS = 'focus_node_class'
+
+
+def _result_closure(report_graph: Graph, result: Node) -> Iterator[Triple]:
+    """
+    The triples describing a validation result, including blank nodes like
+    complex result paths
+    """
+    nodes = [result]
+    seen = set()
+
+    while nodes:
+        node = nodes.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+
+        for s, p, o in report_graph.triples((node, None, None)):
+            yield s, p, o
+            if isinstance(o, BNode):
+                nodes.append(o)
+
+
+def iter_results(
+        report_graph: Graph,
+        focus_nodes: Optional[Collection[Node]] = None
+) -> Iterator[Tuple[Node, List[Triple]]]:
+    """
+    Yields the validation results of report_graph together with the triples
+    describing them. If focus_nodes is given, only results about these focus
+    nodes are considered.
+    """
+    # nested results (sh:detail, e.g. of sh:node) have focus nodes of their
+    # own, but are part of the result referring to them
+    for result in report_graph.objects(None, SH.result):
+        focus_node = report_graph.value(result, SH.focusNode)
+        if focus_nodes is not None and focus_node not in focus_nodes:
+            continue
+
+        yield result, list(_result_closure(report_graph, result))
+
+
+def merge_reports(
+        partial_reports: Iterable[Tuple[bool, Iterable[Triple]]]
+) -> Tuple[bool, Graph]:
+    """
+    Merges several validation reports into one sh:ValidationReport holding
+    all their results, which conforms if all partial reports conform
+    """
+    report_graph = Graph()
+    report_graph.bind('sh', SH)
+    report = BNode()
+    report_graph.add((report, RDF.type, SH.ValidationReport))
+
+    conforms = True
+    for partial_conforms, triples in partial_reports:
+        conforms = conforms and partial_conforms
+        partial_report_graph = Graph()
+        for triple in triples:
+            partial_report_graph.add(triple)
+
+        partial_reports_nodes = set(
+            partial_report_graph.subjects(RDF.type, SH.ValidationReport))
+
+        for s, p, o in partial_report_graph:
+            if s not in partial_reports_nodes:
+                report_graph.add((s, p, o))
+            elif p == SH.result:
+                report_graph.add((report, SH.result, o))
+
+    report_graph.add((report, SH.conforms, Literal(conforms)))
+
+    return conforms, report_graph
+
+
+def restrict_report(
+        report_graph: Graph,
+        focus_nodes: Collection[Node]
+) -> Tuple[bool, List[Triple]]:
+    """
+    The part of a validation report about the given focus nodes, as input
+    for merge_reports()
+    """
+    report = BNode()
+    triples = [(report, RDF.type, SH.ValidationReport)]
+
+    for result, result_triples in iter_results(report_graph, focus_nodes):
+        triples.append((report, SH.result, result))
+        triples.extend(result_triples)
+
+    return len(triples) == 1, triples
+
+
+def _summary_key(node: Node) -> str:
+    if isinstance(node, BNode):
+        return node.n3()
+    if node.startswith(str(SH)):
+        return 'sh:' + node[len(str(SH)):]
+
+    return str(node)
+
+
+class ReportSummary:
+    """
+    Numbers of validation results per severity, shape, path, constraint
+    component and focus node class, aggregated over one or more validation
+    reports
+    """
+    def __init__(
+            self,
+            shapes_graph: Optional[Graph] = None,
+            disjoint_focus_nodes: bool = False
+    ):
+        """
+        If shapes_graph is given, results of blank node property shapes are
+        counted for the node shapes they belong to.
+
+        Counting the distinct focus nodes of the results takes memory
+        growing with their number, as they are collected over all reports.
+        If the reports are about disjoint sets of focus nodes (e.g. batches
+        of subjects), disjoint_focus_nodes counts them per report instead.
+        """
+        self.shapes_graph = shapes_graph
+        self.disjoint_focus_nodes = disjoint_focus_nodes
+        self.num_results = 0
+        self._focus_nodes = set()
+        self._num_disjoint_focus_nodes = 0
+        self.counts: Dict[str, Counter] = {
+            dimension: Counter()
+            for dimension in [*_SUMMARY_DIMENSIONS.values(), _FOCUS_NODE_CLASS]
+        }
+
+    @property
+    def conforms(self) -> bool:
+        return self.num_results == 0
+
+    @property
+    def num_focus_nodes(self) -> int:
+        return self._num_disjoint_focus_nodes + len(self._focus_nodes)
+
+    def _shape_key(self, shape: Node) -> str:
+        if isinstance(shape, BNode) and self.shapes_graph is not None:
+            node_shape = self.shapes_graph.value(predicate=SH.property, object=shape)
+            if node_shape is not None:
+                return _summary_key(node_shape)
+
+        return _summary_key(shape)
+
+    def add_report(
+            self,
+            report_graph: Graph,
+            data_graph: Optional[Graph] = None,
+            focus_nodes: Optional[Collection[Node]] = None
+    ):
+        """
+        Counts the results of report_graph with one scan of the report's
+        predicate index per counted property. Focus node classes are looked
+        up in data_graph, if given. If focus_nodes is given, only results
+        about these focus nodes are counted.
+        """
+        # without the nested results of sh:detail, like iter_results()
+        results = set(report_graph.objects(None, SH.result))
+        result_focus_nodes = {
+            result: focus_node
+            for result, focus_node in report_graph.subject_objects(SH.focusNode)
+            if result in results
+            and (focus_nodes is None or focus_node in focus_nodes)
+        }
+        self.num_results += len(result_focus_nodes)
+        if self.disjoint_focus_nodes:
+            self._num_disjoint_focus_nodes += len(
+                set(result_focus_nodes.values()))
+        else:
+            self._focus_nodes.update(result_focus_nodes.values())
+
+        for p, dimension in _SUMMARY_DIMENSIONS.items():
+            to_key = self._shape_key if p == SH.sourceShape else _summary_key
+            # the same few shapes, paths, ... occur in many results, so they
+            # are counted as nodes first and converted to keys once
+            counts = Counter(
+                o for result, o in report_graph.subject_objects(p)
+                if result in result_focus_nodes
+            )
+            for o, count in counts.items():
+                self.counts[dimension][to_key(o)] += count
+
+        if data_graph is not None:
+            for focus_node, count in Counter(result_focus_nodes.values()).items():
+                for cls in data_graph.objects(focus_node, RDF.type):
+                    self.counts[_FOCUS_NODE_CLASS][_summary_key(cls)] += count
+
+    def to_dict(self) -> dict:
+        return {
+            'conforms': self.conforms,
+            'results': self.num_results,
+            'focus_nodes': self.num_focus_nodes,
+            **{
+                dimension: dict(counts.most_common())
+                for dimension, counts in self.counts.items()
+            },
+        }
+
+    def write_json(self, file_path: str):
+        with open(file_path, 'w') as summary_file:
+            json.dump(self.to_dict(), summary_file, indent=2)
+
+    def write_csv(self, file_path: str):
+        with open(file_path, 'w', newline='') as summary_file:
+            writer = csv.writer(summary_file)
+            writer.writerow(['dimension', 'value', 'results'])
+            writer.writerow(['total', 'results', self.num_results])
+            writer.writerow(['total', 'focus_nodes', self.num_focus_nodes])
+            for dimension, counts in self.counts.items():
+                for value, count in counts.most_common():
+                    writer.writerow([dimension, value, count])
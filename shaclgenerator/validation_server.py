@@ -0,0 +1,398 @@
+"""
+Long-running SHACL validation service for many small validation requests
+against the same shapes. The compiled shapes and an optional reference data
+graph are loaded once into each of a pool of worker processes, which
+validate the RDF data POSTed to /validate over HTTP, either on a TCP port or
+a Unix socket. The workers are started by a fork server rather than forked
+from the multi-threaded server process. A watcher thread reloads the shapes
+when the shapes file changes and replaces the worker pool once the new
+workers are ready, while the previous ones keep handling requests.
+
+With reference data, the data of a request is validated together with the
+reference data, i.e. the request's nodes are the focus nodes and e.g. their
+classes or linked nodes may come from the reference data.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Optional, Set, Tuple
+
+from rdflib import BNode, Graph, URIRef
+from rdflib.term import Node
+
+from shaclgenerator.compiled_shapes import compile_shapes, dump_shapes, \
+    forget_shapes, load_compiled_shapes_graph, load_shapes_graph, validate
+from shaclgenerator.sharded_validation import get_target_nodes_among, \
+    get_targeting_shapes
+from shaclgenerator.validation_report import ReportSummary, merge_reports
+from util.content_cache import ContentCache
+from util.ingestion import load_graph
+
+logger = logging.getLogger('shaclgenerator.validation_server')
+
+# shapes and reference data graphs of the worker processes, loaded by
+# _init_worker()
+_shapes_graph: Optional[Graph] = None
+_targeting_shapes: Set[Node] = set()
+_reference_graph: Optional[Graph] = None
+
+_N_TRIPLES = 'application/n-triples'
+
+
+class InvalidRequestError(Exception):
+    """
+    Raised for request data which can't be parsed, i.e. the client's fault
+    """
+
+
+def _init_worker(shapes_data: bytes, reference_file_path: Optional[str]):
+    global _shapes_graph, _targeting_shapes, _reference_graph
+
+    _shapes_graph = load_compiled_shapes_graph(shapes_data)
+    _targeting_shapes = get_targeting_shapes(_shapes_graph)
+    if reference_file_path is not None:
+        _reference_graph = load_graph(reference_file_path)
+
+
+def _num_reference_triples() -> Optional[int]:
+    return len(_reference_graph) if _reference_graph is not None else None
+
+
+def _validate_with_reference(
+        request_graph: Graph,
+        summary: ReportSummary
+) -> Tuple[bool, Graph]:
+    # The request's triples are added to the worker's copy of the reference
+    # data for the time of the request. Workers handle one request at a
+    # time, so no other request sees them.
+    added = [triple for triple in request_graph if triple not in _reference_graph]
+    for triple in added:
+        _reference_graph.add(triple)
+
+    try:
+        # pyshacl only accepts IRIs as explicitly given focus nodes
+        candidates = {
+            node
+            for node in chain(request_graph.subjects(), request_graph.objects())
+            if isinstance(node, URIRef)
+        }
+        superclass_cache = {}
+        partial_reports = []
+
+        for shape in _targeting_shapes:
+            focus_nodes = get_target_nodes_among(
+                _reference_graph,
+                _shapes_graph,
+                shape,
+                candidates,
+                superclass_cache)
+            # an empty focus node list would mean all focus nodes to pyshacl
+            if not focus_nodes:
+                continue
+
+            conforms, report_graph, _ = validate(
+                data_graph=_reference_graph,
+                shacl_graph=_shapes_graph,
+                use_shapes=[str(shape)],
+                focus_nodes=focus_nodes,
+            )
+            partial_reports.append((conforms, list(report_graph)))
+
+        conforms, report_graph = merge_reports(partial_reports)
+        summary.add_report(report_graph, _reference_graph)
+
+        return conforms, report_graph
+
+    finally:
+        for triple in added:
+            _reference_graph.remove(triple)
+
+
+def validate_request(
+        data: bytes,
+        rdf_format: str,
+        full_report: bool
+) -> Tuple[bool, dict, Optional[str]]:
+    """
+    Validates the RDF data of a request in a worker process. Returns whether
+    it conforms, the summary of the validation results and, if full_report
+    is set, the validation report in N-Triples format.
+    """
+    # rdflib's parsers raise all kinds of errors on malformed data or an
+    # unknown format (BadSyntax, ParserError, PluginException, ValueError,
+    # even IndexError), which are all the request's fault. They are raised
+    # as a plain exception, which can be pickled to the server process,
+    # unlike e.g. BadSyntax.
+    try:
+        request_graph = Graph().parse(data=data, format=rdf_format)
+    except Exception as e:
+        raise InvalidRequestError(f'invalid {rdf_format} data: {e}') from None
+    summary = ReportSummary(_shapes_graph)
+
+    if _reference_graph is None:
+        conforms, report_graph, _ = validate(
+            data_graph=request_graph,
+            shacl_graph=_shapes_graph,
+        )
+        summary.add_report(report_graph, request_graph)
+    else:
+        conforms, report_graph = _validate_with_reference(
+            request_graph, summary)
+
+    report = report_graph.serialize(format='nt') if full_report else None
+
+    return conforms, summary.to_dict(), report
+
+
+class ValidationService:
+    def __init__(
+            self,
+            shapes_file_path: str,
+            reference_file_path: Optional[str] = None,
+            workers: int = 1,
+            shapes_cache: Optional[ContentCache] = None,
+            poll_interval: Optional[float] = 1.0
+    ):
+        """
+        The shapes file is checked for changes every poll_interval seconds,
+        or only by calling reload_if_changed() if it is None.
+        """
+        self.shapes_file_path = shapes_file_path
+        self.reference_file_path = reference_file_path
+        self.workers = workers
+        self.shapes_cache = shapes_cache
+        self.num_requests = 0
+
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._shapes_mtime = os.stat(shapes_file_path).st_mtime_ns
+        self._shapes_graph, self._executor, self._num_reference_triples = \
+            self._start_workers()
+
+        self._watcher: Optional[threading.Thread] = None
+        if poll_interval is not None:
+            self._watcher = threading.Thread(
+                target=self._watch, args=(poll_interval,), daemon=True)
+            self._watcher.start()
+
+    def _start_workers(
+            self
+    ) -> Tuple[Graph, ProcessPoolExecutor, Optional[int]]:
+        shapes_graph = load_shapes_graph(self.shapes_file_path, self.shapes_cache)
+        # pyshacl can only be restricted to shapes given by their IRI
+        if self.reference_file_path is not None and any(
+                isinstance(shape, BNode)
+                for shape in get_targeting_shapes(shapes_graph)):
+            forget_shapes(shapes_graph)
+            raise ValueError(
+                'Validation with reference data requires all shapes with '
+                'targets to be IRIs')
+
+        # The server process runs threads, which a forked worker could
+        # inherit in the middle of holding a lock.
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_init_worker,
+            initargs=(
+                dump_shapes(compile_shapes(shapes_graph)),
+                self.reference_file_path)
+        )
+
+        try:
+            # waits for a worker to load the shapes and reference data
+            num_reference_triples = executor.submit(
+                _num_reference_triples).result()
+        except BaseException:
+            executor.shutdown(wait=False)
+            forget_shapes(shapes_graph)
+            raise
+
+        if num_reference_triples is not None:
+            logger.info(
+                f'loaded {num_reference_triples} triples of reference data')
+
+        return shapes_graph, executor, num_reference_triples
+
+    def reload_if_changed(self):
+        """
+        Reloads the shapes if the shapes file changed. Requests are handled
+        by the previous workers until the new ones are ready.
+        """
+        shapes_mtime = os.stat(self.shapes_file_path).st_mtime_ns
+        if shapes_mtime == self._shapes_mtime:
+            return
+
+        logger.info(f'{self.shapes_file_path} changed, reloading')
+        # e.g. a half-written file is tried again after its next change
+        self._shapes_mtime = shapes_mtime
+        try:
+            shapes_graph, executor, num_reference_triples = \
+                self._start_workers()
+        except Exception:
+            logger.exception(
+                'reloading the shapes failed, keeping the previous shapes')
+            return
+
+        with self._lock:
+            if self._closed.is_set():
+                previous_shapes_graph, previous_executor = \
+                    shapes_graph, executor
+            else:
+                previous_shapes_graph = self._shapes_graph
+                previous_executor = self._executor
+                self._shapes_graph = shapes_graph
+                self._executor = executor
+                self._num_reference_triples = num_reference_triples
+
+        # requests which already run in the previous workers are finished,
+        # with the previous shapes
+        previous_executor.shutdown(wait=False)
+        forget_shapes(previous_shapes_graph)
+
+    def _watch(self, poll_interval: float):
+        while not self._closed.wait(poll_interval):
+            try:
+                self.reload_if_changed()
+            except OSError:
+                # e.g. the shapes file is being replaced
+                logger.exception(f'checking {self.shapes_file_path} failed')
+
+    def validate(
+            self,
+            data: bytes,
+            rdf_format: str,
+            full_report: bool = False
+    ) -> Tuple[bool, dict, Optional[str]]:
+        """
+        Validates data in one of the worker processes, see validate_request()
+        """
+        # submitted while holding the lock, so a concurrent reload can't shut
+        # down the executor in between
+        with self._lock:
+            future = self._executor.submit(
+                validate_request, data, rdf_format, full_report)
+            self.num_requests += 1
+
+        return future.result()
+
+    def status(self) -> dict:
+        return {
+            'shapes_file': self.shapes_file_path,
+            'shapes_triples': len(self._shapes_graph),
+            'reference_triples': self._num_reference_triples,
+            'workers': self.workers,
+            'requests': self.num_requests,
+        }
+
+    def close(self):
+        with self._lock:
+            self._closed.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        self._executor.shutdown()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # keeps connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self, status: int, body: str, content_type: str):
+        encoded_body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def _respond_json(self, status: int, content: dict):
+        self._respond(status, json.dumps(content), 'application/json')
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._respond_json(404, {'error': f'unknown path {self.path}'})
+            return
+
+        self._respond_json(200, self.server.service.status())
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if self.path != '/validate':
+            self._respond_json(404, {'error': f'unknown path {self.path}'})
+            return
+
+        # rdflib's parsers are registered under their media types, too
+        rdf_format = self.headers.get_content_type()
+        if rdf_format in ('text/plain', 'application/octet-stream'):
+            rdf_format = 'text/turtle'
+        full_report = _N_TRIPLES in self.headers.get('Accept', '')
+
+        try:
+            conforms, summary, report = self.server.service.validate(
+                data, rdf_format, full_report)
+        except InvalidRequestError as e:
+            logger.warning(f'invalid request: {e}')
+            self._respond_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception('validating a request failed')
+            self._respond_json(500, {'error': f'internal error: {e}'})
+            return
+
+        if full_report:
+            self._respond(200, report, _N_TRIPLES)
+        else:
+            self._respond_json(200, summary)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(
+        service: ValidationService,
+        host: str = '127.0.0.1',
+        port: int = 8080,
+        socket_path: Optional[str] = None
+):
+    """
+    Handles validation requests until interrupted. Each connection is
+    handled in its own thread.
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+        logger.info(f'listening on {socket_path}')
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        logger.info(f'listening on http://{host}:{server.server_port}')
+
+    server.service = service
+    # e.g. stopped by a service manager
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None:
+            os.remove(socket_path)
@@ -0,0 +1,51 @@
+import pyshacl
+import pytest
+from rdflib import Graph
+
+from shaclgenerator.compiled_shapes import load_shapes_graph, validate
+from util.content_cache import ContentCache
+
+# "1" is a valid xsd:boolean, but pyshacl only reads "true" as true, so the
+# shape isn't deactivated
+SHAPES = '''
+@prefix ex: <http://ex.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+ex:PersonShape a sh:NodeShape ;
+    sh:targetClass ex:Person ;
+    sh:deactivated "1"^^xsd:boolean ;
+    sh:property [ sh:path ex:name ; sh:minCount 1 ] .
+'''
+
+DATA = '''
+<http://ex.org/alice> a <http://ex.org/Person> .
+'''
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_validate_matches_pyshacl(tmp_path, cached):
+    shapes_file_path = tmp_path / 'shapes.ttl'
+    shapes_file_path.write_text(SHAPES, encoding='utf-8')
+    data_graph = Graph().parse(data=DATA, format='turtle')
+    cache = ContentCache(str(tmp_path / 'cache')) if cached else None
+
+    if cached:
+        # fills the cache
+        load_shapes_graph(str(shapes_file_path), cache)
+    shapes_graph = load_shapes_graph(str(shapes_file_path), cache)
+
+    conforms, _, _ = validate(data_graph, shapes_graph)
+    expected_conforms, _, _ = pyshacl.validate(
+        data_graph, shacl_graph=str(shapes_file_path))
+
+    assert expected_conforms is False
+    assert conforms == expected_conforms
+
+
+def test_validate_rejects_js(tmp_path):
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    data_graph = Graph().parse(data=DATA, format='turtle')
+
+    with pytest.raises(ValueError):
+        validate(data_graph, shapes_graph, use_js=True)
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pytest
+
+from util import cache
+from util.cache import CacheMiss, EmbeddingCache, embedding_key
+
+LABELS = ['http://ex.org/a', 'http://ex.org/b', 'http://ex.org/c']
+
+
+def _embeddings(seed=0):
+    return np.random.default_rng(seed).random((3, 4), dtype=np.float32)
+
+
+def _backdate(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def _store(cache_dir_path, seed):
+    EmbeddingCache(cache_dir_path).store('key', _embeddings(seed), LABELS)
+
+
+def test_store_and_load(tmp_path):
+    embedding_cache = EmbeddingCache(str(tmp_path / 'cache'))
+
+    with pytest.raises(CacheMiss):
+        embedding_cache.load('key')
+    with pytest.raises(CacheMiss):
+        embedding_cache.load_entity_labels('key')
+
+    embedding_cache.store('key', _embeddings(), LABELS, {'model': 'TransE'})
+    embedding_cache.store('none', None, LABELS)
+
+    np.testing.assert_array_equal(embedding_cache.load('key'), _embeddings())
+    assert embedding_cache.load_entity_labels('key') == LABELS
+    assert embedding_cache.load('none') is None
+    with pytest.raises(CacheMiss):
+        embedding_cache.load('other')
+
+
+def test_embedding_key():
+    key = embedding_key('digest', 'TransE', {'epochs': 5})
+
+    assert key == embedding_key('digest', 'TransE', {'epochs': 5})
+    assert key != embedding_key('other', 'TransE', {'epochs': 5})
+    assert key != embedding_key('digest', 'RotatE', {'epochs': 5})
+    assert key != embedding_key('digest', 'TransE', {'epochs': 6})
+    assert embedding_key('digest', 'TransE') \
+        == embedding_key('digest', 'TransE', {})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_dir_path = str(tmp_path / 'cache')
+    EmbeddingCache(cache_dir_path, max_bytes=None).store(
+        'a', _embeddings(), LABELS)
+    entry_bytes = sum(
+        entry.stat().st_size
+        for entry in os.scandir(os.path.join(cache_dir_path, 'a')))
+
+    embedding_cache = EmbeddingCache(cache_dir_path, max_bytes=2 * entry_bytes)
+    embedding_cache.store('b', _embeddings(), LABELS)
+    _backdate(os.path.join(cache_dir_path, 'a'), 20)
+    _backdate(os.path.join(cache_dir_path, 'b'), 10)
+    # loading makes a the most recently used entry
+    embedding_cache.load('a')
+    embedding_cache.store('c', _embeddings(), LABELS)
+
+    embedding_cache.load('a')
+    embedding_cache.load('c')
+    with pytest.raises(CacheMiss):
+        embedding_cache.load('b')
+
+
+def test_concurrent_stores_keep_one_entry(tmp_path):
+    cache_dir_path = str(tmp_path / 'cache')
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=_store, args=(cache_dir_path, seed))
+        for seed in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    assert sorted(os.listdir(cache_dir_path)) == ['.lock', 'key']
+    embeddings = EmbeddingCache(cache_dir_path).load('key')
+    assert any(
+        np.array_equal(embeddings, _embeddings(seed)) for seed in range(4))
+
+
+def test_stale_temporary_directories_are_removed(tmp_path):
+    cache_dir_path = tmp_path / 'cache'
+    stale_dir_path = cache_dir_path / '.tmpstale'
+    fresh_dir_path = cache_dir_path / '.tmpfresh'
+    for dir_path in (stale_dir_path, fresh_dir_path):
+        dir_path.mkdir(parents=True)
+        (dir_path / 'embeddings.npy').write_bytes(b'partial')
+    for path in (stale_dir_path / 'embeddings.npy', stale_dir_path):
+        _backdate(path, cache._TMP_GRACE_PERIOD + 60)
+
+    EmbeddingCache(str(cache_dir_path), max_bytes=None).store(
+        'key', _embeddings(), LABELS)
+
+    assert not stale_dir_path.exists()
+    assert fresh_dir_path.exists()
+    assert (cache_dir_path / 'key').is_dir()
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.cluster import DBSCAN
+
+from shaclgenerator.embedding_clustering import ExactClusterer, \
+    NeighborSearch, RandomProjectionClusterer, dbscan_labels, \
+    make_clusterer, neighbor_recall
+
+
+def _points(seed: int, num_points: int = 400, dim: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(5, dim)) * 2
+    points = centers[rng.integers(5, size=num_points)] \
+        + rng.normal(size=(num_points, dim)) * 0.5
+    # duplicate points are at a distance of 0
+    return np.concatenate([points, points[:20]]).astype(np.float32)
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('eps', [0.6, 1.0, 1.5])
+@pytest.mark.parametrize('min_samples', [1, 5])
+def test_exact_clusterer_matches_dbscan(seed, eps, min_samples):
+    points = _points(seed)
+
+    labels = ExactClusterer(eps, min_samples).fit_predict(points)
+
+    assert np.array_equal(
+        labels, DBSCAN(eps=eps, min_samples=min_samples).fit(points).labels_)
+
+
+def test_dbscan_labels_with_and_without_diagonal():
+    points = _points(0)
+    graph = ExactClusterer(1.0).neighbor_graph(points)
+    rows = np.repeat(np.arange(graph.shape[0]), np.diff(graph.indptr))
+    not_self = graph.indices != rows
+    graph_without_diagonal = csr_matrix(
+        (graph.data[not_self], (rows[not_self], graph.indices[not_self])),
+        shape=graph.shape)
+
+    expected_labels = DBSCAN(eps=1.0).fit(points).labels_
+    assert np.array_equal(dbscan_labels(graph), expected_labels)
+    assert np.array_equal(
+        dbscan_labels(graph_without_diagonal), expected_labels)
+
+
+def test_random_projection_clusterer_finds_exact_neighbors_in_one_leaf():
+    points = _points(1)
+
+    # all points share the leaf of a single tree
+    labels = RandomProjectionClusterer(
+        1.0, num_trees=1, leaf_size=len(points)).fit_predict(points)
+
+    assert np.array_equal(labels, DBSCAN(eps=1.0).fit(points).labels_)
+
+
+def test_random_projection_neighbors_and_recall():
+    points = _points(2)
+    exact_graph = ExactClusterer(1.0).neighbor_graph(points)
+    graph = RandomProjectionClusterer(
+        1.0, num_trees=2, leaf_size=32, max_memory_mib=1)\
+        .neighbor_graph(points)
+
+    exact_pairs = set(zip(*exact_graph.nonzero()))
+    pairs = set(zip(*graph.nonzero()))
+    # a subset of the exact neighbors, with the same distances
+    assert pairs < exact_pairs
+    assert np.allclose(
+        graph[graph.nonzero()], exact_graph[graph.nonzero()], atol=1e-5)
+
+    report = neighbor_recall(points, graph, 1.0, num_queries=len(points))
+    assert report.num_queries == len(points)
+    assert report.num_exact_neighbors == exact_graph.nnz - len(points)
+    assert 0 < report.recall < 1
+    assert neighbor_recall(
+        points, exact_graph, 1.0, num_queries=len(points)).recall == 1.0
+
+
+def test_make_clusterer():
+    assert isinstance(make_clusterer(NeighborSearch.EXACT), ExactClusterer)
+    assert isinstance(
+        make_clusterer(NeighborSearch.RANDOM_PROJECTION, 2.0, num_trees=3),
+        RandomProjectionClusterer)
+    with pytest.raises(ValueError):
+        make_clusterer('exact')
+
+
+def test_complex_embeddings_are_rejected():
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((50, 4)) + 1j * rng.random((50, 4))
+    clusterer = ExactClusterer(0.5)
+
+    with pytest.raises(ValueError):
+        clusterer.fit_predict(embeddings)
+    with pytest.raises(ValueError):
+        neighbor_recall(
+            embeddings, clusterer.neighbor_graph(embeddings.real), 0.5)
@@ -0,0 +1,206 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pyshacl
+import pytest
+import requests
+from rdflib import BNode, Graph, SH
+
+from shaclgenerator.endpoint_validation import SPARQLClient, \
+    validate_endpoint
+
+DATA = '''
+@prefix ex: <http://ex.org/> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+ex:Student rdfs:subClassOf ex:Person .
+
+ex:alice a ex:Person ; ex:name "Alice" ; ex:knows ex:bob .
+ex:bob a ex:Student ; ex:name "Bob" ; ex:knows ex:carol .
+ex:carol a ex:Person .
+ex:dave a ex:Student ; ex:knows ex:book .
+ex:erin a ex:Person ; ex:name "Erin" ; ex:knows [ a ex:Person ] .
+[ a ex:Person ; ex:name "Anonymous" ] .
+[ a ex:Student ] .
+
+ex:book ex:label "x" , "x"@en , "y" , ex:z .
+ex:film ex:label "y" , 42 .
+'''
+
+SHAPES = '''
+@prefix ex: <http://ex.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+ex:PersonShape a sh:NodeShape ;
+    sh:targetClass ex:Person ;
+    sh:property [ sh:path ex:name ; sh:minCount 1 ] .
+
+ex:KnowsShape a sh:NodeShape ;
+    sh:targetSubjectsOf ex:knows ;
+    sh:property [ sh:path ex:knows ; sh:class ex:Person ] .
+
+ex:LabelShape a sh:NodeShape ;
+    sh:targetObjectsOf ex:label ;
+    sh:nodeKind sh:Literal ;
+    sh:datatype xsd:string .
+
+ex:NodeShape a sh:NodeShape ;
+    sh:targetNode ex:alice , ex:ghost ;
+    sh:property [ sh:path ex:name ; sh:minCount 1 ] .
+'''
+
+
+class _SPARQLHandler(BaseHTTPRequestHandler):
+    """
+    SPARQL endpoint stand-in answering queries on the graph of its server
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status: int, content_type: str, data: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        query = parse_qs(body.decode('utf-8'))['query'][0]
+
+        with self.server.lock:
+            self.server.queries.append(query)
+            if self.server.num_failures > 0:
+                self.server.num_failures -= 1
+                self._respond(503, 'text/plain', b'')
+                return
+
+            result = self.server.graph.query(query)
+            if result.type == 'SELECT':
+                self._respond(
+                    200,
+                    'application/sparql-results+json',
+                    result.serialize(format='json'))
+            else:
+                self._respond(
+                    200,
+                    'application/n-triples',
+                    result.graph.serialize(format='nt', encoding='utf-8'))
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SPARQLHandler)
+    server.graph = Graph().parse(data=DATA, format='turtle')
+    server.lock = threading.Lock()
+    server.queries = []
+    server.num_failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server) -> str:
+    return f'http://127.0.0.1:{server.server_address[1]}/sparql'
+
+
+def _result_keys(report_graph: Graph) -> list:
+    """
+    The validation results, with blank nodes (only distinguishable within
+    one graph) replaced by _:
+    """
+    def key(node):
+        return '_:' if isinstance(node, BNode) else node
+
+    return sorted(
+        tuple(
+            str(key(report_graph.value(result, p)))
+            for p in (
+                SH.focusNode,
+                SH.resultPath,
+                SH.value,
+                SH.sourceConstraintComponent,
+                SH.sourceShape,
+            )
+        )
+        for result in report_graph.subjects(SH.focusNode, None))
+
+
+@pytest.mark.parametrize('page_size', [2, 3, 1000])
+def test_validate_endpoint_matches_pyshacl(endpoint, page_size):
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    client = SPARQLClient(_url(endpoint))
+
+    conforms, report_graph = validate_endpoint(
+        client, shapes_graph, page_size=page_size, concurrency=2)
+    client.close()
+
+    expected_conforms, expected_report_graph, _ = pyshacl.validate(
+        Graph().parse(data=DATA, format='turtle'), shacl_graph=shapes_graph)
+
+    assert conforms == expected_conforms
+    expected_keys = _result_keys(expected_report_graph)
+    assert _result_keys(report_graph) == expected_keys
+
+    # every target type contributes results
+    focus_nodes = {key[0] for key in expected_keys}
+    assert {
+        'http://ex.org/carol',  # sh:targetClass
+        'http://ex.org/dave',  # rdfs:subClassOf of the target class
+        '_:',  # blank node instance
+        'http://ex.org/ghost',  # sh:targetNode without any triples
+        'x',  # sh:targetObjectsOf literal
+        'http://ex.org/z',  # sh:targetObjectsOf IRI
+    } <= focus_nodes
+
+    # IRIs and literals are paged by key ranges, blank nodes by offsets
+    for query in endpoint.queries:
+        if 'OFFSET' in query:
+            assert 'isBlank(?focus))' in query
+    if page_size == 2:
+        assert any(
+            'STR(?focus) >= "x"' in query for query in endpoint.queries)
+
+
+def test_validate_endpoint_rejects_too_many_equal_keys(endpoint):
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    client = SPARQLClient(_url(endpoint))
+
+    # "x" and "x"@en can't be told apart by a key range
+    with pytest.raises(ValueError):
+        validate_endpoint(client, shapes_graph, page_size=1)
+    client.close()
+
+
+def test_validate_endpoint_retries_failed_requests(endpoint):
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    endpoint.num_failures = 2
+    client = SPARQLClient(_url(endpoint), retries=2)
+
+    conforms, report_graph = validate_endpoint(
+        client, shapes_graph, page_size=2, concurrency=1)
+    client.close()
+
+    _, expected_report_graph, _ = pyshacl.validate(
+        Graph().parse(data=DATA, format='turtle'), shacl_graph=shapes_graph)
+    assert _result_keys(report_graph) == _result_keys(expected_report_graph)
+    assert endpoint.num_failures == 0
+
+
+def test_validate_endpoint_gives_up_after_retries(endpoint):
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    endpoint.num_failures = 2
+    client = SPARQLClient(_url(endpoint), retries=1)
+
+    with pytest.raises(requests.exceptions.RetryError):
+        validate_endpoint(client, shapes_graph, page_size=2)
+    client.close()
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+
+from shaclgenerator.embedding_clustering import ExactClusterer, \
+    RandomProjectionClusterer
+from shaclgenerator.eps_sweep import NeighborGraph, eps_grid
+from util.lubmevaluator import ERRONEOUS_RESOURCES, LUMBEvaluator, \
+    entity_masks
+
+
+def _points(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    points = rng.random((300, 3), dtype=np.float32)
+    # duplicate points are at a distance of 0
+    return np.concatenate([points, points[:40]])
+
+
+@pytest.mark.parametrize('min_samples', [1, 2, 5, 10])
+def test_labels_match_dbscan(min_samples):
+    points = _points(min_samples)
+    eps_values = eps_grid(0.02, 0.3, 25)
+    clusterer = ExactClusterer(eps_values[-1])
+
+    neighbor_graph = NeighborGraph(
+        clusterer.neighbor_graph(points), eps_values[-1], min_samples)
+
+    for eps, labels in zip(
+            eps_values, neighbor_graph.iter_labels(eps_values)):
+        expected_labels = DBSCAN(eps=eps, min_samples=min_samples)\
+            .fit(points).labels_
+        assert np.array_equal(labels, expected_labels), eps
+
+    eps = eps_values[10]
+    assert np.array_equal(
+        neighbor_graph.labels(eps),
+        DBSCAN(eps=eps, min_samples=min_samples).fit(points).labels_)
+
+
+def test_labels_match_approximate_clusterer():
+    points = _points(0)
+    eps_values = eps_grid(0.02, 0.3, 10)
+    clusterer = RandomProjectionClusterer(
+        eps_values[-1], num_trees=2, leaf_size=32)
+
+    neighbor_graph = NeighborGraph(
+        clusterer.neighbor_graph(points), eps_values[-1])
+
+    for eps, labels in zip(
+            eps_values, neighbor_graph.iter_labels(eps_values)):
+        expected_labels = RandomProjectionClusterer(
+            eps, num_trees=2, leaf_size=32).fit_predict(points)
+        assert np.array_equal(labels, expected_labels), eps
+
+
+def test_evaluate_labels_with_masks():
+    entities = [str(resource) for resource in ERRONEOUS_RESOURCES] \
+        + [f'http://ex.org/{i}' for i in range(20)] \
+        + [f'_:b{i}' for i in range(5)]
+    dataset = SimpleNamespace(
+        entity_to_id={entity: i for i, entity in enumerate(entities)})
+    num_erroneous = len(ERRONEOUS_RESOURCES)
+    labels = np.zeros(len(entities), dtype=np.int64)
+    # 10 erroneous resources, 5 other resources and all blank nodes
+    labels[:10] = -1
+    labels[num_erroneous:num_erroneous + 5] = -1
+    labels[-5:] = -1
+
+    for masks in (None, entity_masks(dataset)):
+        evaluator = LUMBEvaluator()
+        evaluator.evaluate_labels(dataset, labels, masks)
+
+        assert (evaluator.tp, evaluator.fp, evaluator.fn) == \
+            (10, 5, num_erroneous - 10)
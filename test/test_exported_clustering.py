@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from rdflib import URIRef
+
+from shaclgenerator.exported_clustering import remove_exported_outliers
+from shaclgenerator.outlier_filtering import MappedGraph
+from util.embedding_export import write_embeddings
+from util.ingestion import load_graph
+
+NT = ''.join(
+    f'<http://ex.org/n{i}> <http://ex.org/knows> <http://ex.org/n{i + 1}> .\n'
+    for i in range(8)
+) + '''<http://ex.org/n0> <http://ex.org/knows> <http://ex.org/far> .
+<http://ex.org/far> <http://ex.org/p> _:b0 .
+_:b0 <http://ex.org/p> _:b1 .
+<http://ex.org/n1> <http://ex.org/p> _:b1 .
+'''
+
+FAR = URIRef('http://ex.org/far')
+
+
+def _export(nt_file_path, export_dir_path):
+    """
+    Exports embeddings of the graph's entities which are all close to each
+    other, except for http://ex.org/far
+    """
+    mapped_graph = MappedGraph.from_graph(load_graph(str(nt_file_path)))
+    embeddings = np.zeros((len(mapped_graph.entity_labels), 2))
+    embeddings[mapped_graph.entity_labels.index(str(FAR))] = 100.0
+
+    write_embeddings(
+        str(export_dir_path),
+        embeddings,
+        mapped_graph.entity_labels,
+        meta={'content_digest': mapped_graph.digest()})
+
+
+def test_remove_exported_outliers_of_graph_with_blank_nodes(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(NT, encoding='utf-8')
+    _export(nt_file_path, tmp_path / 'export')
+
+    # parsed again, like by the cluster command
+    g = load_graph(str(nt_file_path))
+    g_wo_outliers = remove_exported_outliers(g, str(tmp_path / 'export'), 1.0)
+
+    assert len(g_wo_outliers) == len(g) - 2
+    assert (FAR, None, None) not in g_wo_outliers
+    assert (None, None, FAR) not in g_wo_outliers
+    # blank nodes are no outlier candidates
+    assert len(list(g_wo_outliers.triples(
+        (URIRef('http://ex.org/n1'), URIRef('http://ex.org/p'), None)))) == 1
+
+
+def test_remove_exported_outliers_rejects_other_graph(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(NT, encoding='utf-8')
+    _export(nt_file_path, tmp_path / 'export')
+
+    other_file_path = tmp_path / 'other.nt'
+    other_file_path.write_text(NT.replace('_:b1', '_:b2'), encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        remove_exported_outliers(
+            load_graph(str(other_file_path)), str(tmp_path / 'export'), 1.0)
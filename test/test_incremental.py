@@ -0,0 +1,46 @@
+import random
+
+import pytest
+from rdflib import Graph, Namespace, RDF
+
+from shaclgenerator.incremental import apply_delta, class_size_changes
+from shaclgenerator.partitioning import count_instances
+
+EX = Namespace('http://ex.org/')
+
+NODES = [EX[f'n{i}'] for i in range(8)]
+CLASSES = [EX.Person, EX.Student, EX.City]
+
+
+def _random_triple(rng: random.Random):
+    if rng.random() < 0.7:
+        return rng.choice(NODES), RDF.type, rng.choice(CLASSES)
+
+    return rng.choice(NODES), EX.knows, rng.choice(NODES)
+
+
+def _random_graph(rng: random.Random, num_triples: int) -> Graph:
+    g = Graph()
+    for _ in range(num_triples):
+        g.add(_random_triple(rng))
+
+    return g
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_class_size_changes_match_recount(seed):
+    rng = random.Random(seed)
+    g = _random_graph(rng, 20)
+    # deltas may remove absent triples, add present ones and overlap
+    added = _random_graph(rng, 6)
+    removed = _random_graph(rng, 3)
+    for triple in rng.sample(sorted(g), 3):
+        removed.add(triple)
+        if rng.random() < 0.5:
+            added.add(triple)
+
+    class_sizes = count_instances(g, RDF.type)
+    class_sizes.update(class_size_changes(g, added, removed, RDF.type))
+    apply_delta(g, added, removed, RDF.type)
+
+    assert +class_sizes == count_instances(g, RDF.type)
@@ -0,0 +1,109 @@
+import logging
+import random
+
+import pyshacl
+import pytest
+from rdflib import Graph, Literal, Namespace, RDF, RDFS
+from rdflib.compare import isomorphic
+
+from shaclgenerator.incremental_validation import revalidate
+
+EX = Namespace('http://ex.org/')
+
+SHAPES = '''
+@prefix ex: <http://ex.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+ex:PersonShape a sh:NodeShape ;
+    sh:targetClass ex:Person ;
+    sh:property [ sh:path ex:knows ; sh:class ex:Person ] ;
+    sh:property [ sh:path ex:friend ; sh:node ex:NamedShape ] ;
+    sh:property [ sh:path ex:name ; sh:minCount 1 ; sh:datatype xsd:string ] .
+
+ex:NamedShape a sh:NodeShape ;
+    sh:property [ sh:path ex:name ; sh:minCount 1 ] ;
+    sh:property [ sh:path ex:knows ; sh:class ex:Student ] .
+
+ex:StudentShape a sh:NodeShape ;
+    sh:targetClass ex:Student ;
+    sh:property [ sh:path ex:age ; sh:maxCount 1 ] .
+
+ex:LabelShape a sh:NodeShape ;
+    sh:targetObjectsOf ex:label ;
+    sh:datatype xsd:string .
+'''
+
+NODES = [EX[f'n{i}'] for i in range(6)]
+CLASSES = [EX.Person, EX.Student, EX.Thing]
+VALUES = [Literal('a'), Literal('b'), Literal(1), Literal(2)] + NODES[:3]
+
+
+def _random_triple(rng: random.Random):
+    s = rng.choice(NODES)
+    p = rng.choice([RDF.type, EX.knows, EX.friend, EX.name, EX.age, EX.label])
+
+    if p == RDF.type:
+        return s, p, rng.choice(CLASSES)
+    if p in (EX.knows, EX.friend):
+        return s, p, rng.choice(NODES)
+
+    return s, p, rng.choice(VALUES)
+
+
+def _random_graph(rng: random.Random, num_triples: int) -> Graph:
+    g = Graph()
+    g.add((EX.Student, RDFS.subClassOf, EX.Person))
+    while len(g) < num_triples + 1:
+        g.add(_random_triple(rng))
+
+    return g
+
+
+def _random_delta(rng: random.Random, g: Graph, size: int):
+    removable = sorted(
+        triple for triple in g if triple[1] != RDFS.subClassOf)
+    removed = Graph()
+    for triple in rng.sample(removable, rng.randint(0, size)):
+        removed.add(triple)
+
+    added = Graph()
+    for _ in range(rng.randint(0, size)):
+        triple = _random_triple(rng)
+        if triple not in g:
+            added.add(triple)
+
+    return added, removed
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_revalidate_matches_full_validation(seed, caplog):
+    caplog.set_level(logging.INFO, 'shaclgenerator.incremental_validation')
+    rng = random.Random(seed)
+    shapes_graph = Graph().parse(data=SHAPES, format='turtle')
+    g = _random_graph(rng, 40)
+
+    _, previous_report_graph, _ = pyshacl.validate(g, shacl_graph=shapes_graph)
+
+    for _ in range(3):
+        added, removed = _random_delta(rng, g, 4)
+        updated = Graph()
+        for triple in g:
+            updated.add(triple)
+        for triple in removed:
+            updated.remove(triple)
+        for triple in added:
+            updated.add(triple)
+
+        conforms, report_graph = revalidate(
+            g, shapes_graph, previous_report_graph, added, removed)
+        expected_conforms, expected_report_graph, _ = pyshacl.validate(
+            updated, shacl_graph=shapes_graph)
+
+        # the report was patched, not produced by a full validation
+        assert 'validating all focus nodes again' not in caplog.text
+        assert isomorphic(g, updated)
+        assert conforms == expected_conforms
+        assert isomorphic(report_graph, expected_report_graph)
+
+        previous_report_graph = report_graph
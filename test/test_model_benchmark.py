@@ -0,0 +1,82 @@
+import csv
+import os
+import signal
+
+import numpy as np
+import pytest
+from rdflib.exceptions import ParserError
+
+from shaclgenerator import pykeen_adapter
+from shaclgenerator.eps_sweep import SweepResult
+from util import model_benchmark
+
+NT = '''<http://ex.org/a> <http://ex.org/p> <http://ex.org/b> .
+<http://ex.org/b> <http://ex.org/p> <http://ex.org/c> .
+'''
+
+
+class _FakeOutlierDetector:
+    """
+    Stand-in for the OutlierDetector which trains nothing: the model Crash
+    kills its worker and Fail raises
+    """
+    def __init__(self, rdf_graph, embedding_method, embedding_cache):
+        assert len(rdf_graph) == 2
+        if embedding_method == 'Crash':
+            os.kill(os.getpid(), signal.SIGKILL)
+        if embedding_method == 'Fail':
+            raise ValueError('no such model\nwith a long dump')
+
+    def get_embeddings(self):
+        return np.zeros((3, 2), dtype=np.float32)
+
+    def sweep_eps(self, eps_values, numpy_embeddings):
+        return [
+            SweepResult(eps, 1, 0, 0, 0, 3, 0, 1.0, eps)
+            for eps in eps_values
+        ]
+
+
+@pytest.fixture
+def input_file_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        pykeen_adapter, 'OutlierDetector', _FakeOutlierDetector)
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(NT, encoding='utf-8')
+
+    return str(nt_file_path)
+
+
+def test_failed_and_crashed_models_are_recorded(input_file_path, tmp_path):
+    results = model_benchmark.benchmark_models(
+        input_file_path,
+        ['TransE', 'Crash', 'Fail', 'TuckER'],
+        [0.1, 0.2, 0.3],
+        num_workers=2)
+
+    assert [result.model for result in results] == \
+        ['TransE', 'Crash', 'Fail', 'TuckER']
+    assert [result.status for result in results] == \
+        ['ok', 'crashed', 'failed', 'ok']
+    assert 'SIGKILL' in results[1].error
+    assert results[2].error == 'ValueError: no such model'
+    assert results[0].best_f1_eps == 0.3
+    assert results[0].peak_rss > 0
+    assert len(results[3].sweep) == 3
+    assert model_benchmark._rdf_graph is None
+
+    model_benchmark.write_results(results, str(tmp_path / 'results.csv'))
+    with open(tmp_path / 'results.csv', newline='') as results_file:
+        rows = list(csv.DictReader(results_file))
+    assert [row['status'] for row in rows] == \
+        ['ok', 'crashed', 'failed', 'ok']
+
+
+def test_unreadable_input_fails_before_any_worker(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(
+        '<http://ex.org/a> <http://ex.org/p>', encoding='utf-8')
+
+    with pytest.raises(ParserError):
+        model_benchmark.benchmark_models(
+            str(nt_file_path), ['TransE'], [0.1])
@@ -0,0 +1,81 @@
+import gzip
+import re
+import shutil
+
+from util import nt_to_tsv
+from util.benchmark import _nt_to_tsv_via_graph
+
+NT_LINES = [
+    '<http://ex.org/a> <http://ex.org/p> <http://ex.org/b> .\n',
+    '<http://ex.org/a> <http://ex.org/p> <http://ex.org/b> .\n',
+    '# a comment\n',
+    '\n',
+    '<http://ex.org/a> <http://ex.org/name> "back\\\\slash \\"quoted\\"" .\n',
+    '<http://ex.org/a> <http://ex.org/name> "caf\\u00E9"@fr .\n',
+    '<http://ex.org/a> <http://ex.org/age> '
+    '"42"^^<http://www.w3.org/2001/XMLSchema#integer> .\n',
+    '<http://ex.org/\\u00E9t\\u00E9> <http://ex.org/p> _:b0 .\n',
+    '_:b0 <http://ex.org/p> _:b1 .\n',
+    '_:b1 <http://ex.org/name> "smiley \\U0001F600" .\n',
+    '_:b1 <http://ex.org/name> "smiley \\U0001F600" .\n',
+]
+
+# str() of an rdflib BNode created without a label
+_RDFLIB_BNODE_ID = re.compile(r'N[0-9a-f]{32}')
+
+
+def _write_nt(file_path):
+    with open(file_path, 'w', encoding='utf-8') as nt_file:
+        nt_file.writelines(NT_LINES)
+
+
+def _read_rows(file_path, bnode_labels):
+    """
+    The rows of a TSV file, with blank nodes (only distinguishable by their
+    labels) replaced by _:
+    """
+    with open(file_path, encoding='utf-8') as tsv_file:
+        return [
+            tuple(
+                '_:' if field in bnode_labels
+                or _RDFLIB_BNODE_ID.fullmatch(field) else field
+                for field in line.rstrip('\n').split('\t'))
+            for line in tsv_file]
+
+
+def test_nt_to_tsv_matches_graph_based_conversion(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    _write_nt(nt_file_path)
+
+    nt_to_tsv(str(nt_file_path), str(tmp_path / 'streamed.tsv'))
+    _nt_to_tsv_via_graph(str(nt_file_path), str(tmp_path / 'graph.tsv'))
+
+    streamed = _read_rows(tmp_path / 'streamed.tsv', {'b0', 'b1'})
+    via_graph = _read_rows(tmp_path / 'graph.tsv', set())
+
+    assert set(streamed) == set(via_graph)
+    assert ('http://ex.org/a', 'http://ex.org/name', 'back\\slash "quoted"') \
+        in streamed
+    assert ('http://ex.org/été', 'http://ex.org/p', '_:') in streamed
+
+    # duplicates are kept, unlike in the graph
+    assert len(via_graph) == len(set(via_graph))
+    assert len(streamed) == len(via_graph) + 2
+    assert streamed.count(
+        ('http://ex.org/a', 'http://ex.org/p', 'http://ex.org/b')) == 2
+
+
+def test_nt_to_tsv_parallel_and_compressed(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    _write_nt(nt_file_path)
+    with open(nt_file_path, 'rb') as nt_file, \
+            gzip.open(tmp_path / 'input.nt.gz', 'wb') as gz_file:
+        shutil.copyfileobj(nt_file, gz_file)
+
+    nt_to_tsv(str(nt_file_path), str(tmp_path / 'single.tsv'))
+    nt_to_tsv(str(nt_file_path), str(tmp_path / 'parallel.tsv'), 3)
+    nt_to_tsv(str(tmp_path / 'input.nt.gz'), str(tmp_path / 'gz.tsv'))
+
+    single = (tmp_path / 'single.tsv').read_text(encoding='utf-8')
+    assert (tmp_path / 'parallel.tsv').read_text(encoding='utf-8') == single
+    assert (tmp_path / 'gz.tsv').read_text(encoding='utf-8') == single
@@ -0,0 +1,86 @@
+import gzip
+import shutil
+
+import numpy as np
+from rdflib import BNode, URIRef
+from rdflib.compare import isomorphic
+
+from shaclgenerator.outlier_filtering import MappedGraph
+from util.ingestion import load_graph
+
+NT = '''<http://ex.org/a> <http://ex.org/p> _:b0 .
+_:b0 <http://ex.org/p> _:b1 .
+_:b1 <http://ex.org/name> "b1" .
+<http://ex.org/b> <http://ex.org/p> <http://ex.org/a> .
+'''
+
+
+def test_digest_is_stable_for_blank_nodes(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(NT, encoding='utf-8')
+    with open(nt_file_path, 'rb') as nt_file, \
+            gzip.open(tmp_path / 'input.nt.gz', 'wb') as gz_file:
+        shutil.copyfileobj(nt_file, gz_file)
+
+    mapped_graphs = [
+        MappedGraph.from_graph(load_graph(str(file_path)))
+        for file_path in (
+            nt_file_path, nt_file_path, tmp_path / 'input.nt.gz')
+    ]
+
+    assert len({mapped_graph.digest() for mapped_graph in mapped_graphs}) == 1
+    assert all(
+        mapped_graph.entity_labels == mapped_graphs[0].entity_labels
+        for mapped_graph in mapped_graphs)
+    assert BNode('b0') in {
+        node for triple in mapped_graphs[0].triples for node in triple}
+
+
+def test_subgraph(tmp_path):
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(NT, encoding='utf-8')
+    g = load_graph(str(nt_file_path))
+    mapped_graph = MappedGraph.from_graph(g)
+
+    assert isomorphic(
+        mapped_graph.subgraph(np.ones(len(g), dtype=bool)), g)
+    assert len(mapped_graph.subgraph(np.zeros(len(g), dtype=bool))) == 0
+
+
+LITERAL_NT = '''<http://ex.org/a> <http://ex.org/p> <http://ex.org/x> .
+<http://ex.org/b> <http://ex.org/p> "http://ex.org/x" .
+<http://ex.org/b> <http://ex.org/p> "http://ex.org/y" .
+'''
+
+
+def test_literals_equal_to_outlier_iris_are_kept(tmp_path):
+    from shaclgenerator.pykeen_adapter import OutlierDetector
+
+    nt_file_path = tmp_path / 'input.nt'
+    nt_file_path.write_text(LITERAL_NT, encoding='utf-8')
+    g = load_graph(str(nt_file_path))
+    mapped_graph = MappedGraph.from_graph(g)
+    entity_to_id = mapped_graph.entity_to_id
+
+    # "http://ex.org/y" only occurs as a literal
+    candidates = {
+        mapped_graph.entity_labels[idx]
+        for idx in np.flatnonzero(mapped_graph.iri_mask())}
+    assert candidates == {
+        'http://ex.org/a', 'http://ex.org/b', 'http://ex.org/x'}
+
+    entity_mask = np.zeros(len(mapped_graph.entity_labels), dtype=bool)
+    entity_mask[entity_to_id['http://ex.org/x']] = True
+    entity_mask[entity_to_id['http://ex.org/y']] = True
+
+    # the detector without a trained model, which removes the given outliers
+    outlier_detector = OutlierDetector.__new__(OutlierDetector)
+    outlier_detector.rdf_graph = g
+    outlier_detector.mapped_graph = mapped_graph
+    outlier_detector.get_outlier_mask = lambda: entity_mask
+
+    remaining = outlier_detector.remove_outliers()
+
+    assert len(remaining) == 2
+    assert (URIRef('http://ex.org/a'), None, None) not in remaining
+    assert len(outlier_detector.get_remaining_triples()) == 2
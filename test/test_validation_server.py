@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from shaclgenerator import compiled_shapes
+from shaclgenerator.validation_server import ValidationService, \
+    _RequestHandler
+
+SHAPES = '''
+@prefix ex: <http://ex.org/> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+
+ex:PersonShape a sh:NodeShape ;
+    sh:targetClass ex:Person ;
+    sh:property [ sh:path ex:name ; sh:minCount {min_count} ] .
+'''
+
+DATA = b'''
+<http://ex.org/alice> a <http://ex.org/Person> .
+'''
+
+
+def _write_shapes(file_path, min_count: int, mtime_ns: int):
+    file_path.write_text(SHAPES.format(min_count=min_count), encoding='utf-8')
+    os.utime(file_path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_drops_previous_compiled_shapes(tmp_path):
+    shapes_file_path = tmp_path / 'shapes.ttl'
+    _write_shapes(shapes_file_path, 1, 10 ** 18)
+    service = ValidationService(str(shapes_file_path), poll_interval=None)
+    num_compiled_shapes = len(compiled_shapes._compiled_shapes)
+
+    try:
+        for i in range(5):
+            _write_shapes(shapes_file_path, i % 2, 10 ** 18 + i + 1)
+            service.reload_if_changed()
+            conforms, summary, _ = service.validate(DATA, 'text/turtle')
+
+            assert conforms == (i % 2 == 0)
+            assert len(compiled_shapes._compiled_shapes) == num_compiled_shapes
+    finally:
+        service.close()
+
+
+def test_watcher_reloads_changed_shapes(tmp_path):
+    shapes_file_path = tmp_path / 'shapes.ttl'
+    _write_shapes(shapes_file_path, 1, 10 ** 18)
+    service = ValidationService(str(shapes_file_path), poll_interval=0.01)
+
+    try:
+        assert service.validate(DATA, 'text/turtle')[0] is False
+
+        _write_shapes(shapes_file_path, 0, 10 ** 18 + 1)
+        deadline = time.monotonic() + 60
+        while not service.validate(DATA, 'text/turtle')[0]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        service.close()
+
+
+def test_failed_reload_keeps_previous_shapes(tmp_path, caplog):
+    shapes_file_path = tmp_path / 'shapes.ttl'
+    _write_shapes(shapes_file_path, 1, 10 ** 18)
+    service = ValidationService(str(shapes_file_path), poll_interval=None)
+
+    try:
+        shapes_file_path.write_text('ex:PersonShape a', encoding='utf-8')
+        with caplog.at_level(
+                logging.ERROR, 'shaclgenerator.validation_server'):
+            service.reload_if_changed()
+
+        assert 'reloading the shapes failed' in caplog.text
+        assert service.validate(DATA, 'text/turtle')[0] is False
+    finally:
+        service.close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    shapes_file_path = tmp_path / 'shapes.ttl'
+    _write_shapes(shapes_file_path, 1, 10 ** 18)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+    server.service = ValidationService(str(shapes_file_path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def _post(server, data: bytes, content_type: str) -> requests.Response:
+    return requests.post(
+        f'http://127.0.0.1:{server.server_port}/validate',
+        data=data,
+        headers={'Content-Type': content_type})
+
+
+def test_invalid_requests_are_client_errors(server):
+    response = _post(server, DATA, 'text/turtle')
+    assert response.status_code == 200
+    assert response.json()['conforms'] is False
+
+    for data, content_type in (
+            (b'<http://ex.org/alice> a', 'text/turtle'),
+            (b'<http://ex.org/a> <http://ex.org/p>', 'application/n-triples'),
+            (b'<rdf:RDF', 'application/rdf+xml'),
+            (b'{', 'application/ld+json'),
+            (DATA, 'application/x-unknown'),
+    ):
+        response = _post(server, data, content_type)
+        assert response.status_code == 400, content_type
+        assert 'invalid' in response.json()['error']
+
+
+def test_internal_errors_are_server_errors(server, monkeypatch, caplog):
+    def fail(*args):
+        raise RuntimeError('worker died')
+
+    monkeypatch.setattr(server.service, 'validate', fail)
+
+    with caplog.at_level(logging.ERROR, 'shaclgenerator.validation_server'):
+        response = _post(server, DATA, 'text/turtle')
+
+    assert response.status_code == 500
+    assert 'worker died' in response.json()['error']
+    assert any(record.exc_info for record in caplog.records)
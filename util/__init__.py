@@ -1,7 +1,13 @@
 import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from typing import Optional
 
-from rdflib import Graph
+from util.ingestion import chunk_byte_ranges, is_compressed, iter_nt_lines, \
+    split_nt_line
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger('util')
@@ -12,10 +18,68 @@ class BackEnd(Enum):
     SHACLGEN = 'Shaclgen'
 
 
-def nt_to_tsv(nt_input_file_path: str, tsv_output_file_path: str):
-    g = Graph()
-    g.parse(nt_input_file_path, format='ntriples')
-
+def _nt_to_tsv(
+        nt_input_file_path: str,
+        tsv_output_file_path: str,
+        start: int = 0,
+        end: Optional[int] = None
+):
     with open(tsv_output_file_path, 'w') as out_file:
-        for s, p, o in g:
-            out_file.write(f'{str(s)}\t{str(p)}\t{str(o)}\n')
+        for line in iter_nt_lines(nt_input_file_path, start, end):
+            triple = split_nt_line(line)
+            if triple is None:
+                continue
+            s, p, o = triple
+            out_file.write(f'{s}\t{p}\t{o}\n')
+
+
+def nt_to_tsv(
+        nt_input_file_path: str,
+        tsv_output_file_path: str,
+        num_workers: int = 1
+):
+    """
+    Converts an N-Triples file into a tab-separated subject/predicate/object
+    file line by line, i.e. in constant memory. Gzip or bzip2 compressed
+    input files are decompressed on the fly. With num_workers > 1 an
+    uncompressed input file is split into byte ranges which are converted in
+    parallel and concatenated afterwards.
+
+    The lines are the str() values of the rdflib terms, like the former
+    rdflib Graph based version wrote them, with two differences: blank
+    nodes keep their label from the input file, and a triple occurring
+    several times in the input is written as often as it occurs, as removing
+    duplicates would take memory growing with the number of distinct
+    triples.
+    """
+    if num_workers <= 1 or is_compressed(nt_input_file_path):
+        _nt_to_tsv(nt_input_file_path, tsv_output_file_path)
+        return
+
+    byte_ranges = chunk_byte_ranges(nt_input_file_path, num_workers)
+    part_file_paths = [
+        f'{tsv_output_file_path}.part{i}' for i in range(len(byte_ranges))]
+
+    try:
+        with ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context('fork')
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _nt_to_tsv, nt_input_file_path, part_file_path, start, end)
+                for part_file_path, (start, end)
+                in zip(part_file_paths, byte_ranges)
+            ]
+            for future in futures:
+                future.result()
+
+        with open(tsv_output_file_path, 'wb') as out_file:
+            for part_file_path in part_file_paths:
+                with open(part_file_path, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, out_file)
+
+    finally:
+        for part_file_path in part_file_paths:
+            if os.path.exists(part_file_path):
+                os.remove(part_file_path)
@@ -0,0 +1,822 @@
+"""
+Benchmarks for the performance relevant parts of the SHACL generation and
+evaluation pipeline. Each benchmark runs the code paths to compare in fresh
+worker processes so that the reported peak RSS values don't influence each
+other.
+
+Example:
+
+  $ python -m util.benchmark ingestion data/Training74/mergedGraph257.nt
+  $ python -m util.benchmark outliers data/Training74/mergedGraph257.nt
+  $ python -m util.benchmark ann_clustering --num_entities 1000000
+"""
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+from argparse import ArgumentParser
+from typing import Callable, Optional
+
+from util.profiling import Measurement, measure
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('benchmark')
+
+SYNTHETIC_NS = 'http://example.org/synthetic/'
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+XSD_INTEGER = '<http://www.w3.org/2001/XMLSchema#integer>'
+
+
+def write_synthetic_nt(
+        file_path: str,
+        num_triples: int,
+        num_classes: int = 20,
+        properties_per_class: int = 5,
+        seed: int = 42
+):
+    """
+    Writes an N-Triples file with roughly num_triples triples. Every instance
+    gets one rdf:type triple and one triple per property of its class, where
+    properties alternate between integer literals, string literals and links
+    to instances of other classes.
+    """
+    rnd = random.Random(seed)
+    triples_per_instance = properties_per_class + 1
+    num_instances = max(1, num_triples // triples_per_instance)
+
+    with open(file_path, 'w') as out_file:
+        for i in range(num_instances):
+            cls = i % num_classes
+            subject = f'<{SYNTHETIC_NS}instance{i}>'
+            out_file.write(
+                f'{subject} {RDF_TYPE} <{SYNTHETIC_NS}Class{cls}> .\n')
+
+            for prop in range(properties_per_class):
+                predicate = f'<{SYNTHETIC_NS}class{cls}_property{prop}>'
+
+                if prop % 3 == 0:
+                    obj = f'"{rnd.randint(0, 100)}"^^{XSD_INTEGER}'
+                elif prop % 3 == 1:
+                    obj = f'"value {rnd.randint(0, 1000)}"'
+                else:
+                    obj = f'<{SYNTHETIC_NS}instance{rnd.randrange(num_instances)}>'
+
+                out_file.write(f'{subject} {predicate} {obj} .\n')
+
+
+def _measured_call(connection, fn: Callable, args: tuple):
+    with measure() as measurement:
+        result = fn(*args)
+
+    if isinstance(result, Measurement):
+        measurement = result
+
+    connection.send(measurement)
+    connection.close()
+
+
+def run_isolated(fn: Callable, *args) -> Measurement:
+    """
+    Runs fn(*args) in a fresh worker process and returns the time and peak
+    memory it needed. In case only a certain stage of fn should be measured,
+    fn can return its own Measurement of that stage instead.
+    """
+    context = multiprocessing.get_context('fork')
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_measured_call, args=(child_connection, fn, args))
+    process.start()
+    child_connection.close()
+    measurement = parent_connection.recv()
+    process.join()
+
+    return measurement
+
+
+def _report(name: str, measurement: Measurement):
+    logger.info(f'{name:>30}: {measurement}')
+
+
+def _generate_shexer_and_shaclgen_separately(input_file_path: str):
+    from shaclgenerator.shaclgen_adapter import ShaclgenAdapter
+    from shaclgenerator.shexer_adapter import ShexerAdapter
+
+    ShexerAdapter(input_file_path).generate_shacl()
+    ShaclgenAdapter(input_file_path).generate_shacl()
+
+
+def _generate_shexer_and_shaclgen_shared(input_file_path: str):
+    from shaclgenerator.shaclgen_adapter import ShaclgenAdapter
+    from shaclgenerator.shexer_adapter import ShexerAdapter
+    from util.ingestion import load_graph
+
+    g = load_graph(input_file_path)
+    ShexerAdapter(g).generate_shacl()
+    ShaclgenAdapter(g).generate_shacl()
+
+
+def benchmark_ingestion(input_file_path: str):
+    """
+    generate_shacl --shexer --shaclgen with every back end reading the input
+    on its own vs. one shared, parsed input graph
+    """
+    _report(
+        'separate parsing',
+        run_isolated(_generate_shexer_and_shaclgen_separately, input_file_path))
+    _report(
+        'shared input graph',
+        run_isolated(_generate_shexer_and_shaclgen_shared, input_file_path))
+
+
+def _induced_shexer_adapter(input_file_path: str):
+    from shaclgenerator.shexer_adapter import ShexerAdapter
+
+    shexer = ShexerAdapter(input_file_path)
+    # sheXer keeps the induced shapes, so a first output to nowhere leaves
+    # only the output stage to be measured afterwards
+    shexer.write_shacl(os.devnull)
+
+    return shexer
+
+
+def _write_shexer_output_via_string(input_file_path: str, output_file_path: str):
+    from io import StringIO
+    from rdflib import Graph
+    from shexer.consts import SHACL_TURTLE
+
+    shexer = _induced_shexer_adapter(input_file_path)
+
+    with measure() as measurement:
+        # the former ShexerAdapter.generate_shacl() + serialization
+        g = Graph()
+        g.parse(
+            StringIO(shexer._get_shaper().shex_graph(
+                output_format=SHACL_TURTLE,
+                string_output=True,
+                acceptance_threshold=shexer.acceptance_threshold,
+            )),
+            format='ttl')
+        g.serialize(destination=output_file_path, format='ttl')
+
+    return measurement
+
+
+def _write_shexer_output_directly(input_file_path: str, output_file_path: str):
+    shexer = _induced_shexer_adapter(input_file_path)
+
+    with measure() as measurement:
+        shexer.write_shacl(output_file_path)
+
+    return measurement
+
+
+def benchmark_output(input_file_path: str):
+    """
+    Output stage of the sheXer back end: SHACL string -> rdflib graph ->
+    Turtle file vs. writing sheXer's output directly
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        output_file_path = os.path.join(tmp_dir_path, 'shexer_result.ttl')
+
+        _report(
+            'string round trip',
+            run_isolated(
+                _write_shexer_output_via_string,
+                input_file_path,
+                output_file_path))
+        _report(
+            'direct output',
+            run_isolated(
+                _write_shexer_output_directly,
+                input_file_path,
+                output_file_path))
+
+
+def _shex_all_instances(input_file_path: str, output_file_path: str):
+    from shaclgenerator.shexer_adapter import ShexerAdapter
+    from util.ingestion import load_graph
+
+    ShexerAdapter(load_graph(input_file_path)).write_shacl(output_file_path)
+
+
+def _shex_sampled_instances(
+        input_file_path: str,
+        output_file_path: str,
+        budget: int
+):
+    from rdflib import RDF
+    from shaclgenerator.partitioning import PartitionedShexerAdapter
+    from shaclgenerator.sampling import sample_instances
+    from util.ingestion import load_graph
+
+    g = load_graph(input_file_path)
+    sample = sample_instances(g, RDF.type, budget, seed=42)
+    PartitionedShexerAdapter(g, 1, sample.class_instances)\
+        .write_shacl(output_file_path)
+
+
+def benchmark_sampling(input_file_path: str, budget: int):
+    """
+    sheXer on all instances vs. on a sample of budget instances per class,
+    and how far the sampled shapes drift from the full-data shapes
+    """
+    from rdflib import Graph
+    from util.compare_shexer_output import get_differences, \
+        get_shexer_constraints
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        full_file_path = os.path.join(tmp_dir_path, 'full.ttl')
+        sampled_file_path = os.path.join(tmp_dir_path, 'sampled.ttl')
+
+        _report(
+            'all instances',
+            run_isolated(_shex_all_instances, input_file_path, full_file_path))
+        _report(
+            f'sample of {budget} per class',
+            run_isolated(
+                _shex_sampled_instances,
+                input_file_path,
+                sampled_file_path,
+                budget))
+
+        full = get_shexer_constraints(Graph().parse(full_file_path))
+        sampled = get_shexer_constraints(Graph().parse(sampled_file_path))
+
+    num_full = sum(
+        len(constraints)
+        for properties in full.values()
+        for constraints in properties.values())
+    num_missing = len(list(get_differences(full, sampled)))
+    num_additional = len(list(get_differences(sampled, full)))
+
+    logger.info(
+        f'drift: {num_missing} of {num_full} full-data constraints are not '
+        f'part of the sampled shapes, which contain {num_additional} '
+        f'constraints not part of the full-data shapes')
+
+    for target, prop_path, constraint in get_differences(full, sampled):
+        logger.info(f'  missing: {target} {prop_path} {constraint}')
+    for target, prop_path, constraint in get_differences(sampled, full):
+        logger.info(f'  additional: {target} {prop_path} {constraint}')
+
+
+def _nt_to_tsv_via_graph(nt_input_file_path: str, tsv_output_file_path: str):
+    # the former util.nt_to_tsv implementation
+    from rdflib import Graph
+
+    g = Graph()
+    g.parse(nt_input_file_path, format='ntriples')
+
+    with open(tsv_output_file_path, 'w') as out_file:
+        for s, p, o in g:
+            out_file.write(f'{str(s)}\t{str(p)}\t{str(o)}\n')
+
+
+def benchmark_nt_to_tsv(input_file_path: str, num_workers: int):
+    """
+    N-Triples to TSV conversion by means of an rdflib graph vs. streaming
+    """
+    from util import nt_to_tsv
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        tsv_file_path = os.path.join(tmp_dir_path, 'out.tsv')
+
+        _report(
+            'rdflib graph',
+            run_isolated(_nt_to_tsv_via_graph, input_file_path, tsv_file_path))
+        _report(
+            'streaming',
+            run_isolated(nt_to_tsv, input_file_path, tsv_file_path))
+
+        if num_workers > 1:
+            _report(
+                f'streaming, {num_workers} workers',
+                run_isolated(
+                    nt_to_tsv, input_file_path, tsv_file_path, num_workers))
+
+
+def _validate_single_process(data_file_path: str, shapes_file_path: str):
+    from pyshacl import validate
+    from rdflib import Graph
+    from util.ingestion import load_graph
+
+    data_graph = load_graph(data_file_path)
+    shapes_graph = Graph().parse(shapes_file_path)
+
+    with measure() as measurement:
+        validate(data_graph=data_graph, shacl_graph=shapes_graph)
+
+    return measurement
+
+
+def _validate_sharded(
+        data_file_path: str,
+        shapes_file_path: str,
+        num_workers: int,
+        strategy_name: str
+):
+    from rdflib import Graph
+    from shaclgenerator.sharded_validation import ShardingStrategy, \
+        validate_sharded
+    from util.ingestion import load_graph
+
+    data_graph = load_graph(data_file_path)
+    shapes_graph = Graph().parse(shapes_file_path)
+
+    with measure() as measurement:
+        validate_sharded(
+            data_graph,
+            shapes_graph,
+            num_workers,
+            ShardingStrategy(strategy_name))
+
+    return measurement
+
+
+def benchmark_validation(input_file_path: str, num_workers: int):
+    """
+    evaluate_shacl in a single process vs. sharded over num_workers worker
+    processes, validating the input against its own sheXer shapes. Only the
+    validation itself is measured, and the peak RSS is the one of the main
+    process.
+    """
+    from shaclgenerator.sharded_validation import ShardingStrategy
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        shapes_file_path = os.path.join(tmp_dir_path, 'shexer_result.ttl')
+        run_isolated(_shex_all_instances, input_file_path, shapes_file_path)
+
+        _report(
+            'single process',
+            run_isolated(
+                _validate_single_process, input_file_path, shapes_file_path))
+
+        for strategy in ShardingStrategy:
+            _report(
+                f'{strategy.value} sharding, {num_workers} workers',
+                run_isolated(
+                    _validate_sharded,
+                    input_file_path,
+                    shapes_file_path,
+                    num_workers,
+                    strategy.value))
+
+
+def _synthetic_cluster_labels(
+        num_entities: int,
+        outlier_fraction: float,
+        seed: int = 42
+):
+    """
+    DBSCAN-like cluster labels of num_entities entities, of which
+    outlier_fraction are noise
+    """
+    import numpy as np
+    from shaclgenerator.outlier_filtering import NOISE_LABEL
+
+    rng = np.random.default_rng(seed)
+    cluster_labels = rng.integers(0, 10, num_entities)
+    cluster_labels[rng.random(num_entities) < outlier_fraction] = NOISE_LABEL
+
+    return cluster_labels
+
+
+def _synthetic_mapped_triples(
+        num_triples: int,
+        num_entities: int,
+        seed: int = 42
+):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    mapped_triples = rng.integers(0, num_entities, (num_triples, 3))
+    mapped_triples[:, 1] %= 100
+
+    return mapped_triples
+
+
+def _filter_mapped_triples_by_list(
+        num_triples: int,
+        num_entities: int,
+        outlier_fraction: float
+):
+    import numpy as np
+    from shaclgenerator.outlier_filtering import NOISE_LABEL
+
+    mapped_triples = _synthetic_mapped_triples(
+        num_triples, num_entities).tolist()
+    cluster_labels = _synthetic_cluster_labels(num_entities, outlier_fraction)
+
+    with measure() as measurement:
+        # the former OutlierDetector.remove_outliers(), on ids
+        outliers = [
+            int(idx) for idx in np.where(cluster_labels == NOISE_LABEL)[0]]
+        remaining_triples = [
+            (h, r, t)
+            for h, r, t in mapped_triples
+            if h not in outliers and t not in outliers
+        ]
+
+    logger.info(f'{len(remaining_triples)} remaining triples')
+
+    return measurement
+
+
+def _filter_mapped_triples_by_mask(
+        num_triples: int,
+        num_entities: int,
+        outlier_fraction: float
+):
+    import numpy as np
+    from shaclgenerator.outlier_filtering import outlier_mask, \
+        outlier_triples_mask
+
+    mapped_triples = _synthetic_mapped_triples(num_triples, num_entities)
+    cluster_labels = _synthetic_cluster_labels(num_entities, outlier_fraction)
+    candidate_mask = np.ones(num_entities, dtype=bool)
+    is_iri = np.ones(num_triples, dtype=bool)
+
+    with measure() as measurement:
+        entity_mask = outlier_mask(cluster_labels, candidate_mask)
+        # the synthetic entities are all IRIs
+        remaining_triples = mapped_triples[~outlier_triples_mask(
+            mapped_triples, entity_mask, is_iri, is_iri)]
+
+    logger.info(f'{len(remaining_triples)} remaining triples')
+
+    return measurement
+
+
+def _remove_outliers_by_list(input_file_path: str, outlier_fraction: float):
+    import numpy as np
+    from rdflib import Graph, URIRef
+    from shaclgenerator.outlier_filtering import MappedGraph
+    from util.ingestion import load_graph
+
+    g = load_graph(input_file_path)
+    entity_labels = MappedGraph.from_graph(g).entity_labels
+    cluster_labels = _synthetic_cluster_labels(
+        len(entity_labels), outlier_fraction)
+
+    with measure() as measurement:
+        # the former OutlierDetector.remove_outliers()
+        outliers = [
+            URIRef(entity_labels[idx])
+            for idx in np.where(cluster_labels == -1)[0]
+            if entity_labels[idx].startswith('http://')
+        ]
+        cleaned_g = Graph()
+        for s, p, o in g:
+            if s in outliers or o in outliers:
+                continue
+            cleaned_g.add((s, p, o))
+
+    logger.info(f'{len(cleaned_g)} remaining triples')
+
+    return measurement
+
+
+def _remove_outliers_by_mask(input_file_path: str, outlier_fraction: float):
+    from shaclgenerator.outlier_filtering import MappedGraph, outlier_mask
+    from util.ingestion import load_graph
+
+    mapped_graph = MappedGraph.from_graph(load_graph(input_file_path))
+    cluster_labels = _synthetic_cluster_labels(
+        len(mapped_graph.entity_labels), outlier_fraction)
+    candidate_mask = mapped_graph.iri_mask()
+
+    with measure() as measurement:
+        entity_mask = outlier_mask(cluster_labels, candidate_mask)
+        cleaned_g = mapped_graph.subgraph(
+            ~mapped_graph.outlier_triples_mask(entity_mask))
+
+    logger.info(f'{len(cleaned_g)} remaining triples')
+
+    return measurement
+
+
+def _embedding_input_via_tsv(input_file_path: str):
+    # the former PyKEENAdapter/OutlierDetector ingestion
+    from pykeen.datasets import Dataset
+    from pykeen.triples import TriplesFactory
+    from util import nt_to_tsv
+    from util.ingestion import load_graph
+
+    load_graph(input_file_path)
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        tsv_file_path = os.path.join(tmp_dir_path, 'input.tsv')
+        nt_to_tsv(input_file_path, tsv_file_path)
+        TriplesFactory.from_path(tsv_file_path)
+        Dataset.from_path(tsv_file_path)
+
+
+def _embedding_input_via_mapped_graph(input_file_path: str):
+    import torch
+    from pykeen.datasets import Dataset
+    from pykeen.triples import TriplesFactory
+    from shaclgenerator.outlier_filtering import MappedGraph
+    from util.ingestion import load_graph
+
+    mapped_graph = MappedGraph.from_graph(load_graph(input_file_path))
+    triples_factory = TriplesFactory(
+        mapped_triples=torch.as_tensor(mapped_graph.mapped_triples),
+        entity_to_id=mapped_graph.entity_to_id,
+        relation_to_id=mapped_graph.relation_to_id,
+    )
+    Dataset.from_tf(triples_factory)
+
+
+def benchmark_embedding_input(input_file_path: str):
+    """
+    Input of the PyKEEN back end: rdflib graph plus a temporary TSV file
+    loaded into a triples factory and a dataset vs. one id mapping of the
+    rdflib graph shared by both
+    """
+    _report(
+        'graph + TSV file',
+        run_isolated(_embedding_input_via_tsv, input_file_path))
+    _report(
+        'graph + id mapping',
+        run_isolated(_embedding_input_via_mapped_graph, input_file_path))
+
+
+def benchmark_outliers(
+        input_file_path: str,
+        outlier_fraction: float,
+        num_mapped_triples: int,
+        num_list_triples: int
+):
+    """
+    OutlierDetector.remove_outliers() with the outliers in a list which is
+    searched for every triple vs. a boolean outlier mask over the entity ids:
+    on the rdflib graph of the input, and on num_mapped_triples synthetic
+    id-mapped triples. As the list search takes hours on millions of
+    triples, it is only run on the first num_list_triples of them.
+    """
+    _report(
+        'rdflib graph, outlier list',
+        run_isolated(_remove_outliers_by_list, input_file_path, outlier_fraction))
+    _report(
+        'rdflib graph, outlier mask',
+        run_isolated(_remove_outliers_by_mask, input_file_path, outlier_fraction))
+
+    # as many entities per triple as in graphs of mostly literal values
+    num_entities = max(1, num_mapped_triples // 5)
+    _report(
+        f'{num_list_triples} ids, outlier list',
+        run_isolated(
+            _filter_mapped_triples_by_list,
+            num_list_triples,
+            num_entities,
+            outlier_fraction))
+    _report(
+        f'{num_mapped_triples} ids, outlier mask',
+        run_isolated(
+            _filter_mapped_triples_by_mask,
+            num_mapped_triples,
+            num_entities,
+            outlier_fraction))
+
+
+def _synthetic_embeddings(
+        num_entities: int,
+        dim: int,
+        num_clusters: int = 50,
+        outlier_fraction: float = 0.01,
+        seed: int = 42
+):
+    """
+    Embeddings of num_entities entities in num_clusters Gaussian clusters of
+    unit standard deviation, of which outlier_fraction are spread uniformly
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-10, 10, (num_clusters, dim))
+    embeddings = centers[rng.integers(0, num_clusters, num_entities)] \
+        + rng.standard_normal((num_entities, dim))
+    outliers = rng.random(num_entities) < outlier_fraction
+    embeddings[outliers] = rng.uniform(-15, 15, (outliers.sum(), dim))
+
+    return embeddings.astype(np.float32)
+
+
+def _cluster_embeddings(
+        neighbor_search_value: str,
+        num_entities: int,
+        dim: int,
+        eps: float,
+        labels_file_path: str
+):
+    import numpy as np
+    from shaclgenerator.embedding_clustering import NeighborSearch, \
+        make_clusterer
+
+    embeddings = _synthetic_embeddings(num_entities, dim)
+    clusterer = make_clusterer(NeighborSearch(neighbor_search_value), eps)
+
+    with measure() as measurement:
+        labels = clusterer.fit_predict(embeddings)
+    np.save(labels_file_path, labels)
+
+    return measurement
+
+
+def benchmark_ann_clustering(
+        num_entities: int,
+        dim: int,
+        eps: float,
+        num_queries: int
+):
+    """
+    DBSCAN on synthetic embeddings with the exact neighbor search vs. the
+    random projection forest, and the recall of the latter's neighbors and
+    outliers compared to the exact ones
+    """
+    import numpy as np
+    from shaclgenerator.embedding_clustering import NeighborSearch, \
+        RandomProjectionClusterer, neighbor_recall
+    from shaclgenerator.outlier_filtering import NOISE_LABEL
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        labels = {}
+        for neighbor_search in NeighborSearch:
+            labels_file_path = os.path.join(
+                tmp_dir_path, f'{neighbor_search.value}.npy')
+            _report(
+                f'{num_entities}x{dim}, {neighbor_search.value}',
+                run_isolated(
+                    _cluster_embeddings,
+                    neighbor_search.value,
+                    num_entities,
+                    dim,
+                    eps,
+                    labels_file_path))
+            labels[neighbor_search] = np.load(labels_file_path)
+
+    embeddings = _synthetic_embeddings(num_entities, dim)
+    graph = RandomProjectionClusterer(eps).neighbor_graph(embeddings)
+    logger.info(neighbor_recall(embeddings, graph, eps, num_queries))
+
+    exact_outliers = labels[NeighborSearch.EXACT] == NOISE_LABEL
+    found_outliers = labels[NeighborSearch.RANDOM_PROJECTION] == NOISE_LABEL
+    logger.info(
+        f'{exact_outliers.sum()} exact outliers, {found_outliers.sum()} '
+        f'outliers with the random projection forest, '
+        f'{(exact_outliers & found_outliers).sum()} of them in both')
+
+
+def _with_input(
+        input_file_path: Optional[str],
+        num_triples: int,
+        fn: Callable,
+        num_classes: int = 20
+):
+    if input_file_path is not None:
+        fn(input_file_path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        input_file_path = os.path.join(tmp_dir_path, 'synthetic.nt')
+        logger.info(
+            f'writing {num_triples} synthetic triples of {num_classes} classes')
+        write_synthetic_nt(input_file_path, num_triples, num_classes)
+        fn(input_file_path)
+
+
+if __name__ == '__main__':
+    argument_parser = ArgumentParser()
+    sub_parsers = argument_parser.add_subparsers(dest='benchmark', required=True)
+
+    ingestion_parser = sub_parsers.add_parser(
+        'ingestion',
+        help='Parsing the input once per back end vs. one shared input graph.')
+    ingestion_parser.add_argument('input_file', nargs='?')
+    ingestion_parser.add_argument('--num_triples', type=int, default=100000)
+
+    nt_to_tsv_parser = sub_parsers.add_parser(
+        'nt2tsv',
+        help='N-Triples to TSV conversion via an rdflib graph vs. streaming.')
+    nt_to_tsv_parser.add_argument('input_file', nargs='?')
+    nt_to_tsv_parser.add_argument('--num_triples', type=int, default=10000000)
+    nt_to_tsv_parser.add_argument(
+        '--num_workers', type=int, default=os.cpu_count())
+
+    output_parser = sub_parsers.add_parser(
+        'output',
+        help='sheXer output via a SHACL string and an rdflib graph vs. '
+             'writing it directly.')
+    output_parser.add_argument('input_file', nargs='?')
+    output_parser.add_argument('--num_triples', type=int, default=300000)
+    output_parser.add_argument('--num_classes', type=int, default=5000)
+
+    sampling_parser = sub_parsers.add_parser(
+        'sampling',
+        help='sheXer on all instances vs. on a per-class sample, including '
+             'the drift of the sampled shapes.')
+    sampling_parser.add_argument('input_file', nargs='?')
+    sampling_parser.add_argument('--num_triples', type=int, default=300000)
+    sampling_parser.add_argument('--budget', type=int, default=1000)
+
+    validation_parser = sub_parsers.add_parser(
+        'validation',
+        help='SHACL validation in a single process vs. sharded over several '
+             'worker processes.')
+    validation_parser.add_argument('input_file', nargs='?')
+    validation_parser.add_argument('--num_triples', type=int, default=100000)
+    validation_parser.add_argument(
+        '--num_workers', type=int, default=os.cpu_count())
+
+    embedding_input_parser = sub_parsers.add_parser(
+        'embedding_input',
+        help='PyKEEN input via a temporary TSV file vs. an id mapping of '
+             'the input graph.')
+    embedding_input_parser.add_argument('input_file', nargs='?')
+    embedding_input_parser.add_argument(
+        '--num_triples', type=int, default=300000)
+
+    outliers_parser = sub_parsers.add_parser(
+        'outliers',
+        help='Outlier removal with a list of outliers vs. a boolean mask '
+             'over the entity ids.')
+    outliers_parser.add_argument('input_file', nargs='?')
+    outliers_parser.add_argument('--num_triples', type=int, default=300000)
+    outliers_parser.add_argument('--outlier_fraction', type=float, default=0.01)
+    outliers_parser.add_argument(
+        '--num_mapped_triples', type=int, default=10000000)
+    outliers_parser.add_argument(
+        '--num_list_triples', type=int, default=100000)
+
+    ann_clustering_parser = sub_parsers.add_parser(
+        'ann_clustering',
+        help='DBSCAN on synthetic embeddings with the exact neighbor search '
+             'vs. a random projection forest.')
+    ann_clustering_parser.add_argument(
+        '--num_entities', type=int, default=100000)
+    ann_clustering_parser.add_argument('--dim', type=int, default=50)
+    ann_clustering_parser.add_argument('--eps', type=float, default=8.0)
+    ann_clustering_parser.add_argument(
+        '--num_queries',
+        type=int,
+        default=1000,
+        help="Number of sampled embeddings whose exact neighbors the "
+             "approximate ones are compared to.")
+
+    args = argument_parser.parse_args()
+
+    if args.benchmark == 'ingestion':
+        _with_input(args.input_file, args.num_triples, benchmark_ingestion)
+
+    elif args.benchmark == 'nt2tsv':
+        _with_input(
+            args.input_file,
+            args.num_triples,
+            lambda input_file_path:
+                benchmark_nt_to_tsv(input_file_path, args.num_workers)
+        )
+
+    elif args.benchmark == 'output':
+        _with_input(
+            args.input_file,
+            args.num_triples,
+            benchmark_output,
+            args.num_classes
+        )
+
+    elif args.benchmark == 'sampling':
+        _with_input(
+            args.input_file,
+            args.num_triples,
+            lambda input_file_path:
+                benchmark_sampling(input_file_path, args.budget)
+        )
+
+    elif args.benchmark == 'validation':
+        _with_input(
+            args.input_file,
+            args.num_triples,
+            lambda input_file_path:
+                benchmark_validation(input_file_path, args.num_workers)
+        )
+
+    elif args.benchmark == 'embedding_input':
+        _with_input(
+            args.input_file, args.num_triples, benchmark_embedding_input)
+
+    elif args.benchmark == 'outliers':
+        _with_input(
+            args.input_file,
+            args.num_triples,
+            lambda input_file_path:
+                benchmark_outliers(
+                    input_file_path,
+                    args.outlier_fraction,
+                    args.num_mapped_triples,
+                    args.num_list_triples)
+        )
+
+    elif args.benchmark == 'ann_clustering':
+        benchmark_ann_clustering(
+            args.num_entities, args.dim, args.eps, args.num_queries)
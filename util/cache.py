@@ -1,38 +1,210 @@
-import os.path
+"""
+On-disk cache for the entity embeddings of trained PyKEEN models.
 
-import torch
-from pykeen.models import Model
-from pykeen.pipeline import PipelineResult
+Entries are keyed by a hash of the input graph's content and everything
+else the training depends on (the model, its pipeline parameters and the
+library versions), so a changed input never reuses embeddings trained on
+its previous content. Each entry is a directory of exported embeddings
+(see util.embedding_export), which are memory-mapped on a cache hit instead
+of read.
+
+Entries are written to a temporary directory first and then renamed, so
+concurrent readers never see partially written entries, and the cache
+directory is guarded by a file lock. Whenever the cache grows beyond
+max_bytes the least recently used entries are evicted. Temporary directories
+left behind by killed writers are removed once they are older than a grace
+period.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from util.content_cache import make_key
+from util.embedding_export import read_embeddings, read_entity_labels, \
+    write_embeddings
+
+logger = logging.getLogger('util.cache')
 
 CACHE_DIR = '.cache'
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
 
-if not os.path.exists(CACHE_DIR):
-    os.mkdir(CACHE_DIR)
+_LOCK_FILE_NAME = '.lock'
+_TMP_PREFIX = '.tmp'
+# age in seconds after which a temporary directory is taken to be left
+# behind by a killed writer rather than being written
+_TMP_GRACE_PERIOD = 3600
 
 
 class CacheMiss(Exception):
     pass
 
 
-def _mk_path(dataset_name: str, model_name: str):
-    file_name = dataset_name.replace(' ', '_') + '__' + model_name + '.pkl'
-    file_path = os.path.join(CACHE_DIR, file_name)
+def embedding_key(
+        content_digest: str,
+        model_name: str,
+        pipeline_kwargs: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Cache key of the embeddings of model_name trained on a graph with the
+    given content digest. pipeline_kwargs have to be JSON serializable.
+    """
+    import pykeen
+    import torch
+
+    return make_key(
+        'embeddings',
+        content_digest,
+        model_name,
+        pipeline_kwargs or {},
+        pykeen.get_version(),
+        torch.__version__)
+
+
+def _last_modified(dir_path: str) -> float:
+    return max(
+        [os.stat(dir_path).st_mtime]
+        + [entry.stat().st_mtime for entry in os.scandir(dir_path)])
+
+
+def _dir_size(dir_path: str) -> int:
+    return sum(
+        entry.stat().st_size
+        for entry in os.scandir(dir_path) if entry.is_file())
+
+
+class EmbeddingCache:
+    def __init__(
+            self,
+            cache_dir_path: str = CACHE_DIR,
+            max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+    ):
+        """
+        The cache directory is only created once the first entry is stored.
+        """
+        self.cache_dir_path = cache_dir_path
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir_path, key)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.cache_dir_path, exist_ok=True)
+        with open(os.path.join(self.cache_dir_path, _LOCK_FILE_NAME), 'w') \
+                as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """
+        The read-only memory-mapped entity embeddings of key, or None if the
+        model had no entity representations. Raises CacheMiss if there is no
+        entry for key.
+        """
+        entry_path = self._entry_path(key)
+        if not os.path.isdir(entry_path):
+            raise CacheMiss()
+
+        with self._locked():
+            if not os.path.isdir(entry_path):
+                raise CacheMiss()
+
+            # the modification time serves as last access time for eviction
+            os.utime(entry_path)
+            # opened while locked, the mapping stays valid even if the entry
+            # is evicted afterwards
+            embeddings = read_embeddings(entry_path)
+
+        logger.info(f'cache hit {key}')
+
+        return embeddings
+
+    def load_entity_labels(self, key: str) -> List[str]:
+        """
+        The entity labels of key's embeddings, i.e. the label of the entity
+        of each row
+        """
+        try:
+            return read_entity_labels(self._entry_path(key))
+        except FileNotFoundError:
+            raise CacheMiss()
+
+    def store(
+            self,
+            key: str,
+            embeddings: Optional[np.ndarray],
+            entity_labels: Sequence[str],
+            meta: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Stores the entity embeddings (None if the model has none) and the
+        labels of their rows as entry of key
+        """
+        os.makedirs(self.cache_dir_path, exist_ok=True)
+        tmp_dir_path = tempfile.mkdtemp(
+            prefix=_TMP_PREFIX, dir=self.cache_dir_path)
+
+        try:
+            write_embeddings(tmp_dir_path, embeddings, entity_labels, meta)
+
+            with self._locked():
+                # an entry stored concurrently for the same key is kept
+                if not os.path.exists(self._entry_path(key)):
+                    os.rename(tmp_dir_path, self._entry_path(key))
+                self._evict()
+
+        finally:
+            if os.path.exists(tmp_dir_path):
+                shutil.rmtree(tmp_dir_path)
+
+        logger.info(f'cached embeddings as {key}')
 
-    return file_path
+    def _remove_stale_tmp_dirs(self):
+        stale_time = time.time() - _TMP_GRACE_PERIOD
+        for entry in os.scandir(self.cache_dir_path):
+            if not entry.name.startswith(_TMP_PREFIX) or not entry.is_dir():
+                continue
+            try:
+                # other writers write their temporary directories unlocked
+                if _last_modified(entry.path) >= stale_time:
+                    continue
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            logger.info(f'removed stale {entry.path} from cache')
 
+    def _evict(self):
+        self._remove_stale_tmp_dirs()
 
-def load(dataset_name: str, model_name: str) -> Model:
-    file_path = _mk_path(dataset_name, model_name)
+        if self.max_bytes is None:
+            return
 
-    if os.path.exists(file_path):
-        model = torch.load(file_path)
-        return model
+        entries = []
+        for entry in os.scandir(self.cache_dir_path):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            entries.append(
+                (entry.stat().st_mtime, _dir_size(entry.path), entry.path))
 
-    else:
-        raise CacheMiss()
+        total_bytes = sum(size for _, size, _ in entries)
 
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path)
+            total_bytes -= size
+            logger.info(f'evicted {entry_path} from cache')
 
-def store(dataset_name: str, model_name: str, result: PipelineResult):
-    file_path = _mk_path(dataset_name, model_name)
 
-    result.save_model(file_path)
+# the cache of the default directory, which is only created when needed
+default_cache = EmbeddingCache()
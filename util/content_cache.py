@@ -0,0 +1,160 @@
+"""
+Content-addressed on-disk cache for result files, e.g. generated SHACL shapes.
+Entries are keyed by a hash of everything the result depends on (the input
+file's content, back end, parameters, versions), so unchanged inputs map to
+the same entry no matter where or when they were generated.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Optional
+
+logger = logging.getLogger('util.content_cache')
+
+_LOCK_FILE_NAME = '.lock'
+_TMP_PREFIX = '.tmp'
+
+
+def file_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 hex digest of a file's content, read in chunks
+    """
+    digest = hashlib.sha256()
+
+    with open(file_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """
+    Cache key of the given JSON serializable parts
+    """
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ContentCache:
+    def __init__(self, cache_dir_path: str, max_bytes: Optional[int] = None):
+        """
+        If max_bytes is given, the least recently used entries are evicted
+        whenever the cache grows beyond this size.
+        """
+        self.cache_dir_path = cache_dir_path
+        self.max_bytes = max_bytes
+
+        os.makedirs(cache_dir_path, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir_path, key)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.cache_dir_path, _LOCK_FILE_NAME), 'w') \
+                as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: str, output_file_path: str) -> bool:
+        """
+        Copies the entry of key to output_file_path. Returns False on a cache
+        miss.
+        """
+        entry_path = self._entry_path(key)
+
+        with self._locked():
+            if not os.path.exists(entry_path):
+                return False
+
+            # the modification time serves as last access time for eviction
+            os.utime(entry_path)
+            shutil.copyfile(entry_path, output_file_path)
+
+        logger.info(f'cache hit {key} -> {output_file_path}')
+
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        """
+        The content of the entry of key, or None on a cache miss
+        """
+        entry_path = self._entry_path(key)
+
+        with self._locked():
+            if not os.path.exists(entry_path):
+                return None
+
+            os.utime(entry_path)
+            with open(entry_path, 'rb') as entry_file:
+                data = entry_file.read()
+
+        logger.info(f'cache hit {key}')
+
+        return data
+
+    def put(self, key: str, file_path: str):
+        """
+        Stores a copy of file_path as entry of key
+        """
+        def copy(tmp_file: BinaryIO):
+            with open(file_path, 'rb') as input_file:
+                shutil.copyfileobj(input_file, tmp_file)
+
+        self._store(key, copy)
+        logger.info(f'cached {file_path} as {key}')
+
+    def write(self, key: str, data: bytes):
+        """
+        Stores data as entry of key
+        """
+        self._store(key, lambda tmp_file: tmp_file.write(data))
+        logger.info(f'cached {len(data)} bytes as {key}')
+
+    def _store(self, key: str, write_entry: Callable[[BinaryIO], None]):
+        # The entry is written to a temporary file first and then renamed,
+        # so concurrent readers never see partially written entries.
+        tmp_file_descriptor, tmp_file_path = tempfile.mkstemp(
+            prefix=_TMP_PREFIX, dir=self.cache_dir_path)
+
+        try:
+            with os.fdopen(tmp_file_descriptor, 'wb') as tmp_file:
+                write_entry(tmp_file)
+
+            with self._locked():
+                os.replace(tmp_file_path, self._entry_path(key))
+                self._evict()
+
+        except BaseException:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            raise
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for entry in os.scandir(self.cache_dir_path):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(entry_path)
+            total_bytes -= size
+            logger.info(f'evicted {entry_path} from cache')
@@ -0,0 +1,68 @@
+"""
+Entity embeddings as files which can be read without torch or PyKEEN: a
+directory holding the embeddings as .npy file, which is memory-mapped
+instead of read, next to the entity labels (the id map of the embeddings'
+rows) and a JSON object of metadata, e.g. the content digest of the graph
+they were trained on.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDINGS_FILE_NAME = 'embeddings.npy'
+ENTITY_LABELS_FILE_NAME = 'entity_labels.json'
+META_FILE_NAME = 'meta.json'
+
+
+def write_embeddings(
+        dir_path: str,
+        embeddings: Optional[np.ndarray],
+        entity_labels: Sequence[str],
+        meta: Optional[Dict[str, Any]] = None,
+        dtype: Optional[np.dtype] = None
+):
+    """
+    Writes the embeddings (None if there are none) and the labels of their
+    rows to dir_path. If dtype is given, the embeddings are converted to it,
+    e.g. to float16 to halve their size.
+    """
+    os.makedirs(dir_path, exist_ok=True)
+
+    if embeddings is not None:
+        if dtype is not None:
+            if np.iscomplexobj(embeddings):
+                raise ValueError(
+                    f'complex embeddings cannot be converted to {dtype}')
+            embeddings = embeddings.astype(dtype, copy=False)
+        np.save(os.path.join(dir_path, EMBEDDINGS_FILE_NAME), embeddings)
+
+    with open(os.path.join(dir_path, ENTITY_LABELS_FILE_NAME), 'w') \
+            as labels_file:
+        json.dump(list(entity_labels), labels_file)
+
+    with open(os.path.join(dir_path, META_FILE_NAME), 'w') as meta_file:
+        json.dump(meta or {}, meta_file)
+
+
+def read_embeddings(dir_path: str) -> Optional[np.ndarray]:
+    """
+    The read-only memory-mapped embeddings in dir_path, or None if there are
+    none
+    """
+    file_path = os.path.join(dir_path, EMBEDDINGS_FILE_NAME)
+    if not os.path.exists(file_path):
+        return None
+
+    return np.load(file_path, mmap_mode='r')
+
+
+def read_entity_labels(dir_path: str) -> List[str]:
+    with open(os.path.join(dir_path, ENTITY_LABELS_FILE_NAME)) as labels_file:
+        return json.load(labels_file)
+
+
+def read_meta(dir_path: str) -> Dict[str, Any]:
+    with open(os.path.join(dir_path, META_FILE_NAME)) as meta_file:
+        return json.load(meta_file)
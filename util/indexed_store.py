@@ -0,0 +1,462 @@
+"""
+Persistent, indexed on-disk store of an RDF dataset, which is built once by
+an import step and then opened by every run in milliseconds instead of
+parsing the input file again.
+
+The terms are dictionary-encoded: they are sorted and stored one after the
+other in terms.bin, and a term's id is its position in this order. The
+triples are stored as ids in three sorted indexes (SPO, POS and OSP) of
+three contiguous columns each. All files are memory-mapped, so a lookup
+binary searches the index columns and the terms and only reads the pages it
+touches.
+
+IndexedStore makes the store available as rdflib Store, i.e. to everything
+working with rdflib graphs. Triples added to or removed from the graph are
+kept in memory and never written back to disk.
+
+Example:
+
+  $ python -m util.indexed_store data/cities.nt.gz data/cities.store
+  $ evaluate_shacl out/shexer_result.ttl --input_rdf_file data/cities.store
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from array import array
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from rdflib import BNode, Graph, Literal, URIRef, plugin
+from rdflib.plugins.stores.memory import SimpleMemory
+from rdflib.store import NO_STORE, VALID_STORE, Store
+from rdflib.term import Node
+
+from util.content_cache import file_digest
+from util.ingestion import BNODE_TERM, IRI_TERM, NTTerm, guess_rdf_format, \
+    iter_nt_lines, load_graph, nt_term_node, tokenize_nt_line
+
+logger = logging.getLogger('util.indexed_store')
+
+_META_FILE_NAME = 'meta.json'
+_TERMS_FILE_NAME = 'terms.bin'
+_TERM_OFFSETS_FILE_NAME = 'term_offsets.npy'
+_FORMAT_VERSION = 1
+
+# The positions of subject, predicate and object in the rows of each index.
+# SPO serves patterns with a bound subject, POS those with a bound predicate
+# and OSP those with a bound object or a bound subject and object.
+_INDEXES = {
+    'spo': (0, 1, 2),
+    'pos': (1, 2, 0),
+    'osp': (2, 0, 1),
+}
+
+# number of triples read from an index at once
+_READ_CHUNK_SIZE = 4096
+# number of triples collected in memory during the import before they are
+# written to disk
+_IMPORT_CHUNK_SIZE = 1_000_000
+
+Triple = Tuple[Node, Node, Node]
+
+
+def term_key(term: Node) -> Optional[str]:
+    """
+    The string a term is stored as. Terms are sorted by their keys.
+    """
+    # str() of the terms, as rdflib terms concatenate into new terms
+    if isinstance(term, URIRef):
+        return '<' + str(term)
+    if isinstance(term, BNode):
+        return '_' + str(term)
+    if isinstance(term, Literal):
+        if term.language:
+            suffix = '@' + term.language
+        elif term.datatype:
+            suffix = '^' + str(term.datatype)
+        else:
+            suffix = ''
+        # lexical forms don't contain NUL characters, suffixes neither
+        return '"' + str(term) + '\x00' + suffix
+
+    return None
+
+
+def key_term(key: str) -> Node:
+    kind, value = key[0], key[1:]
+
+    if kind == '<':
+        return URIRef(value)
+    if kind == '_':
+        return BNode(value)
+
+    lexical_form, _, suffix = value.rpartition('\x00')
+    if suffix.startswith('@'):
+        return Literal(lexical_form, lang=suffix[1:])
+    if suffix.startswith('^'):
+        return Literal(lexical_form, datatype=URIRef(suffix[1:]))
+    return Literal(lexical_form)
+
+
+def _nt_term_key(nt_term: NTTerm) -> str:
+    kind, value = nt_term[:2]
+
+    if kind == IRI_TERM:
+        return '<' + value
+    if kind == BNODE_TERM:
+        return '_' + value
+
+    # built as rdflib term, so the lexical form is normalized like when
+    # parsed by rdflib (e.g. "01"^^xsd:integer -> "1")
+    return term_key(nt_term_node(nt_term))
+
+
+def _iter_triple_keys(input_file_path: str) -> Iterator[Tuple[str, str, str]]:
+    if (guess_rdf_format(input_file_path) or 'nt') != 'nt':
+        for triple in load_graph(input_file_path):
+            yield tuple(term_key(term) for term in triple)
+        return
+
+    for line in iter_nt_lines(input_file_path):
+        nt_terms = tokenize_nt_line(line)
+
+        if nt_terms is not None:
+            yield tuple(_nt_term_key(nt_term) for nt_term in nt_terms)
+
+
+def _sorted_index(triples: np.ndarray, positions: Tuple[int, int, int]) -> np.ndarray:
+    rows = triples[:, positions]
+    order = np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))
+
+    return rows[order]
+
+
+def import_store(input_file_path: str, store_dir_path: str):
+    """
+    Builds the store of an RDF file (N-Triples, optionally compressed, are
+    read line by line, other formats are parsed by rdflib) in
+    store_dir_path, replacing a previous store there. The term dictionary
+    is kept in memory during the import.
+    """
+    logger.info(f'importing {input_file_path} into {store_dir_path}')
+
+    parent_dir_path = os.path.dirname(os.path.abspath(store_dir_path))
+    # built next to the final location and moved there once complete, so
+    # a store directory is never seen half written
+    tmp_dir_path = tempfile.mkdtemp(prefix='.tmp', dir=parent_dir_path)
+
+    try:
+        # preliminary ids in the order of first occurrence
+        term_ids = {}
+        triples_file_path = os.path.join(tmp_dir_path, 'triples.tmp')
+        num_triples = 0
+
+        with open(triples_file_path, 'wb') as triples_file:
+            chunk = array('Q')
+            for triple_keys in _iter_triple_keys(input_file_path):
+                for key in triple_keys:
+                    term_id = term_ids.get(key)
+                    if term_id is None:
+                        term_id = term_ids[key] = len(term_ids)
+                    chunk.append(term_id)
+
+                num_triples += 1
+                if len(chunk) >= 3 * _IMPORT_CHUNK_SIZE:
+                    chunk.tofile(triples_file)
+                    chunk = array('Q')
+            chunk.tofile(triples_file)
+
+        logger.info(f'read {num_triples} triples with {len(term_ids)} terms')
+
+        # final ids in the order of the terms' keys
+        keys = list(term_ids)
+        del term_ids
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        id_dtype = np.uint32 if len(keys) < 2 ** 32 else np.uint64
+        final_ids = np.empty(len(keys), dtype=id_dtype)
+        final_ids[np.array(order, dtype=np.int64)] = np.arange(len(keys))
+
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        with open(os.path.join(tmp_dir_path, _TERMS_FILE_NAME), 'wb') \
+                as terms_file:
+            position = 0
+            for i, preliminary_id in enumerate(order):
+                encoded_key = keys[preliminary_id].encode('utf-8')
+                terms_file.write(encoded_key)
+                position += len(encoded_key)
+                offsets[i + 1] = position
+        np.save(os.path.join(tmp_dir_path, _TERM_OFFSETS_FILE_NAME), offsets)
+        del keys, order
+
+        triples = final_ids[
+            np.fromfile(triples_file_path, dtype=np.uint64).reshape(-1, 3)]
+        os.remove(triples_file_path)
+
+        # duplicates are next to each other once sorted
+        triples = _sorted_index(triples, _INDEXES['spo'])
+        is_unique = np.ones(len(triples), dtype=bool)
+        is_unique[1:] = (triples[1:] != triples[:-1]).any(axis=1)
+        triples = triples[is_unique]
+
+        for name, positions in _INDEXES.items():
+            index = np.lib.format.open_memmap(
+                os.path.join(tmp_dir_path, f'{name}.npy'),
+                mode='w+',
+                dtype=id_dtype,
+                shape=(3, len(triples)))
+            index[:] = _sorted_index(triples, positions).T
+            index.flush()
+            del index
+
+        with open(os.path.join(tmp_dir_path, _META_FILE_NAME), 'w') \
+                as meta_file:
+            json.dump({
+                'format_version': _FORMAT_VERSION,
+                'source': os.path.abspath(input_file_path),
+                # lets caches keyed by the input's content treat the store
+                # like its source file
+                'source_digest': file_digest(input_file_path),
+                'terms': len(offsets) - 1,
+                'triples': len(triples),
+            }, meta_file)
+
+        if os.path.exists(store_dir_path):
+            shutil.rmtree(store_dir_path)
+        os.rename(tmp_dir_path, store_dir_path)
+
+    except BaseException:
+        shutil.rmtree(tmp_dir_path, ignore_errors=True)
+        raise
+
+    logger.info(
+        f'imported {len(triples)} distinct triples into {store_dir_path}')
+
+
+def is_indexed_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, _META_FILE_NAME))
+
+
+def source_digest(store_dir_path: str) -> str:
+    """
+    file_digest() of the file the store was imported from
+    """
+    with open(os.path.join(store_dir_path, _META_FILE_NAME)) as meta_file:
+        return json.load(meta_file)['source_digest']
+
+
+class IndexedStore(Store):
+    """
+    rdflib Store of an imported store directory, given as configuration
+    """
+    # pyshacl wraps data graphs into datasets, which require context and
+    # graph aware stores. All triples are in the one graph of the store,
+    # though.
+    context_aware = True
+    graph_aware = True
+
+    def __init__(self, configuration: Optional[str] = None, identifier=None):
+        self.identifier = identifier
+        self.num_triples = 0
+        # triples added to and removed from the triples on disk
+        self._added = SimpleMemory()
+        self._removed = set()
+        self._indexes = {}
+
+        super().__init__(configuration)
+
+    def open(self, configuration: str, create: bool = False) -> int:
+        if not is_indexed_store(configuration):
+            return NO_STORE
+
+        with open(os.path.join(configuration, _META_FILE_NAME)) as meta_file:
+            meta = json.load(meta_file)
+        if meta['format_version'] != _FORMAT_VERSION:
+            raise ValueError(
+                f'{configuration} has store format version '
+                f'{meta["format_version"]}, expected {_FORMAT_VERSION}')
+
+        self.num_triples = meta['triples']
+        with open(os.path.join(configuration, _TERMS_FILE_NAME), 'rb') \
+                as terms_file:
+            # mmap doesn't map empty files
+            self._terms = mmap.mmap(terms_file.fileno(), 0, access=mmap.ACCESS_READ) \
+                if meta['terms'] > 0 else b''
+        # plain arrays on the mapped memory, skipping np.memmap's bookkeeping
+        # on every slice
+        self._term_offsets = np.asarray(np.load(
+            os.path.join(configuration, _TERM_OFFSETS_FILE_NAME), mmap_mode='r'))
+        self._indexes = {
+            name: np.asarray(np.load(
+                os.path.join(configuration, f'{name}.npy'), mmap_mode='r'))
+            for name in _INDEXES
+        }
+
+        # the same few terms (shapes' predicates and classes, ...) are
+        # looked up over and over
+        self._term_id = lru_cache(maxsize=100_000)(self._lookup_term_id)
+        self._term = lru_cache(maxsize=1_000_000)(self._lookup_term)
+
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction: bool = False):
+        self._indexes = {}
+
+    def _key_at(self, term_id: int) -> bytes:
+        start, end = self._term_offsets[term_id:term_id + 2]
+        return self._terms[start:end]
+
+    def _lookup_term(self, term_id: int) -> Node:
+        return key_term(self._key_at(term_id).decode('utf-8'))
+
+    def _lookup_term_id(self, term: Node) -> Optional[int]:
+        key = term_key(term)
+        if key is None:
+            return None
+
+        encoded_key = key.encode('utf-8')
+        lo, hi = 0, len(self._term_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < encoded_key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < len(self._term_offsets) - 1 and self._key_at(lo) == encoded_key:
+            return lo
+        return None
+
+    def _stored_triples(
+            self,
+            triple_pattern: Tuple[Optional[Node], Optional[Node], Optional[Node]]
+    ) -> Iterator[Triple]:
+        """
+        The matching triples on disk
+        """
+        if not self._indexes:
+            return
+
+        pattern_ids: List[Optional[int]] = []
+        for term in triple_pattern:
+            if term is None:
+                pattern_ids.append(None)
+                continue
+            term_id = self._term_id(term)
+            if term_id is None:
+                return
+            pattern_ids.append(term_id)
+
+        s, p, o = pattern_ids
+        if s is not None and p is None and o is not None:
+            name = 'osp'
+        elif s is not None or (p is None and o is None):
+            name = 'spo'
+        elif p is not None:
+            name = 'pos'
+        else:
+            name = 'osp'
+        positions = _INDEXES[name]
+        index = self._indexes[name]
+
+        # narrows down the range of matching rows column by column
+        lo, hi = 0, index.shape[1]
+        for column, position in enumerate(positions):
+            term_id = pattern_ids[position]
+            if term_id is None:
+                break
+            values = index[column, lo:hi]
+            # of the index's type, as searchsorted() would otherwise convert
+            # all values
+            term_id = index.dtype.type(term_id)
+            lo, hi = lo + int(values.searchsorted(term_id, 'left')), \
+                lo + int(values.searchsorted(term_id, 'right'))
+
+        for start in range(lo, hi, _READ_CHUNK_SIZE):
+            end = min(start + _READ_CHUNK_SIZE, hi)
+            columns = [index[column, start:end].tolist() for column in range(3)]
+            # back into subject, predicate, object order
+            ordered = [columns[positions.index(position)] for position in range(3)]
+
+            for s_id, p_id, o_id in zip(*ordered):
+                yield self._term(s_id), self._term(p_id), self._term(o_id)
+
+    def _is_stored(self, triple: Triple) -> bool:
+        return next(self._stored_triples(triple), None) is not None
+
+    def triples(self, triple_pattern, context=None):
+        for triple in self._stored_triples(triple_pattern):
+            if not self._removed or triple not in self._removed:
+                yield triple, iter(())
+
+        yield from self._added.triples(triple_pattern)
+
+    def __len__(self, context=None) -> int:
+        return self.num_triples - len(self._removed) + len(self._added)
+
+    def add(self, triple, context=None, quoted: bool = False):
+        if self._is_stored(triple):
+            self._removed.discard(triple)
+        else:
+            self._added.add(triple, context, quoted)
+
+    def remove(self, triple_pattern, context=None):
+        for triple, _ in list(self.triples(triple_pattern)):
+            if self._is_stored(triple):
+                self._removed.add(triple)
+            else:
+                self._added.remove(triple)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add_graph(self, graph):
+        pass
+
+    def remove_graph(self, graph):
+        pass
+
+    def bind(self, prefix, namespace, override: bool = True):
+        self._added.bind(prefix, namespace, override)
+
+    def prefix(self, namespace):
+        return self._added.prefix(namespace)
+
+    def namespace(self, prefix):
+        return self._added.namespace(prefix)
+
+    def namespaces(self):
+        return self._added.namespaces()
+
+
+plugin.register('Indexed', Store, 'util.indexed_store', 'IndexedStore')
+
+
+def open_graph(store_dir_path: str) -> Graph:
+    """
+    rdflib graph of an imported store
+    """
+    if not is_indexed_store(store_dir_path):
+        raise FileNotFoundError(f'No store found at {store_dir_path}')
+
+    return Graph(store=IndexedStore(store_dir_path))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument(
+        'input_file',
+        help='RDF file to import, N-Triples files may be gzip, bzip2 or xz '
+             'compressed')
+    argument_parser.add_argument(
+        'store_dir', help='Directory to build the store in')
+
+    args = argument_parser.parse_args()
+
+    import_store(args.input_file, args.store_dir)
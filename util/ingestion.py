@@ -0,0 +1,277 @@
+"""
+Shared input layer for all entry points, i.e. the one place where input RDF
+files are read from disk.
+"""
+import bz2
+import gzip
+import logging
+import lzma
+import os
+import re
+from typing import Iterator, Optional, Tuple
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.plugins.parsers.ntriples import unquote
+from rdflib.term import Node
+from rdflib.util import guess_format
+
+logger = logging.getLogger('util.ingestion')
+
+_DECOMPRESSING_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# One N-Triples line, split into its terms without building rdflib terms:
+#   group 1/2: subject IRI / blank node label
+#   group 3: predicate IRI
+#   group 4/5/6: object IRI / blank node label / literal lexical form
+#   group 7/8: language tag / datatype IRI of a literal object
+_IRI = r'<([^>]*)>'
+_BNODE = r'_:(\S+)'
+_LITERAL = r'"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<([^>]*)>)?'
+_NT_LINE = re.compile(
+    rf'\s*(?:{_IRI}|{_BNODE})\s+{_IRI}\s+(?:{_IRI}|{_BNODE}|{_LITERAL})\s*\.\s*$')
+
+# kinds of N-Triples terms
+IRI_TERM = 'iri'
+BNODE_TERM = 'bnode'
+LITERAL_TERM = 'literal'
+
+# kind, value (IRI, blank node label or lexical form, unescaped), language
+# tag and datatype IRI of an N-Triples term
+NTTerm = Tuple[str, str, Optional[str], Optional[str]]
+
+
+def is_sparql_endpoint(input_file_path_or_url: str) -> bool:
+    return input_file_path_or_url.startswith('http')
+
+
+def is_compressed(input_file_path: str) -> bool:
+    return os.path.splitext(input_file_path)[1] in _DECOMPRESSING_OPENERS
+
+
+def strip_compression_suffix(input_file_path: str) -> str:
+    """
+    data/dump.nt.gz -> data/dump.nt
+    """
+    if is_compressed(input_file_path):
+        return os.path.splitext(input_file_path)[0]
+    else:
+        return input_file_path
+
+
+def guess_rdf_format(input_file_path: str) -> Optional[str]:
+    """
+    rdflib format name guessed from the file extension, ignoring a
+    compression suffix
+    """
+    return guess_format(strip_compression_suffix(input_file_path))
+
+
+def open_input(input_file_path: str, mode: str = 'rt'):
+    """
+    Opens an input file for reading and decompresses it on the fly in case
+    of a .gz, .bz2 or .xz file. Nothing is decompressed to disk.
+    """
+    extension = os.path.splitext(input_file_path)[1]
+    opener = _DECOMPRESSING_OPENERS.get(extension, open)
+
+    if 't' in mode:
+        return opener(input_file_path, mode, encoding='utf-8')
+    else:
+        return opener(input_file_path, mode)
+
+
+class _FileBNodeLabels(dict):
+    """
+    bnode_context of rdflib's N-Triples parser which makes the blank nodes
+    keep their labels from the file instead of getting random ones
+    """
+    def get(self, key, default=None):
+        return key
+
+
+def _parse_options(rdf_format: Optional[str]) -> dict:
+    if rdf_format in ('nt', 'nt11', 'ntriples'):
+        return {'bnode_context': _FileBNodeLabels()}
+
+    return {}
+
+
+def load_graph(input_file_path: str) -> Graph:
+    """
+    Parses the whole input file into an in-memory rdflib graph. The result is
+    meant to be built once and then handed to every consumer (back ends,
+    outlier detection, ...) instead of each of them parsing the file again.
+    A store directory built by util.indexed_store is opened instead.
+
+    Blank nodes of N-Triples files (and stores) keep their labels from the
+    file, so the same file yields the same graph on every run, e.g. for
+    digests of its content. Those of other formats are labeled randomly by
+    rdflib.
+    """
+    if os.path.isdir(input_file_path):
+        # imported here, as the store reads the files it is built from
+        # through this module
+        from util.indexed_store import open_graph
+
+        g = open_graph(input_file_path)
+        logger.info(f'opened store of {len(g)} triples at {input_file_path}')
+
+        return g
+
+    logger.info(f'loading {input_file_path}')
+
+    g = Graph()
+
+    if is_compressed(input_file_path):
+        # N-Triples is what our dumps usually are
+        rdf_format = guess_rdf_format(input_file_path) or 'nt'
+
+        with open_input(input_file_path, 'rb') as input_file:
+            g.parse(input_file, format=rdf_format, **_parse_options(rdf_format))
+
+    else:
+        rdf_format = guess_format(input_file_path)
+        g.parse(
+            input_file_path, format=rdf_format, **_parse_options(rdf_format))
+
+    logger.info(f'loaded {len(g)} triples from {input_file_path}')
+
+    return g
+
+
+def _unescape(value: str) -> str:
+    # only touch the (rare) terms containing escape sequences
+    return unquote(value) if '\\' in value else value
+
+
+def _match_nt_line(line: str) -> Optional[Tuple[Optional[str], ...]]:
+    """
+    The groups of _NT_LINE matched by line, or None for empty and comment
+    lines
+    """
+    match = _NT_LINE.match(line)
+
+    if match is None:
+        if not line.strip() or line.lstrip().startswith('#'):
+            return None
+        raise ValueError(f'Invalid N-Triples line: {line!r}')
+
+    return match.groups()
+
+
+def tokenize_nt_line(line: str) -> Optional[Tuple[NTTerm, NTTerm, NTTerm]]:
+    """
+    Splits an N-Triples line into its subject, predicate and object terms
+    without building rdflib terms. Returns None for empty and comment lines.
+    """
+    groups = _match_nt_line(line)
+
+    if groups is None:
+        return None
+
+    s_iri, s_bnode, p, o_iri, o_bnode, o_literal, language, datatype = groups
+
+    if s_iri is not None:
+        s = (IRI_TERM, _unescape(s_iri), None, None)
+    else:
+        s = (BNODE_TERM, s_bnode, None, None)
+
+    if o_iri is not None:
+        o = (IRI_TERM, _unescape(o_iri), None, None)
+    elif o_bnode is not None:
+        o = (BNODE_TERM, o_bnode, None, None)
+    else:
+        o = (
+            LITERAL_TERM,
+            _unescape(o_literal),
+            language,
+            _unescape(datatype) if datatype is not None else None
+        )
+
+    return s, (IRI_TERM, _unescape(p), None, None), o
+
+
+def nt_term_node(term: NTTerm) -> Node:
+    """
+    The rdflib term of an N-Triples term. Blank nodes keep their label.
+    """
+    kind, value, language, datatype = term
+
+    if kind == IRI_TERM:
+        return URIRef(value)
+    if kind == BNODE_TERM:
+        return BNode(value)
+    return Literal(
+        value,
+        lang=language,
+        datatype=URIRef(datatype) if datatype is not None else None)
+
+
+def split_nt_line(line: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Splits an N-Triples line into the string values of its subject,
+    predicate and object, i.e. what str() of the corresponding rdflib terms
+    would return (IRIs without angle brackets, the lexical form of literals,
+    and the label of blank nodes). Returns None for empty and comment lines.
+    """
+    groups = _match_nt_line(line)
+
+    if groups is None:
+        return None
+
+    s_iri, s_bnode, p, o_iri, o_bnode, o_literal = groups[:6]
+
+    s = s_iri if s_iri is not None else s_bnode
+    if o_iri is not None:
+        o = o_iri
+    elif o_bnode is not None:
+        o = o_bnode
+    else:
+        o = o_literal
+
+    return _unescape(s), _unescape(p), _unescape(o)
+
+
+def iter_nt_lines(
+        input_file_path: str,
+        start: int = 0,
+        end: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Streams the lines of an N-Triples file one at a time. start and end
+    restrict the lines to those starting within the given byte range, which
+    allows for processing one (uncompressed) file in several parallel
+    chunks without any chunk seeing a line twice or only partially.
+    """
+    if start == 0 and end is None:
+        with open_input(input_file_path) as input_file:
+            yield from input_file
+        return
+
+    with open(input_file_path, 'rb') as input_file:
+        if start > 0:
+            # skip the line which started in the previous chunk
+            input_file.seek(start - 1)
+            input_file.readline()
+
+        position = input_file.tell()
+        while end is None or position < end:
+            line = input_file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode('utf-8')
+
+
+def chunk_byte_ranges(input_file_path: str, num_chunks: int):
+    file_size = os.path.getsize(input_file_path)
+    chunk_size = file_size // num_chunks + 1
+
+    return [
+        (i * chunk_size, min((i + 1) * chunk_size, file_size))
+        for i in range(num_chunks)
+    ]
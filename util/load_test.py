@@ -0,0 +1,171 @@
+"""
+Load test of a running validation service (evaluate_shacl --serve). The
+triples of an N-Triples file are sent in batches of --batch_size lines to
+/validate by --concurrency client threads over keep-alive connections, and
+the latencies and the throughput are reported.
+
+Example:
+
+  $ evaluate_shacl out/shexer_result.ttl --serve --port 8080 &
+  $ python -m util.load_test http://127.0.0.1:8080 data/cities.nt \\
+        --requests 500 --concurrency 8
+"""
+import http.client
+import logging
+import socket
+import statistics
+import threading
+import time
+from argparse import ArgumentParser
+from itertools import cycle, islice
+from typing import Callable, List
+from urllib.parse import urlparse
+
+from util.ingestion import iter_nt_lines
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('load_test')
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 300.0):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def connection_factory(url: str) -> Callable[[], http.client.HTTPConnection]:
+    """
+    http://host:port or unix:///path/to/socket
+    """
+    parsed_url = urlparse(url)
+
+    if parsed_url.scheme == 'unix':
+        return lambda: UnixHTTPConnection(parsed_url.path)
+    else:
+        return lambda: http.client.HTTPConnection(
+            parsed_url.hostname, parsed_url.port or 80, timeout=300.0)
+
+
+def read_batches(
+        input_file_path: str,
+        batch_size: int,
+        max_batches: int
+) -> List[bytes]:
+    batches = []
+    lines = []
+
+    for line in iter_nt_lines(input_file_path):
+        lines.append(line)
+        if len(lines) == batch_size:
+            batches.append(''.join(lines).encode('utf-8'))
+            lines = []
+            if len(batches) == max_batches:
+                return batches
+
+    if lines:
+        batches.append(''.join(lines).encode('utf-8'))
+
+    return batches
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def load_test(
+        url: str,
+        input_file_path: str,
+        batch_size: int,
+        num_requests: int,
+        concurrency: int
+):
+    # requests cycle through the batches if the input has fewer triples
+    batches = read_batches(input_file_path, batch_size, num_requests)
+    requests = list(islice(cycle(batches), num_requests))
+    new_connection = connection_factory(url)
+
+    latencies = []
+    errors = []
+    next_request = iter(range(len(requests)))
+    lock = threading.Lock()
+
+    def run_client():
+        connection = new_connection()
+
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                connection.request(
+                    'POST',
+                    '/validate',
+                    body=requests[i],
+                    headers={'Content-Type': 'application/n-triples'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(f'HTTP {response.status}')
+            except Exception as e:
+                errors.append(e)
+                connection.close()
+                connection = new_connection()
+                continue
+
+            latencies.append(time.perf_counter() - start)
+
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    latencies.sort()
+    logger.info(
+        f'{len(latencies)} requests of {batch_size} triples, '
+        f'{len(errors)} errors, {concurrency} concurrent clients')
+    logger.info(
+        f'throughput: {len(latencies) / wall_time:.1f} requests/s, '
+        f'{len(latencies) * batch_size / wall_time:.0f} triples/s')
+    if latencies:
+        logger.info(
+            f'latency: mean {statistics.mean(latencies) * 1000:.1f}ms, '
+            f'p50 {percentile(latencies, 0.5) * 1000:.1f}ms, '
+            f'p90 {percentile(latencies, 0.9) * 1000:.1f}ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms, '
+            f'max {latencies[-1] * 1000:.1f}ms')
+    for e in errors[:5]:
+        logger.warning(f'failed request: {e}')
+
+
+if __name__ == '__main__':
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument(
+        'url', help='http://host:port or unix:///path/to/socket')
+    argument_parser.add_argument(
+        'input_file', help='N-Triples file the requests are made of')
+    argument_parser.add_argument('--batch_size', type=int, default=100)
+    argument_parser.add_argument('--requests', type=int, default=200)
+    argument_parser.add_argument('--concurrency', type=int, default=4)
+
+    args = argument_parser.parse_args()
+
+    load_test(
+        args.url,
+        args.input_file,
+        args.batch_size,
+        args.requests,
+        args.concurrency
+    )
@@ -1,7 +1,7 @@
 """
 Evaluation utils for the LUMB dataset (here called Training74)
 """
-from typing import List
+from typing import Optional, Tuple
 
 from pykeen.datasets import Dataset
 from rdflib import URIRef
@@ -146,6 +146,27 @@ ERRONEOUS_RESOURCES = {
 NUM_RESOURCES = 12868  # 12855 <- without classes
 
 
+def entity_masks(dataset: Dataset) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Boolean masks over the entity ids of dataset: the resources (http IRIs)
+    and the erroneous resources
+    """
+    # reverse the entity-to-index mapping to get an index-to-entity mapping
+    id_to_entity = {v: k for k, v in dataset.entity_to_id.items()}
+    entities = [id_to_entity[idx] for idx in range(len(id_to_entity))]
+
+    resource_mask = np.array(
+        [entity.startswith('http://') for entity in entities], dtype=bool)
+    erroneous_mask = np.array(
+        [
+            is_resource and URIRef(entity) in ERRONEOUS_RESOURCES
+            for entity, is_resource in zip(entities, resource_mask)
+        ],
+        dtype=bool)
+
+    return resource_mask, erroneous_mask
+
+
 class LUMBEvaluator:
     """
     The task to evaluate here is to correctly find all outliers. The overall
@@ -203,30 +224,35 @@ class LUMBEvaluator:
         self.fp = 0
 
     def evaluate_clusters(self, dataset: Dataset, clusterer: DBSCAN):
-        # get all indexes for those nodes not belonging to any cluster
-        indexes = np.where(clusterer.labels_ == -1)
-
-        # reverse the entity-to-index mapping to get an index-to-entity mapping
-        id_to_entity = {v: k for k, v in dataset.entity_to_id.items()}
-
-        # build URIs for the nodes found in the '-1' cluster, i.e., the
-        # outlier nodes
-        outlier_nodes: List[URIRef] = \
-            [
-                URIRef(id_to_entity[idx])
-                for idx in indexes[0]
-                if id_to_entity[idx].startswith('http://')
-            ]
-
-        for outlier_node in outlier_nodes:
-            if outlier_node in ERRONEOUS_RESOURCES:
-                # if everything is correct, then
-                self.tp += 1  # tp == len(ERRONEOUS_RESOURCES)
-                self.fn -= 1  # fn == 0
-            else:
-                # if everything is wrong, then
-                self.fp += 1  # fp == NUM_RESOURCES - len(ERRONEOUS_RESOURCES)
-                self.tn -= 1  # tn == 0
+        self.evaluate_labels(dataset, clusterer.labels_)
+
+    def evaluate_labels(
+            self,
+            dataset: Dataset,
+            labels: np.ndarray,
+            masks: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ):
+        """
+        Like evaluate_clusters(), for the cluster labels of the entities by
+        entity id. The masks of entity_masks(dataset) can be passed to
+        evaluate many labelings of the same dataset.
+        """
+        resource_mask, erroneous_mask = \
+            masks if masks is not None else entity_masks(dataset)
+
+        # the nodes not belonging to any cluster, i.e., the outlier nodes
+        outlier_mask = labels == -1
+        # if everything is correct, then tp == len(ERRONEOUS_RESOURCES) and
+        # fn == 0
+        num_erroneous = int(np.count_nonzero(outlier_mask & erroneous_mask))
+        self.tp += num_erroneous
+        self.fn -= num_erroneous
+        # if everything is wrong, then
+        # fp == NUM_RESOURCES - len(ERRONEOUS_RESOURCES) and tn == 0
+        num_correct = int(np.count_nonzero(
+            outlier_mask & resource_mask & ~erroneous_mask))
+        self.fp += num_correct
+        self.tn -= num_correct
 
     def get_acc(self):
         return (self.tp + self.tn) / NUM_RESOURCES
@@ -0,0 +1,313 @@
+"""
+Benchmark of the PyKEEN embedding methods for the outlier detection: trains
+each model on the input, sweeps the DBSCAN eps over a grid and scores the
+outliers of each eps with the LUMBEvaluator.
+
+The input is parsed once, before the workers are forked. Every model runs
+in a fresh worker process, at most num_workers of them at the same time,
+with the threads of torch and the BLAS libraries limited to num_threads per
+worker. Unlike a ProcessPoolExecutor, whose pool breaks as a whole if one
+of its workers is killed, a model which crashes its worker (e.g. by running
+out of memory) is recorded as crashed and the others keep running.
+
+The results are written to the output directory:
+
+- results.csv: per model the times of its stages, the peak RSS of its
+  worker and the best F1 score and accuracy over the eps grid
+- <model>.csv and <model>.png: the sweep results of each model
+- best_scores.png: the best F1 score and accuracy of all models
+
+Example:
+
+  $ python -m util.model_benchmark data/Training74/mergedGraph257.nt \\
+        TransE TuckER DistMult --num_workers 2 --num_threads 1 \\
+        --output_dir data/Training74/outlier_removal_results
+"""
+import csv
+import logging
+import multiprocessing
+import os
+import signal
+import traceback
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass, field, fields
+from multiprocessing.connection import wait
+from typing import List, Optional, Sequence
+
+from util.profiling import measure, peak_rss
+
+logger = logging.getLogger('util.model_benchmark')
+
+# the input graph, parsed by benchmark_models() before it forks the workers
+_rdf_graph = None
+
+# environment variables limiting the threads of the libraries which aren't
+# imported yet when a worker starts
+_THREAD_LIMIT_VARIABLES = (
+    'OMP_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+)
+
+
+@dataclass
+class ModelResult:
+    model: str
+    # 'ok', 'failed' if the model raised an exception or 'crashed' if its
+    # worker died
+    status: str
+    error: str = ''
+    training_time: Optional[float] = None  # seconds
+    embedding_time: Optional[float] = None  # seconds
+    clustering_time: Optional[float] = None  # seconds, of the whole sweep
+    peak_rss: Optional[float] = None  # MiB
+    best_f1_eps: Optional[float] = None
+    best_f1_score: Optional[float] = None
+    best_acc_eps: Optional[float] = None
+    best_acc: Optional[float] = None
+    # results of the eps sweep, which aren't part of the results table
+    sweep: list = field(default_factory=list, repr=False)
+
+
+_TABLE_FIELDS = [f.name for f in fields(ModelResult) if f.name != 'sweep']
+
+
+def _limit_threads(num_threads: int):
+    for variable in _THREAD_LIMIT_VARIABLES:
+        os.environ[variable] = str(num_threads)
+
+    import torch
+    from threadpoolctl import threadpool_limits
+
+    torch.set_num_threads(num_threads)
+    threadpool_limits(limits=num_threads)
+
+
+def _benchmark_model(
+        model: str,
+        eps_values: Sequence[float],
+        num_threads: int
+) -> ModelResult:
+    _limit_threads(num_threads)
+
+    result = ModelResult(model, 'ok')
+
+    try:
+        from shaclgenerator.pykeen_adapter import OutlierDetector
+
+        with measure() as training:
+            outlier_detector = OutlierDetector(
+                rdf_graph=_rdf_graph,
+                embedding_method=model,
+                embedding_cache=None
+            )
+        result.training_time = training.wall_time
+
+        with measure() as extraction:
+            numpy_embeddings = outlier_detector.get_embeddings()
+        result.embedding_time = extraction.wall_time
+
+        if numpy_embeddings is None:
+            raise ValueError('the model has no entity representations')
+
+        with measure() as clustering:
+            sweep = outlier_detector.sweep_eps(
+                eps_values, numpy_embeddings=numpy_embeddings)
+        result.clustering_time = clustering.wall_time
+
+        best_f1 = max(sweep, key=lambda r: r.f1_score)
+        best_acc = max(sweep, key=lambda r: r.acc)
+        result.best_f1_eps = best_f1.eps
+        result.best_f1_score = best_f1.f1_score
+        result.best_acc_eps = best_acc.eps
+        result.best_acc = best_acc.acc
+        result.sweep = sweep
+
+    except Exception as e:
+        logger.debug(traceback.format_exc())
+        result.status = 'failed'
+        # some messages go on with a dump of the offending data
+        message = str(e).strip().split('\n', 1)[0]
+        result.error = f'{type(e).__name__}: {message}'
+
+    result.peak_rss = peak_rss()
+
+    return result
+
+
+def _run_worker(connection, *args):
+    connection.send(_benchmark_model(*args))
+    connection.close()
+
+
+def _crash_message(exit_code: int) -> str:
+    if exit_code < 0:
+        message = f'worker killed by {signal.Signals(-exit_code).name}'
+        if -exit_code == signal.SIGKILL:
+            message += ' (out of memory?)'
+        return message
+
+    return f'worker exited with code {exit_code}'
+
+
+def benchmark_models(
+        input_file_path: str,
+        models: Sequence[str],
+        eps_values: Sequence[float],
+        num_workers: int = 1,
+        num_threads: int = 1
+) -> List[ModelResult]:
+    """
+    Benchmarks the models on the input file in up to num_workers worker
+    processes. Returns the results in the order of models.
+    """
+    global _rdf_graph
+
+    from util.ingestion import load_graph
+
+    _rdf_graph = load_graph(input_file_path)
+    context = multiprocessing.get_context('fork')
+    pending = list(models)
+    running = {}
+    results = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < num_workers:
+                model = pending.pop(0)
+                parent_connection, child_connection = \
+                    context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_run_worker,
+                    args=(
+                        child_connection,
+                        model,
+                        eps_values,
+                        num_threads))
+                process.start()
+                child_connection.close()
+                running[parent_connection] = (model, process)
+                logger.info(f'started {model}')
+
+            for connection in wait(list(running)):
+                model, process = running.pop(connection)
+                try:
+                    result = connection.recv()
+                except EOFError:
+                    # the worker died before sending its result
+                    result = None
+                connection.close()
+                process.join()
+
+                if result is None:
+                    result = ModelResult(
+                        model, 'crashed', _crash_message(process.exitcode))
+
+                logger.info(
+                    f'{model}: {result.status}'
+                    + (f', {result.error}' if result.error else ''))
+                results[model] = result
+    finally:
+        _rdf_graph = None
+
+    return [results[model] for model in models]
+
+
+def write_results(results: Sequence[ModelResult], file_path: str):
+    with open(file_path, 'w', newline='') as out_file:
+        writer = csv.DictWriter(
+            out_file, fieldnames=_TABLE_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(asdict(result) for result in results)
+
+
+def plot_best_scores(results: Sequence[ModelResult], file_path: str):
+    """
+    Bar chart of the best F1 score and accuracy of the models which
+    finished
+    """
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    results = [result for result in results if result.status == 'ok']
+    positions = np.arange(len(results))
+
+    fig = Figure(figsize=(max(6.4, 0.6 * len(results)), 4.8))
+    ax = fig.subplots()
+    ax.bar(
+        positions - 0.2,
+        [result.best_f1_score for result in results],
+        0.4,
+        label='F1-Score')
+    ax.bar(
+        positions + 0.2,
+        [result.best_acc for result in results],
+        0.4,
+        label='Accuracy')
+    ax.set_xticks(positions)
+    ax.set_xticklabels(
+        [result.model for result in results], rotation=45, ha='right')
+    ax.legend()
+    fig.tight_layout()
+
+    fig.savefig(file_path)
+
+
+def write_outputs(results: Sequence[ModelResult], output_dir: str):
+    from shaclgenerator.eps_sweep import plot_sweep, write_table
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    write_results(results, os.path.join(output_dir, 'results.csv'))
+    for result in results:
+        if result.sweep:
+            file_path = os.path.join(output_dir, result.model.lower())
+            write_table(result.sweep, file_path + '.csv')
+            plot_sweep(result.sweep, file_path + '.png')
+    plot_best_scores(results, os.path.join(output_dir, 'best_scores.png'))
+
+
+if __name__ == '__main__':
+    from shaclgenerator.eps_sweep import eps_grid
+
+    logging.basicConfig(level=logging.INFO)
+
+    argument_parser = ArgumentParser()
+    argument_parser.add_argument('input_file', type=str)
+    argument_parser.add_argument(
+        'models',
+        nargs='+',
+        help="Names of the PyKEEN models to benchmark, i.e. values of "
+             "EmbeddingMethod such as TransE or TuckER.")
+    argument_parser.add_argument('--eps_min', type=float, default=0.01)
+    argument_parser.add_argument('--eps_max', type=float, default=2.0)
+    argument_parser.add_argument(
+        '--num_eps',
+        type=int,
+        default=200,
+        help="Number of evenly spaced eps values from --eps_min to --eps_max.")
+    argument_parser.add_argument(
+        '--num_workers',
+        type=int,
+        default=1,
+        help="Number of models to benchmark at the same time.")
+    argument_parser.add_argument(
+        '--num_threads',
+        type=int,
+        default=1,
+        help="Number of threads of torch and BLAS per worker.")
+    argument_parser.add_argument(
+        '--output_dir',
+        type=str,
+        default='out/model_benchmark',
+        help="Directory to write the results table and plots to.")
+
+    args = argument_parser.parse_args()
+
+    model_results = benchmark_models(
+        args.input_file,
+        args.models,
+        eps_grid(args.eps_min, args.eps_max, args.num_eps),
+        args.num_workers,
+        args.num_threads)
+    write_outputs(model_results, args.output_dir)
@@ -0,0 +1,44 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class Measurement:
+    wall_time: float = 0.0  # seconds
+    cpu_time: float = 0.0  # seconds
+    peak_rss: float = 0.0  # MiB, peak of the whole (worker) process
+
+    def __str__(self):
+        return f'wall time: {self.wall_time:.2f}s, ' \
+               f'CPU time: {self.cpu_time:.2f}s, ' \
+               f'peak RSS: {self.peak_rss:.1f} MiB'
+
+
+def peak_rss() -> float:
+    """
+    Peak resident set size of the current process in MiB
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is given in bytes on macOS and in kilobytes everywhere else
+    if sys.platform == 'darwin':
+        return max_rss / (1024 * 1024)
+    else:
+        return max_rss / 1024
+
+
+@contextmanager
+def measure():
+    measurement = Measurement()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+
+    try:
+        yield measurement
+    finally:
+        measurement.wall_time = time.perf_counter() - start_wall
+        measurement.cpu_time = time.process_time() - start_cpu
+        measurement.peak_rss = peak_rss()